@@ -34,6 +34,12 @@ db.sequelize.sync({ alter: true }).then(() => {
 // Serve the uploaded files at `/uploads`
 app.use("/uploads", express.static(__dirname + "/uploads"));
 
+// Batches of events (merged audit events run several KB each) are parsed
+// with a larger body limit than the default 100 KB of the other routes, see
+// `SHIP_BATCH_BYTES` on the agent
+const EVENT_BODY_LIMIT = process.env.EVENT_BODY_LIMIT || "10mb";
+app.use(["/api/event/add", "/api/event/add-batch"], express.json({ limit: EVENT_BODY_LIMIT }));
+
 // Set the basic middleware(s)
 app.use(express.json());
 app.use(express.urlencoded({ extended: true }));
@@ -58,9 +64,21 @@ server.listen(PORT, () => {
     console.log(`Server is running on port ${PORT}`);
 });
 
-// Error handler
+// Error handler, answers with the status of the error (e.g. 413 for a body
+// over the limit) so that clients don't wait for a response until they time out
 app.use((err, req, res, next) => {
     console.log(err);
+
+    if (res.headersSent) {
+        return next(err);
+    }
+
+    const status = err.status || err.statusCode || 500;
+
+    return res.status(status >= 400 && status < 600 ? status : 500).json({
+        status: "error",
+        message: err.message,
+    });
 });
 
 sio.on("connection", (socket) => {
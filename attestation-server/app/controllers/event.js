@@ -39,6 +39,74 @@ const add_event = async (req, res) => {
     return response_201(res, "Event saved successfully!");
 };
 
+// Formats of the batches of events accepted by `add_events`, and
+// compressions of the request bodies (inflated by `body-parser`) and of
+// the logs received over socket.io
+const FORMATS = {
+    encodings: ["columnar", "json"],
+    compression: ["gzip", "deflate"],
+    logs: ["deflate"],
+};
+
+// Expand a batch of events sent as columns: events sharing their machine,
+// type, log file and property names are grouped, and the values of each
+// property are listed once per group
+const decode_columnar = ({ groups }) => {
+    const events = [];
+
+    for (const { machine_id, type, log_filepath, keys, timestamp, columns } of groups) {
+        timestamp.forEach((value, index) => {
+            const props = {};
+
+            keys.forEach((key, column) => {
+                props[key] = columns[column][index];
+            });
+
+            events.push({ machine_id, type, timestamp: value, props, log_filepath });
+        });
+    }
+
+    return events;
+};
+
+const get_formats = async (req, res) => {
+    return response_200(res, "Formats fetched successfully!", FORMATS);
+};
+
+const add_events = async (req, res) => {
+    var data = req.body;
+
+    if (data == null || data == "") {
+        return response_400(res, "Didn't receive any data.");
+    }
+
+    if (!Array.isArray(data) && Array.isArray(data.groups)) {
+        data = decode_columnar(data);
+    }
+
+    if (!Array.isArray(data)) {
+        return response_400(res, "Expected data to be an 'Array', got something else.");
+    }
+
+    try {
+        const events = data.map(
+            ({ machine_id, type, timestamp, props, log_filepath }) => ({
+                machine_id,
+                type,
+                timestamp,
+                props,
+                log_filepath,
+            })
+        );
+
+        await Event.bulkCreate(events);
+    } catch (err) {
+        return response_500(res, `Error while saving events. ${err.message}`);
+    }
+
+    return response_201(res, "Events saved successfully!");
+};
+
 const get_events = async (req, res) => {
     // To fetch specific event by ID
     const { id } = req.query;
@@ -159,6 +227,8 @@ const remove_events = async (req, res) => {
 
 module.exports = {
     add_event,
+    add_events,
     get_events,
+    get_formats,
     remove_events,
 };
@@ -1,3 +1,5 @@
+const zlib = require("zlib");
+
 // Store socket.io sessions, machine-id -> socket
 const sessions = {};
 const LOGS_WINDOW = 16;
@@ -18,7 +20,18 @@ const handle_socket = async (socket) => {
     socket.on("collect_log", collect_log);
 };
 
-const collect_log = async (machine_id, timestamp, type, data) => {
+const collect_log = async (machine_id, timestamp, type, data, ack) => {
+    // Logs of a machine which connected before the server restarted
+    if (sessions[machine_id] == null) {
+        if (typeof ack === "function") ack(false);
+        return;
+    }
+
+    // Logs compressed by the agent are received as binary attachments
+    if (Buffer.isBuffer(data)) {
+        data = JSON.parse(zlib.inflateSync(data));
+    }
+
     let current_timestamp = parseInt(Date.now() / 1000.0);
     var logs = sessions[machine_id].logs;
 
@@ -46,6 +59,10 @@ const collect_log = async (machine_id, timestamp, type, data) => {
         machine_id,
         logs
     });
+
+    // Acknowledge the log, the agent sends it again otherwise. Logs are
+    // keyed by timestamp, so a log sent twice is only stored once
+    if (typeof ack === "function") ack(true);
 };
 
 module.exports = {
@@ -5,6 +5,8 @@ const express = require("express"),
 module.exports = function (app) {
     event_router.get("/get", event_controller.get_events);
     event_router.post("/add", event_controller.add_event);
+    event_router.post("/add-batch", event_controller.add_events);
+    event_router.get("/formats", event_controller.get_formats);
     event_router.delete("/remove", event_controller.remove_events);
 
     app.use("/event", event_router);
@@ -3,42 +3,94 @@ Main driver code that runs the agent.
 This file is autorun on `python attestation_agent` command.
 """
 
-import json
-import time
-from collections import deque
-from concurrent.futures import ThreadPoolExecutor
-
-import requests
-import socketio
+import argparse
+import asyncio
+import signal
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 
+from attestation_agent.checkpoint import Checkpointer
 from attestation_agent.config import (AUDIT_LOG, AUTH_LOG, BASE_URL,
-                                      MACHINE_ID_PATH)
-from attestation_agent.logs import Event
-from attestation_agent.logs.loggers import UsageLogger
-from attestation_agent.logs.parsers import AuditParser, AuthParser
+                                      CHECKPOINT_INTERVAL, COALESCE_WINDOW,
+                                      DETECTIONS_FILE, LOG_AGGREGATE,
+                                      MACHINE_ID_PATH, METRICS_PORT,
+                                      METRICS_REPORT_INTERVAL, PROFILE,
+                                      RULES_FILE, RUNTIME, RUNTIME_WORKERS,
+                                      STORE_PATH)
+from attestation_agent.detection import DetectionEngine, load_detections
+from attestation_agent.errors import AttestationError, report
+from attestation_agent.errors.reporter import reporter as error_reporter
+from attestation_agent.logs.loggers import UsageAggregator, UsageLogger
+from attestation_agent.logs.parsers import (AuditParser, AuthParser,
+                                            EventCoalescer, load_rule_parsers)
+from attestation_agent.metrics import MetricsServer, SelfReporter
+from attestation_agent.profiling import PROFILE_MODES, Profiler
+from attestation_agent.runtime import AsyncRuntime
+from attestation_agent.store import EventStore
+from attestation_agent.transport import Dispatcher, EventShipper, LogChannel
 from attestation_agent.utils import load_session, save_session
 
 # Machine ID stored in `/etc/machine-id` or in a custom location
 MACHINE_ID: str = None
 
 # Global objects below
-# SocketIO object for real-time communication with the attestation server
+# Socket.io channel for real-time communication with the attestation server
 # For instance, to receive updates from the server
-sio: socketio.Client = socketio.Client()
+channel: LogChannel = LogChannel(BASE_URL)
 
 # ThreadPoolExecutor instance to execute loggers and parsers
 # in separate threads for concurrency via multi-threading
 tpe: ThreadPoolExecutor = None
 
-# Loggers to continuously send logs to the attestation server
+# Event shipper to send the parsed events to the attestation server in batches
+shipper: EventShipper = EventShipper(BASE_URL)
+
+# Keeps the parsed events in a local database, for queries on the machine itself
+store: EventStore = EventStore() if STORE_PATH is not None else None
+
+# Hands the events over from the parsers to the shipper as soon as they are generated,
+# keeping track of the state of the parsers as of the events delivered,
+# coalescing the repeats of an event and raising the alerts of the detections
+dispatcher: Dispatcher = Dispatcher(
+    shipper,
+    track_states=CHECKPOINT_INTERVAL is not None,
+    coalescer=EventCoalescer() if COALESCE_WINDOW is not None else None,
+    store=store,
+    detector=DetectionEngine(load_detections(DETECTIONS_FILE)) if DETECTIONS_FILE is not None else None,
+)
+
+# Saves the session periodically, see `CHECKPOINT_INTERVAL`
+checkpointer: Checkpointer = None
+
+# Futures of the running parsers, to wait for their last events on exit
+parser_futures: list[Future] = []
+
+# Serves the metrics of the agent itself on localhost
+metrics_server: MetricsServer = MetricsServer()
+
+# Prints a summary of the metrics of the agent periodically
+reporter: SelfReporter = SelfReporter()
+
+# Profiles the agent when enabled, see `parse_args`
+profiler: Profiler = None
+
+# Runs the loggers and parsers with `--runtime asyncio`
+runtime: AsyncRuntime = None
+
+# Set once the agent is asked to stop, see `terminate`
+stopping: bool = False
+
+# Loggers to continuously send logs to the attestation server,
+# the usage logs are rolled up before they are sent
 LOGGERS = (
-    UsageLogger(),
+    UsageLogger(aggregator=UsageAggregator() if LOG_AGGREGATE else None),
 )
 
-# Log parsers to parse logs and send events to the attestation server
+# Log parsers to parse logs and send events to the attestation server,
+# along with the rule based parsers of the sources in the rule file
 PARSERS = (
     AuthParser(AUTH_LOG),
     AuditParser(AUDIT_LOG),
+    *load_rule_parsers(RULES_FILE),
 )
 
 
@@ -56,57 +108,109 @@ def read_machine_id(filepath: str):
         print(f"Found machine-id: {MACHINE_ID}")
 
 
-def handle_events(events: deque[Event]) -> None:
+def negotiate_formats():
     """
-    Iterate over the events, convert their data to the appropriate format
-    and send to the attestation server.
+    Agree on the encoding and compression of the events and logs sent,
+    once connected to the attestation server
     """
-    while events:
-        event = events.popleft()
-
-        # Prepare data to send
-        event_dict = {
-            "machine_id": MACHINE_ID,
-            "timestamp": event.timestamp,
-            "type": event.type,
-            "log_filepath": event.log_file,
-            "props": "",
-        }
-
-        # Extract and marshal the attributes for sending to the attestation server
-        event_dict["props"] = json.dumps({
-            key: value for key, value in event.__dict__.items() if key not in event_dict
-        })
-        _ = requests.post(url=f"{BASE_URL}/api/event/add", json=event_dict)
-
-
-def main():
+    wire_format = shipper.format or shipper.negotiate()
+
+    for logger in LOGGERS:
+        logger.wire_format = wire_format
+
+
+def terminate(signum, frame):
     """
-    Initialize the agent to run loggers and parsers in their separate threads
+    Stop the agent gracefully on SIGTERM and SIGINT: the dispatcher (or the
+    asyncio runtime) returns once the events in hand are dispatched, and
+    the agent shuts down from the main thread, see `shutdown`. Exiting from
+    the handler could interrupt a dispatch and lose its events.
     """
-    global sio, tpe
+    global stopping
+
+    stopping = True
+
+    if runtime is not None:
+        runtime.stop()
+
+    dispatcher.stop()
+
+
+def parse_args() -> argparse.Namespace:
+    """
+    Parse the command line arguments of the agent
+    """
+    arg_parser = argparse.ArgumentParser(prog="attestation_agent")
+    arg_parser.add_argument(
+        "--runtime",
+        choices=("threads", "asyncio"),
+        default=RUNTIME,
+        help="run the loggers and parsers in a thread each, or as tasks of an event loop"
+    )
+    arg_parser.add_argument(
+        "--profile",
+        choices=PROFILE_MODES,
+        default=PROFILE,
+        help="profile the agent, the profiles are written on SIGUSR2 and on exit"
+    )
+    return arg_parser.parse_args()
+
+
+def main(args: argparse.Namespace):
+    """
+    Initialize the agent to run loggers and parsers in their separate threads,
+    or as tasks of an event loop
+    """
+    global tpe, parser_futures, profiler, checkpointer, runtime
+
+    # Profile the agent from the start, before any thread is created
+    if args.profile is not None:
+        profiler = Profiler(args.profile)
+        profiler.start()
 
     # Read the machine ID from given path
     read_machine_id(MACHINE_ID_PATH)
+    dispatcher.machine_id = MACHINE_ID
 
     # Connect to attestation server, creating a websocket connection
     # for real-time communication
     print(f"Connecting to the attestation server: {BASE_URL} ... ", end="", flush=True)
 
-    # Try to connect to the socket.io server
-    try:
-        # NOTE: If the server restarts or the connection breaks
-        # A new Socket ID may be assigned, update variables accordinly
-        sio.connect(BASE_URL, headers={ "MACHINE-ID": MACHINE_ID })
-        print(f"connected!")
-        print(f"Got socketID: {sio.sid}")
-    except:
-        sio = None
+    channel.headers = {"MACHINE-ID": MACHINE_ID}
+    channel.on_connect = negotiate_formats
+
+    # Try to connect to the socket.io server, the channel keeps trying
+    # in the background and reconnects whenever the connection breaks.
+    # NOTE: A new Socket ID is assigned on each connection
+    if channel.connect():
+        print("connected!")
+        print(f"Got socketID: {channel.sid}")
+    else:
         print(
-            "Failed to connect to the attestation server."
-            "Make sure the server is running and accessible."
+            "Failed to connect to the attestation server, retrying in the background."
+            " Make sure the server is running and accessible."
         )
 
+    channel.start()
+
+    # Expose the metrics of the agent itself
+    if METRICS_PORT is not None:
+        try:
+            metrics_server.start()
+            print(f"Serving agent metrics on: http://{metrics_server.host}:{metrics_server.port}/metrics")
+        except OSError as exc:
+            report(
+                AttestationError(
+                    title="MetricsError",
+                    msg="error while starting the metrics server",
+                    port=METRICS_PORT,
+                    exc=exc
+                )
+            )
+
+    if METRICS_REPORT_INTERVAL is not None:
+        reporter.start()
+
     # Load the agent session
     data = load_session()
 
@@ -119,71 +223,143 @@ def main():
             if filepath in data:
                 parser.set_state(data[filepath])
 
-    # Initialize a thread pool of 8 threads
-    tpe = ThreadPoolExecutor(max_workers=8)
+    # Function to run the logger
+    logger_runner = lambda logger: logger.run(MACHINE_ID, channel)
+
+    # Write the events to the local store from its own thread
+    if store is not None:
+        store.start()
+
+    # Hand the events over as soon as any parser generates them
+    for parser in PARSERS:
+        dispatcher.register(parser)
+
+    # Save the session periodically, so that a killed agent doesn't
+    # parse and send everything again from its last clean exit
+    if CHECKPOINT_INTERVAL is not None:
+        checkpointer = Checkpointer(dispatcher, session=data)
+        checkpointer.start()
+
+    if args.runtime == "asyncio":
+        # Initialize a thread pool for the blocking steps of the tasks,
+        # the dispatcher and the shipper
+        tpe = ThreadPoolExecutor(max_workers=RUNTIME_WORKERS + 2)
+
+        # Run the shipper in its own thread, it sends events in batches
+        _ = tpe.submit(shipper.run)
 
-    # Functions to run the logger and parser
-    logger_runner = lambda logger: logger.run(MACHINE_ID, sio)
-    parser_runner = lambda parser: parser.run()
+        # Run loggers and parsers as tasks until the agent is stopped
+        runtime = AsyncRuntime(PARSERS, LOGGERS, dispatcher, tpe, channel, MACHINE_ID)
+
+        if not stopping:
+            asyncio.run(runtime.run())
+        return
+
+    # Initialize a thread pool with a thread for each logger and parser and the shipper
+    tpe = ThreadPoolExecutor(max_workers=len(LOGGERS) + len(PARSERS) + 1)
 
     # Run loggers and parsers in a separate thread each
     _ = tpe.map(logger_runner, LOGGERS)
-    _ = tpe.map(parser_runner, PARSERS)
-
-    # Infinite loop:
-    # - pick a parser
-    # - pause it, read its events, resume it
-    # - pick next and repeat
-    while True:
-        # TODO: Use signals between threads to notify a thread pool
-        # to send data to the attestation server
-        # and instead just sleep in `main()` but this works...so don't change :p
-
-        # Temporarily suspend each parser and get the events generated by it (if any)
-        # and send them to the attestation server
-        for parser in PARSERS:
-            with parser.lock:
-                events = parser.flush()
+    parser_futures = [tpe.submit(parser.run) for parser in PARSERS]
 
-            # Handle the generated events
-            handle_events(events)
+    # Run the shipper in its own thread, it sends events in batches
+    _ = tpe.submit(shipper.run)
 
-        # Wait a little, so that a single core isn't overwhelmed
-        time.sleep(1)
+    # Dispatch the events in the main thread until the agent is stopped
+    dispatcher.run()
 
 
-if __name__ == "__main__":
-    # Run the main function in try-except
-    # and exit gracefully on any error
-    try:
-        main()
-    except (KeyboardInterrupt, SystemExit):
-        # Disconnect from the server
-        if sio.connected:
-            sio.disconnect()
+def shutdown():
+    """
+    Stop the agent once the main loop has returned: send the last events,
+    then save the session
+    """
+    # Don't let another signal interrupt the shutdown
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
 
-        # Stop and wait for the loggers and parsers to exit and release the thread pool
-        print("Waiting for running threads to finish ... ", end="", flush=True)
+    # The session is saved once the agent has stopped
+    if checkpointer is not None:
+        checkpointer.stop()
 
-        for logger in LOGGERS:
-            logger.stop()
+    # Disconnect from the server
+    channel.stop()
 
-        for parser in PARSERS:
-            parser.stop()
+    # Stop and wait for the loggers and parsers to exit and release the thread pool
+    print("Waiting for running threads to finish ... ", end="", flush=True)
+
+    for logger in LOGGERS:
+        logger.stop()
+
+    for parser in PARSERS:
+        parser.stop()
+
+    # Publish the events the parsers still hold, e.g. the audit events
+    # waiting for more records, hand the last events over and stop the
+    # shipper, it sends whatever is left in its buffer before exiting
+    wait(parser_futures)
+
+    for parser in PARSERS:
+        parser.finish()
+
+    dispatcher.stop()
+    dispatcher.drain()
+    shipper.stop()
 
-        # Release the thread pool
+    # Write the last events to the local store
+    if store is not None:
+        store.stop()
+
+    # Release the thread pool
+    if tpe is not None:
         tpe.shutdown()
-        print("done!")
+    print("done!")
 
-        # Save state of the agent, state of:
-        # - loggers
-        # - parsers
-        data = {}
+    metrics_server.stop()
+    reporter.stop()
 
-        # Read state of each parser
-        for parser in PARSERS:
-            data[parser.filepath] = parser.get_state()
+    # Print the summaries of the errors suppressed by the rate limiting
+    error_reporter.flush()
+
+    if profiler is not None:
+        profiler.stop()
+        profiler.dump()
+
+    # Save state of the agent, state of:
+    # - loggers
+    # - parsers
+    data = {}
+
+    # Read state of each parser
+    for parser in PARSERS:
+        data[parser.filepath] = parser.get_state()
+
+    # Save the current session
+    save_session(data)
+    exit("exiting...")
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    # Stopped by a service manager, `kill`, Ctrl+C, ...
+    signal.signal(signal.SIGTERM, terminate)
+    signal.signal(signal.SIGINT, terminate)
+
+    # Run the main function until the agent is stopped,
+    # and exit gracefully on any error
+    try:
+        main(args)
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    except Exception as exc:
+        # Still send the last events and save the session
+        report(
+            AttestationError(
+                title="AgentError",
+                msg="error while running the agent",
+                exc=exc
+            )
+        )
 
-        # Save the current session
-        save_session(data)
-        exit("exiting...")
+    shutdown()
@@ -0,0 +1,19 @@
+"""
+Benchmarks for the hot paths of the attestation agent.
+Each module can be run on its own, for instance:
+`python -m attestation_agent.benchmarks.tail --size 2G`
+"""
+
+_UNITS = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+
+
+def parse_size(size: str) -> int:
+    """
+    Convert a human readable size such as `512M` or `2G` to bytes
+    """
+    size = size.strip().upper()
+
+    if size and size[-1] in _UNITS:
+        return int(float(size[:-1]) * _UNITS[size[-1]])
+
+    return int(size)
@@ -0,0 +1,3 @@
+from attestation_agent.benchmarks.suite import main
+
+main()
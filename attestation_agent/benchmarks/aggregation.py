@@ -0,0 +1,126 @@
+"""
+Benchmark of the bandwidth used by the usage logs, with and without the
+aggregation of `UsageAggregator`, for a few synthetic workloads:
+
+- idle: metrics barely move
+- steady: metrics move around a level with some noise
+- bursty: idle periods interrupted by bursts of CPU, disk and network
+
+Samples are taken at the default intervals of `UsageLogger` (CPU every
+250 ms, disk every 5 s, memory and network every second) on a simulated
+clock, and a log is handed over every second, as the logger does.
+
+Run: `python -m attestation_agent.benchmarks.aggregation`
+"""
+
+import argparse
+import random
+
+from attestation_agent.config import LOG_INTERVAL, LOG_METRIC_INTERVALS
+from attestation_agent.logs.loggers import UsageAggregator, UsageLogger
+
+WORKLOADS = ("idle", "steady", "bursty")
+
+
+def _level(workload: str, t: float, rng: random.Random) -> float:
+    """
+    Return the load (0 to 1) of the workload at time `t`
+    """
+    if workload == "idle":
+        return 0.02 + rng.random() * 0.01
+
+    if workload == "steady":
+        return 0.4 + rng.gauss(0, 0.03)
+
+    # Bursts of 10 seconds every minute
+    return (0.9 if t % 60 < 10 else 0.03) + rng.gauss(0, 0.02)
+
+
+def _sample(metric: str, load: float, rng: random.Random):
+    load = min(max(load, 0.0), 1.0)
+
+    if metric == "cpu":
+        return round(load * 100, 1)
+
+    if metric == "memory":
+        return {"primary": round(30 + load * 20, 1), "swap": 0.0}
+
+    if metric == "disk":
+        rate = load * 50e6
+        return {
+            "read_count": rate / 4096 / 2,
+            "write_count": rate / 4096 / 2,
+            "read_bytes": rate / 2,
+            "write_bytes": rate / 2,
+            "busy_time": load * 1000,
+        }
+
+    rate = load * 5e6 * (1 + rng.random() * 0.05)
+    return {
+        "bytes_sent": rate / 3,
+        "bytes_recv": rate * 2 / 3,
+        "packets_sent": rate / 3 / 1400,
+        "packets_recv": rate * 2 / 3 / 1400,
+    }
+
+
+def run(workload: str, duration: float, seed: int = 0) -> dict:
+    """
+    Return the counters of an aggregator fed with `duration` seconds of the workload
+    """
+    rng = random.Random(seed)
+    aggregator = UsageAggregator(scales=dict(UsageLogger.activity_scales))
+
+    intervals = {
+        metric: LOG_METRIC_INTERVALS.get(metric, LOG_INTERVAL) for metric in UsageLogger.metrics
+    }
+    due = dict.fromkeys(intervals, 0.0)
+    samples = {}
+
+    step = min(intervals.values())
+    next_log = 0.0
+    t = 0.0
+
+    while t < duration:
+        load = _level(workload, t, rng)
+
+        for metric, interval in intervals.items():
+            if due[metric] <= t:
+                samples[metric] = _sample(metric, load, rng)
+                aggregator.add(metric, t, samples[metric])
+                due[metric] += interval
+
+        if next_log <= t:
+            log = {
+                "timestamp": 1700000000 + int(t),
+                "monotonic": t,
+                "uptime": 1699990000.0,
+                "battery": 100,
+                "sampled_at": dict.fromkeys(samples, t),
+                **samples,
+            }
+            aggregator.rollup(log, t)
+            next_log += LOG_INTERVAL
+
+        t += step
+
+    return aggregator.stats.as_dict()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--duration", type=float, default=3600, help="simulated seconds")
+    args = arg_parser.parse_args()
+
+    print(f"{'workload':<10}{'raw logs':>10}{'sent':>8}{'raw KB':>10}{'sent KB':>10}{'reduction':>11}")
+    for workload in WORKLOADS:
+        stats = run(workload, args.duration)
+        print(
+            f"{workload:<10}{stats['raw_logs']:>10}{stats['sent_logs']:>8}"
+            f"{stats['raw_bytes'] / 1024:>10.1f}{stats['sent_bytes'] / 1024:>10.1f}"
+            f"{stats['reduction']:>10.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Microbenchmark of `AuditParser._parse_event` for each record type in
+`AuditParser.EVENT_TYPES`, before and after the single pass tokenizer:
+
+- before: one regex compiled and searched per field, per record
+- after: `tokenize` splits the record once, fields are dictionary lookups
+
+Records of multi-record events (`EXECVE`, `CONFIG_CHANGE`) are correlated
+and merged after the tokenizer, so the "after" side does more work for them.
+
+Run: `python -m attestation_agent.benchmarks.audit`
+"""
+
+import argparse
+import os
+import re
+import tempfile
+import time
+
+from attestation_agent.benchmarks.synthetic import audit_records
+from attestation_agent.logs.parsers import AuditEvent, AuditParser
+
+# Field patterns of the regex based parser, per record type
+_LEGACY_USER = (
+    r"""pid=(?P<pid>[0-9]+)""",
+    r"""uid=(?P<uid>[0-9]+)""",
+    r"""op=(?P<operation>[A-Za-z_:]+)""",
+    r"""grantors=(?P<grantors>[A-Za-z_,]+)""",
+    r"""acct=(?P<account>[A-Za-z_"\-]+)""",
+    r"""exe=(?P<exec_path>[A-Za-z_/\-"]+)""",
+    r"""hostname=(?P<hostname>[A-Za-z0-9_\-\?\.]+)""",
+    r"""addr=(?P<address>[a-z0-9\.:]+)""",
+    r"""terminal=(?P<terminal>[A-Za-z0-9/\-]+)""",
+)
+_LEGACY_SERVICE = (
+    r"""pid=(?P<pid>[0-9]+)""",
+    r"""uid=(?P<uid>[0-9]+)""",
+    r"""unit=(?P<unit>[a-zA-Z\-]+)""",
+    r"""comm=(?P<command>[a-zA-Z\-"]+)""",
+    r"""exe=(?P<exec_path>[a-zA-Z\-/"]+)""",
+)
+LEGACY_PATTERNS = {
+    "CONFIG_CHANGE": None,
+    "KERNEL": None,
+    "EXECVE": None,
+    "SERVICE_START": _LEGACY_SERVICE,
+    "SERVICE_STOP": _LEGACY_SERVICE,
+    "ADD_USER": None,
+    "ADD_GROUP": None,
+    "ANOM_LOGIN_FAILURES": None,
+    "CHGRP_ID": (
+        r"""op=(?P<operation>[a-zA-Z0-9_\-]+)""",
+        r"""target=(?P<target>[a-zA-Z0-9_\-"]+)""",
+        r"""name=(?P<name>[a-zA-Z0-9_\-"]+)""",
+    ),
+    "CHUSER_ID": (
+        r"""op=(?P<operation>[a-zA-Z0-9_\-]+)""",
+        r"""acct=(?P<account>[a-zA-Z_"\-]+)""",
+        r"""exe=(?P<exec_path>[a-zA-Z_"\-/]+)""",
+        r"""hostname=(?P<exec_path>[a-zA-Z_"\-\.\?]+)""",
+        r"""addr=(?P<address>[a-z0-9\.:]+)""",
+        r"""terminal=(?P<terminal>[A-Za-z0-9/\-]+)""",
+        r"""old=(?P<old_value>[a-zA-Z0-9_"\-]+)""",
+        r"""new=(?P<new_value>[a-zA-Z0-9_"\-]+)""",
+    ),
+    "USER_LOGIN": (r"""id=(?P<user_id>[0-9]+)""",) + _LEGACY_USER,
+    "USER_ACCT": _LEGACY_USER,
+    "USER_AUTH": _LEGACY_USER,
+}
+
+_legacy_timestamp_re = re.compile(r"\d{10}\.\d{3}")
+_legacy_event_type_re = re.compile(r"type=(?P<type>[A-Z_]+)")
+
+
+def legacy_parse(record: str) -> AuditEvent | None:
+    """
+    Parse a record the way the regex based parser used to
+    """
+    timestamp = int(float(_legacy_timestamp_re.search(record).group(0)))
+    event_type = _legacy_event_type_re.search(record).group("type")
+
+    if event_type not in LEGACY_PATTERNS:
+        return None
+
+    attrs = {}
+
+    for pattern in LEGACY_PATTERNS[event_type] or ():
+        p_obj = re.compile(pattern)
+        try:
+            for key, value in p_obj.search(record).groupdict().items():
+                value = value.strip('"')
+                value = int(value) if value.isdigit() else value
+                attrs[key] = value
+        except AttributeError:
+            pass
+
+    return AuditEvent(timestamp=timestamp, type=event_type, raw_content=record, **attrs)
+
+
+def _rate(parse, records: list[str], repeat: int, finish=None) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for record in records:
+            parse(record)
+        if finish is not None:
+            finish()
+    return len(records) * repeat / (time.perf_counter() - start)
+
+
+def run(events: int, repeat: int) -> dict:
+    """
+    Return the records per second parsed before and after, per record type
+    """
+    fd, path = tempfile.mkstemp(suffix=".log")
+    os.close(fd)
+
+    try:
+        parser = AuditParser(path)
+
+        def parse(record: str):
+            parser._data = record
+            return parser._parse_event()
+
+        results = {}
+        for event_type in AuditParser.EVENT_TYPES:
+            records = audit_records(event_type, events)
+            results[event_type] = {
+                "before": _rate(legacy_parse, records, repeat),
+                "after": _rate(parse, records, repeat, parser._drain),
+            }
+    finally:
+        os.remove(path)
+
+    return results
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--events", type=int, default=2_000, help="events per record type")
+    arg_parser.add_argument("--repeat", type=int, default=5, help="passes over the records")
+    args = arg_parser.parse_args()
+
+    print(f"{'record type':<22}{'before':>14}{'after':>14}{'speedup':>10}  (records/sec)")
+    for event_type, result in run(args.events, args.repeat).items():
+        before, after = result["before"], result["after"]
+        print(f"{event_type:<22}{before:>14,.0f}{after:>14,.0f}{after / before:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
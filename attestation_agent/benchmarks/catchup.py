@@ -0,0 +1,112 @@
+"""
+Benchmark of the catch-up mode on a large synthetic `auth.log`, before and
+after parsing the backlog in worker processes:
+
+- before: `parse_lines` on a single core, block by block
+- after: `catch_up` with one worker process per core
+
+Run: `python -m attestation_agent.benchmarks.catchup --size 1G`
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from attestation_agent.benchmarks import parse_size
+from attestation_agent.benchmarks.synthetic import generate_auth_log
+from attestation_agent.config import CATCHUP_CHUNK_SIZE, CATCHUP_WORKERS
+from attestation_agent.logs.parsers import AuthParser
+from attestation_agent.logs.parsers.catchup import catch_up
+
+
+def _take_events(parser: AuthParser) -> None:
+    # Stand in for the dispatcher, don't let the events pile up in memory
+    with parser.lock:
+        parser.flush()
+
+
+def parse_single(path: str) -> int:
+    """
+    Parse the whole file on a single core
+    """
+    parser = AuthParser(path)
+
+    while parser.parse_lines():
+        _take_events(parser)
+
+    parser.watcher.close()
+    return parser._line
+
+
+def parse_parallel(path: str, workers: int, chunk_size: int) -> int:
+    """
+    Parse the whole file with `catch_up`
+    """
+    parser = AuthParser(path)
+    parser.on_events = _take_events
+
+    catch_up(parser, workers, chunk_size, threshold=0)
+
+    parser.watcher.close()
+    return parser._line
+
+
+def _rate(func, *args) -> tuple[int, float]:
+    start = time.perf_counter()
+    count = func(*args)
+    return count, count / (time.perf_counter() - start)
+
+
+def run(size: int, workers: int, chunk_size: int, path: str | None = None) -> dict:
+    """
+    Run the benchmark on a synthetic log of `size` bytes and return
+    the measured lines per second.
+    """
+    cleanup = path is None
+
+    if path is None:
+        fd, path = tempfile.mkstemp(suffix=".log")
+        os.close(fd)
+
+    try:
+        lines = generate_auth_log(path, size)
+        size = os.path.getsize(path)
+
+        _, before = _rate(parse_single, path)
+        _, after = _rate(parse_parallel, path, workers, chunk_size)
+    finally:
+        if cleanup:
+            os.remove(path)
+
+    return {
+        "size_bytes": size,
+        "lines": lines,
+        "workers": workers,
+        "parse_lines_per_second": {"before": before, "after": after},
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--size", default="1G", help="size of the synthetic log")
+    arg_parser.add_argument(
+        "--workers", type=int, default=max(CATCHUP_WORKERS, 2),
+        help="number of worker processes"
+    )
+    arg_parser.add_argument(
+        "--chunk-size", default=str(CATCHUP_CHUNK_SIZE), help="size of the chunks"
+    )
+    arg_parser.add_argument("--path", help="where to write the synthetic log")
+    args = arg_parser.parse_args()
+
+    results = run(parse_size(args.size), args.workers, parse_size(args.chunk_size), args.path)
+
+    before = results["parse_lines_per_second"]["before"]
+    after = results["parse_lines_per_second"]["after"]
+    print(f"Synthetic auth.log: {results['lines']} lines, {results['workers']} workers")
+    print(f"parse_lines_per_second: before={before:,.0f} after={after:,.0f} ({after / before:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Benchmark of the socket.io channel of the usage logs through an outage of
+a local stand-in of the attestation server:
+
+- logs emitted, received and acknowledged before, during and after the
+  outage, and those skipped by the downsampling or dropped by the buffer
+- time to reconnect once the server is back, with the channel's backoff
+- duplicated logs received (the server stores logs by timestamp)
+
+Run: `python -m attestation_agent.benchmarks.channel`
+"""
+
+import argparse
+import logging
+import socket
+import time
+from multiprocessing import Process, Queue
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+import socketio
+from engineio.payload import Payload
+
+from attestation_agent.transport import LogChannel
+
+
+class _WSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def _serve(port: int, received: Queue) -> None:
+    """
+    Run a socket.io server acknowledging the `collect_log` messages like
+    the attestation server, over long-polling
+    """
+    # The replayed messages are posted at once, the Node server has no limit
+    Payload.max_decode_packets = 1024
+    sio = socketio.Server(async_mode="threading", logger=False, engineio_logger=False)
+
+    @sio.on("collect_log")
+    def collect_log(sid, machine_id, timestamp, type, data):
+        received.put(timestamp)
+        return True
+
+    httpd = make_server(
+        "127.0.0.1", port, socketio.WSGIApp(sio),
+        server_class=_WSGIServer, handler_class=_QuietHandler
+    )
+    httpd.serve_forever()
+
+
+class _StandInServer:
+    """
+    Stand-in of the attestation server, in its own process so that it can
+    crash: its connections are reset when it is stopped
+    """
+
+    def __init__(self, port: int) -> None:
+        self.port: int = port
+        self.received: list[int] = []
+        self._queue: Queue = Queue()
+        self._process: Process = None
+
+    def start(self) -> None:
+        self._process = Process(target=_serve, args=(self.port, self._queue), daemon=True)
+        self._process.start()
+
+        # Wait for the server to listen
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", self.port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.01)
+
+    def stop(self) -> None:
+        self._process.kill()
+        self._process.join()
+
+        while not self._queue.empty():
+            self.received.append(self._queue.get())
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def run(rate: float, before: float, outage: float, after: float, replay_max: int, buffer_size: int) -> dict:
+    """
+    Emit logs at `rate` per second through a `LogChannel`, with the server
+    down for `outage` seconds, and return what the server received
+    """
+    port = _free_port()
+    server = _StandInServer(port)
+    server.start()
+
+    channel = LogChannel(
+        f"http://127.0.0.1:{port}", {"MACHINE-ID": "benchmark"},
+        buffer_size=buffer_size, backoff_min=0.1, backoff_max=1.0, replay_max=replay_max,
+    )
+    channel.connect()
+    channel.start()
+
+    emitted = 0
+    phases = {}
+    reconnected = None
+
+    def emit_for(duration: float) -> None:
+        nonlocal emitted
+        end = time.monotonic() + duration
+
+        while time.monotonic() < end:
+            emitted += 1
+            channel.emit("collect_log", ("benchmark", emitted, "usage", {"cpu": emitted}))
+            time.sleep(1.0 / rate)
+
+    emit_for(before)
+    phases["before"] = emitted
+
+    server.stop()
+    emit_for(outage)
+    phases["outage"] = emitted - phases["before"]
+
+    server.start()
+    back = time.monotonic()
+    connects = channel.connects
+
+    end = back + after
+    while time.monotonic() < end:
+        if reconnected is None and channel.connects > connects:
+            reconnected = time.monotonic() - back
+
+        emitted += 1
+        channel.emit("collect_log", ("benchmark", emitted, "usage", {"cpu": emitted}))
+        time.sleep(1.0 / rate)
+
+    phases["after"] = emitted - phases["before"] - phases["outage"]
+
+    # Let the last messages be acknowledged
+    time.sleep(0.5)
+    stats = channel.as_dict()
+    channel.stop()
+    server.stop()
+
+    received = server.received
+    return {
+        "emitted": phases,
+        "received": len(set(received)),
+        "duplicates": len(received) - len(set(received)),
+        "reconnect": reconnected,
+        "channel": stats,
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--rate", type=float, default=20.0, help="logs emitted per second")
+    arg_parser.add_argument("--before", type=float, default=2.0, help="seconds before the outage")
+    arg_parser.add_argument("--outage", type=float, default=5.0, help="seconds the server is down")
+    arg_parser.add_argument("--after", type=float, default=3.0, help="seconds after the outage")
+    arg_parser.add_argument("--replay-max", type=int, default=32, help="logs replayed after the outage")
+    arg_parser.add_argument("--buffer-size", type=int, default=720, help="logs buffered")
+    args = arg_parser.parse_args()
+
+    # The client logs the failed connections, reported by the channel already
+    logging.getLogger("socketio").setLevel(logging.CRITICAL)
+    logging.getLogger("engineio").setLevel(logging.CRITICAL)
+
+    result = run(args.rate, args.before, args.outage, args.after, args.replay_max, args.buffer_size)
+    emitted = result["emitted"]
+    stats = result["channel"]
+    reconnect = result["reconnect"]
+
+    print(f"emitted:     {sum(emitted.values())} ({emitted['before']} before, "
+          f"{emitted['outage']} during, {emitted['after']} after the outage)")
+    print(f"received:    {result['received']} ({result['duplicates']} duplicates)")
+    print(f"acked:       {stats['acked']}, expired: {stats['expired']}")
+    print(f"skipped:     {stats['skipped']} (downsampled), dropped: {stats['dropped']} (buffer full)")
+    print(f"connects:    {stats['connects']}, reconnected after "
+          + (f"{reconnect * 1000:.0f} ms" if reconnect is not None else "-"))
+
+
+if __name__ == "__main__":
+    main()
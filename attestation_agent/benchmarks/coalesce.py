@@ -0,0 +1,93 @@
+"""
+Benchmark of the coalescing of repetitive events (see `EventCoalescer`):
+
+- events sent out of the events parsed from the `auth.log` of a busy host
+  (cron sessions every minute, password scanners) and from a mix of audit
+  events, with and without coalescing
+- distinct events (by coalescing key) left out, which must be none, and
+  the events represented by those sent (the repeats counted in)
+- CPU time spent coalescing, per event, and the windows kept open at most
+
+Run: `python -m attestation_agent.benchmarks.coalesce`
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from attestation_agent.benchmarks.synthetic import audit_mix, busy_auth_lines
+from attestation_agent.config import COALESCE_KEYS, COALESCE_WINDOW
+from attestation_agent.logs.parsers import (AuditParser, AuthParser,
+                                            EventCoalescer)
+
+
+def _events(parser_class, lines: list[str]) -> list:
+    fd, path = tempfile.mkstemp(suffix=".log")
+    os.close(fd)
+
+    try:
+        parser = parser_class(path)
+        return parser._parse_block(lines) + parser._finish()
+    finally:
+        os.remove(path)
+
+
+def run(seconds: int, audit: int, window: float, batch_size: int) -> dict:
+    """
+    Return the events in and out of the coalescer for each log, when they
+    are dispatched in batches of `batch_size` events
+    """
+    results = {}
+
+    for name, parser_class, lines in (
+        ("auth", AuthParser, busy_auth_lines(seconds)),
+        ("audit", AuditParser, audit_mix(audit)),
+    ):
+        events = _events(parser_class, lines)
+        coalescer = EventCoalescer(window, COALESCE_KEYS)
+        keys = {coalescer._key(event) for event in events}
+
+        sent = []
+        windows = 0
+        start = time.process_time()
+
+        for index in range(0, len(events), batch_size):
+            sent.extend(coalescer.add(events[index:index + batch_size]))
+            windows = max(windows, len(coalescer._windows))
+
+        sent.extend(coalescer.flush())
+        elapsed = time.process_time() - start
+
+        results[name] = {
+            "in": len(events),
+            "out": len(sent),
+            "missing": len(keys - {coalescer._key(event) for event in sent}),
+            "represented": sum((event.extras or {}).get("count", 1) for event in sent),
+            "windows": windows,
+            "per_event": elapsed / len(events),
+        }
+
+    return results
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--seconds", type=int, default=3600, help="seconds of auth.log of a busy host")
+    arg_parser.add_argument("--audit", type=int, default=20_000, help="audit events")
+    arg_parser.add_argument("--window", type=float, default=COALESCE_WINDOW or 60.0, help="coalescing window")
+    arg_parser.add_argument("--batch-size", type=int, default=64, help="events per dispatch")
+    args = arg_parser.parse_args()
+
+    results = run(args.seconds, args.audit, args.window, args.batch_size)
+
+    print(f"{'log':<8}{'events':>10}{'sent':>10}{'ratio':>8}{'missing':>9}{'counted':>10}{'windows':>9}{'us/event':>10}")
+    for name, values in results.items():
+        print(
+            f"{name:<8}{values['in']:>10,}{values['out']:>10,}{values['in'] / values['out']:>8.1f}"
+            f"{values['missing']:>9}{values['represented']:>10,}{values['windows']:>9}{values['per_event'] * 1e6:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
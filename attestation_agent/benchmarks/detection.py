@@ -0,0 +1,91 @@
+"""
+Benchmark of the streaming detections (see `DetectionEngine`):
+
+- events run through the detections of `DETECTIONS_FILE` per second, out
+  of the events parsed from the `auth.log` of a busy host (cron sessions,
+  password scanners) and from a mix of audit events, in dispatches of
+  `batch_size` events
+- alerts raised per detection
+- keys tracked at most with `max_keys` keys per detection, when the
+  scanners rotate through many addresses
+
+Run: `python -m attestation_agent.benchmarks.detection`
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from attestation_agent.benchmarks.synthetic import audit_mix, busy_auth_lines
+from attestation_agent.config import DETECTION_MAX_KEYS, DETECTIONS_FILE
+from attestation_agent.detection import DetectionEngine, load_detections
+from attestation_agent.logs.parsers import AuditParser, AuthParser
+
+
+def _events(seconds: int, audit: int, scanners: int) -> list:
+    fd, path = tempfile.mkstemp(suffix=".log")
+    os.close(fd)
+
+    try:
+        events = []
+        for parser, lines in (
+            (AuthParser(path), busy_auth_lines(seconds, scanners=scanners)),
+            (AuditParser(path), audit_mix(audit)),
+        ):
+            events.extend(parser._parse_block(lines) + parser._finish())
+    finally:
+        os.remove(path)
+
+    return events
+
+
+def run(seconds: int, audit: int, scanners: int, batch_size: int, max_keys: int) -> dict:
+    """
+    Return the events per second run through the detections, the alerts
+    raised per detection and the keys tracked at the end
+    """
+    events = _events(seconds, audit, scanners)
+    engine = DetectionEngine(load_detections(DETECTIONS_FILE), max_keys)
+
+    alerts = []
+    start = time.process_time()
+
+    for index in range(0, len(events), batch_size):
+        alerts.extend(engine.process(events[index:index + batch_size]))
+
+    elapsed = time.process_time() - start
+
+    by_rule = {detection.name: 0 for detection in engine.detections}
+    for alert in alerts:
+        by_rule[alert.rule] += 1
+
+    return {
+        "events": len(events),
+        "rate": len(events) / elapsed,
+        **engine.as_dict(),
+        "raised": by_rule,
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--seconds", type=int, default=4 * 3600, help="seconds of auth.log of a busy host")
+    arg_parser.add_argument("--audit", type=int, default=50_000, help="audit events")
+    arg_parser.add_argument("--scanners", type=int, default=50, help="addresses trying passwords")
+    arg_parser.add_argument("--batch-size", type=int, default=64, help="events per dispatch")
+    arg_parser.add_argument("--max-keys", type=int, default=DETECTION_MAX_KEYS, help="keys per detection")
+    args = arg_parser.parse_args()
+
+    result = run(args.seconds, args.audit, args.scanners, args.batch_size, args.max_keys)
+
+    print(f"events:  {result['events']:,}, {result['rate']:,.0f} events/s, "
+          f"{1e6 / result['rate']:.1f} us/event")
+    print(f"matched: {result['matched']:,}, keys {result['keys']:,}, evicted {result['evicted']:,}")
+
+    for name, count in result["raised"].items():
+        print(f"alerts {name:<24}{count:>6,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Benchmark of the event latency: time from a line being appended to a log
+file to its event being handed over to the shipper, before and after
+event driven wakeups:
+
+- before: parsers poll the file every second, the main loop sleeps a second
+- after: parsers wake up on inotify, the main loop wakes up on a signal
+
+Also reports the CPU time used by the agent threads while the log is idle.
+
+Run: `python -m attestation_agent.benchmarks.latency`
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from threading import Event as ThreadEvent
+from threading import Thread
+
+from attestation_agent.logs.parsers import AuthParser
+from attestation_agent.logs.parsers.watch import create_watcher
+
+
+def measure(backend: str, signalled: bool, count: int, interval: float, idle: float) -> dict:
+    """
+    Append `count` lines, one every `interval` seconds, to a log file tailed
+    by an `AuthParser` using the given watch backend, and collect the latency
+    of each line. `signalled` selects whether the consumer (the main loop)
+    waits for a signal from the parser or sleeps for a fixed second.
+    """
+    fd, path = tempfile.mkstemp(suffix=".log")
+    os.close(fd)
+
+    parser = AuthParser(path)
+    parser.watcher.close()
+    parser.watcher = create_watcher(path, backend)
+
+    ready = ThreadEvent()
+    done = ThreadEvent()
+    written: dict[int, float] = {}
+    latencies: list[float] = []
+
+    if signalled:
+        parser.on_events = lambda parser: ready.set()
+
+    def consume():
+        # Same as the main loop of the agent
+        while not done.is_set():
+            ready.clear()
+
+            with parser.lock:
+                events = parser.flush()
+
+            now = time.perf_counter()
+            latencies.extend(
+                now - written[int(event.action.split()[-1])] for event in events
+            )
+
+            if signalled:
+                ready.wait(1)
+            else:
+                time.sleep(1)
+
+    threads = [Thread(target=parser.run), Thread(target=consume)]
+    for thread in threads:
+        thread.start()
+
+    try:
+        with open(path, "a") as fp:
+            for seq in range(count):
+                written[seq] = time.perf_counter()
+                fp.write(f"Oct 18 10:00:00 bench probe[1]: latency probe {seq}\n")
+                fp.flush()
+                time.sleep(interval)
+
+        # Wait for the stragglers, then measure CPU usage while idle
+        time.sleep(2.5)
+        cpu_start = time.process_time()
+        time.sleep(idle)
+        idle_cpu = (time.process_time() - cpu_start) / idle
+    finally:
+        done.set()
+        ready.set()
+        parser.stop()
+        for thread in threads:
+            thread.join()
+        os.remove(path)
+
+    latencies.sort()
+    return {
+        "backend": backend,
+        "events": len(latencies),
+        "latency_p50_ms": statistics.median(latencies) * 1000,
+        "latency_p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "latency_max_ms": latencies[-1] * 1000,
+        "idle_cpu_percent": idle_cpu * 100,
+    }
+
+
+def run(count: int, interval: float, idle: float) -> dict:
+    return {
+        "before": measure("poll", False, count, interval, idle),
+        "after": measure("inotify", True, count, interval, idle),
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--count", type=int, default=200, help="number of lines to append")
+    arg_parser.add_argument(
+        "--interval", type=float, default=0.023, help="seconds between two appended lines"
+    )
+    arg_parser.add_argument(
+        "--idle", type=float, default=5.0, help="seconds of idle time to measure CPU usage"
+    )
+    args = arg_parser.parse_args()
+
+    for name, result in run(args.count, args.interval, args.idle).items():
+        print(
+            f"{name} ({result['backend']}): {result['events']} events, "
+            f"p50={result['latency_p50_ms']:.1f}ms p99={result['latency_p99_ms']:.1f}ms "
+            f"max={result['latency_max_ms']:.1f}ms idle_cpu={result['idle_cpu_percent']:.3f}%"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Memory benchmark of the events queued by the parsers, before and after
+the slotted event model:
+
+- before: every attribute in a per-instance `__dict__`, serialized into a
+  dict whose `props` is a nested JSON string
+- after: `__slots__` for the fixed fields and an `extras` mapping only for
+  record specific attributes, serialized once by `Event.to_dict`
+
+Reports the bytes allocated per queued event (the strings of the log lines
+are shared by both and not counted) and the events serialized per second.
+
+Run: `python -m attestation_agent.benchmarks.memory`
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from collections import deque
+
+from attestation_agent.benchmarks.synthetic import (AUDIT_TEMPLATES,
+                                                    audit_records, auth_lines)
+from attestation_agent.logs.parsers import AuditParser, AuthParser
+
+
+class LegacyEvent:
+    """
+    Event as it used to be, with its attributes in the instance `__dict__`
+    """
+
+    log_file: str = None
+    type: str = None
+
+    def __init__(self, **kwargs) -> None:
+        _defaults = {
+            "timestamp": None,
+            "action": None,
+            "raw_content": None,
+        }
+
+        for attr, def_value in _defaults.items():
+            setattr(self, attr, kwargs.get(attr, def_value))
+
+        self.__dict__.update(kwargs)
+
+
+def legacy_serialize(event: LegacyEvent, machine_id: str) -> dict:
+    """
+    Serialize an event the way `handle_events` used to
+    """
+    event_dict = {
+        "machine_id": machine_id,
+        "timestamp": event.timestamp,
+        "type": event.type,
+        "log_filepath": event.log_file,
+        "props": "",
+    }
+    event_dict["props"] = json.dumps({
+        key: value for key, value in event.__dict__.items() if key not in event_dict
+    })
+    return event_dict
+
+
+def _parse(parser_cls, lines: list[str]) -> list:
+    """
+    Parse the lines with a parser of the given class and return the events
+    """
+    fd, path = tempfile.mkstemp(suffix=".log")
+
+    try:
+        with os.fdopen(fd, "w") as fp:
+            fp.write("\n".join(lines) + "\n")
+
+        parser = parser_cls(path)
+        while parser.parse_lines():
+            pass
+
+        # Complete the multi-record events still open
+        if isinstance(parser, AuditParser):
+            parser.correlator.window = 0
+            parser.parse_lines()
+
+        return list(parser.flush())
+    finally:
+        os.remove(path)
+
+
+def _kwargs(event) -> dict:
+    kwargs = event.props()
+    kwargs["timestamp"] = event.timestamp
+
+    # The record type is per event for audit events, per class otherwise
+    if "type" in type(event).__slots__:
+        kwargs["type"] = event.type
+
+    return kwargs
+
+
+def _bytes_per_event(factory, samples: list[dict], count: int) -> float:
+    """
+    Return the bytes allocated per event when queueing `count` events
+    """
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+
+    queue = deque(factory(samples[i % len(samples)]) for i in range(count))
+
+    end, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    del queue
+    return (end - start) / count
+
+
+def _serialize_rate(serialize, events: list, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        json.dumps([serialize(event) for event in events])
+    return len(events) * repeat / (time.perf_counter() - start)
+
+
+def run(count: int, repeat: int) -> dict:
+    """
+    Return the bytes per queued event and the serialization rate,
+    before and after, per log
+    """
+    audit_lines = []
+    for event_type in AUDIT_TEMPLATES:
+        audit_lines.extend(audit_records(event_type, 100))
+
+    results = {}
+    for name, parser_cls, lines in (
+        ("auth", AuthParser, auth_lines(1_000)),
+        ("audit", AuditParser, audit_lines),
+    ):
+        events = _parse(parser_cls, lines)
+        event_cls = type(events[0])
+        samples = [_kwargs(event) for event in events]
+        legacy_cls = type(f"Legacy{event_cls.__name__}", (LegacyEvent,), {
+            "log_file": event_cls.log_file,
+            "type": event_cls.type if isinstance(event_cls.type, str) else None,
+        })
+
+        def before(kwargs):
+            return legacy_cls(**kwargs)
+
+        def after(kwargs):
+            return event_cls(**kwargs)
+
+        legacy_events = [before(kwargs) for kwargs in samples]
+
+        results[name] = {
+            "bytes_per_event": {
+                "before": _bytes_per_event(before, samples, count),
+                "after": _bytes_per_event(after, samples, count),
+            },
+            "serialized_per_second": {
+                "before": _serialize_rate(
+                    lambda event: legacy_serialize(event, "machine"), legacy_events, repeat
+                ),
+                "after": _serialize_rate(
+                    lambda event: event.to_dict("machine"), events, repeat
+                ),
+            },
+        }
+
+    return results
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--events", type=int, default=200_000, help="events to queue")
+    arg_parser.add_argument("--repeat", type=int, default=20, help="serialization passes")
+    args = arg_parser.parse_args()
+
+    for name, result in run(args.events, args.repeat).items():
+        for metric, values in result.items():
+            before, after = values["before"], values["after"]
+            print(f"{name} {metric}: before={before:,.0f} after={after:,.0f}")
+
+
+if __name__ == "__main__":
+    main()
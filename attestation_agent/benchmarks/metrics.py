@@ -0,0 +1,98 @@
+"""
+Benchmark of the overhead of the self-instrumentation of the agent:
+
+- cost of a single counter increment and histogram observation
+- parsing throughput of `AuthParser.parse_lines` with the parser metrics
+  updated, and with them replaced by no-ops
+
+Run: `python -m attestation_agent.benchmarks.metrics`
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from attestation_agent.benchmarks.synthetic import generate_auth_log
+from attestation_agent.logs.parsers import AuthParser
+from attestation_agent.metrics import Registry
+
+
+class _NoOp:
+    def inc(self, amount: float = 1) -> None:
+        pass
+
+    def observe(self, value: float) -> None:
+        pass
+
+
+def _op_cost(operation, count: int) -> float:
+    start = time.perf_counter()
+    for _ in range(count):
+        operation(1)
+    return (time.perf_counter() - start) / count
+
+
+def _parse_rate(path: str, instrumented: bool) -> float:
+    parser = AuthParser(path)
+
+    if not instrumented:
+        parser._lines_metric = parser._events_metric = parser._block_metric = _NoOp()
+
+    start = time.perf_counter()
+    lines = 0
+    while parser.parse_lines():
+        lines = parser._line
+        parser.flush()
+
+    parser.watcher.close()
+    return lines / (time.perf_counter() - start)
+
+
+def run(size: int, repeat: int, count: int) -> dict:
+    """
+    Return the cost of the metric operations and the parsing rates
+    """
+    registry = Registry()
+    counter = registry.counter("counter", "benchmark counter", ("label",)).labels(label="value")
+    histogram = registry.histogram("histogram", "benchmark histogram", ("label",)).labels(label="value")
+
+    fd, path = tempfile.mkstemp(suffix=".log")
+    os.close(fd)
+
+    try:
+        generate_auth_log(path, size)
+
+        rates = {"plain": [], "instrumented": []}
+        for _ in range(repeat):
+            rates["plain"].append(_parse_rate(path, False))
+            rates["instrumented"].append(_parse_rate(path, True))
+
+        return {
+            "counter": _op_cost(counter.inc, count),
+            "histogram": _op_cost(histogram.observe, count),
+            "plain": max(rates["plain"]),
+            "instrumented": max(rates["instrumented"]),
+        }
+    finally:
+        os.remove(path)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--size", type=int, default=32 << 20, help="log size in bytes")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="runs of each parser")
+    arg_parser.add_argument("--count", type=int, default=1_000_000, help="metric operations")
+    args = arg_parser.parse_args()
+
+    result = run(args.size, args.repeat, args.count)
+
+    print(f"counter.inc:        {result['counter'] * 1e9:8.0f} ns")
+    print(f"histogram.observe:  {result['histogram'] * 1e9:8.0f} ns")
+    print(f"parse, no metrics:  {result['plain']:12,.0f} lines/sec")
+    print(f"parse, metrics:     {result['instrumented']:12,.0f} lines/sec")
+    print(f"overhead:           {(1 - result['instrumented'] / result['plain']) * 100:8.2f} %")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Benchmark of the CPU time spent building the table of top processes, with
+a few thousand extra (sleeping) processes on the host:
+
+- full: every process is read at each scan, with a new `psutil.Process`
+  each time, as `psutil.process_iter()` without its cache does
+- incremental: `ProcessTable`, handles are cached and the scans stop at
+  the CPU budget
+
+Run: `python -m attestation_agent.benchmarks.processes`
+"""
+
+import argparse
+import subprocess
+import time
+
+import psutil
+
+from attestation_agent.config import LOG_PROCESS_CPU_BUDGET
+from attestation_agent.logs.loggers.processes import ProcessTable
+
+
+def _full_scan() -> None:
+    for pid in psutil.pids():
+        try:
+            process = psutil.Process(pid)
+            with process.oneshot():
+                process.cpu_times()
+                process.memory_info()
+                process.name()
+        except (psutil.Error, OSError):
+            pass
+
+
+def run(processes: int, scans: int, interval: float, budget: float) -> dict:
+    """
+    Return the mean CPU time per scan of the full and incremental scans,
+    with `processes` extra processes, and the scans needed by the incremental
+    one to read every process
+    """
+    children = [
+        subprocess.Popen(["sleep", "600"], stdout=subprocess.DEVNULL)
+        for _ in range(processes)
+    ]
+
+    try:
+        start = time.thread_time()
+        for _ in range(scans):
+            _full_scan()
+        full = (time.thread_time() - start) / scans
+
+        # Simulated clock: a scan every `interval` seconds
+        table = ProcessTable(budget=budget)
+        now = time.monotonic()
+        cpu_time = 0.0
+        read = 0
+        rounds = None
+
+        for scan in range(1, scans + 1):
+            now += interval
+            table.scan(now)
+            table.table()
+            cpu_time += table.last_cpu_time
+            read += table.last_read
+
+            if rounds is None and read >= len(table.processes):
+                rounds = scan
+
+        return {
+            "total": len(psutil.pids()),
+            "full": full,
+            "incremental": cpu_time / scans,
+            "allowance": budget * interval,
+            "rounds": rounds,
+        }
+    finally:
+        for child in children:
+            child.kill()
+        for child in children:
+            child.wait()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--processes", type=int, default=5000, help="extra processes")
+    arg_parser.add_argument("--scans", type=int, default=10, help="scans of each kind")
+    arg_parser.add_argument("--interval", type=float, default=5.0, help="seconds between two scans")
+    arg_parser.add_argument("--budget", type=float, default=LOG_PROCESS_CPU_BUDGET, help="CPU budget")
+    args = arg_parser.parse_args()
+
+    result = run(args.processes, args.scans, args.interval, args.budget)
+
+    print(f"processes:          {result['total']}")
+    print(f"full scan:          {result['full'] * 1000:8.1f} ms CPU per scan")
+    print(
+        f"incremental scan:   {result['incremental'] * 1000:8.1f} ms CPU per scan"
+        f" (budget {result['allowance'] * 1000:.1f} ms)"
+    )
+    print(f"scans to read all:  {result['rounds']}")
+
+
+if __name__ == "__main__":
+    main()
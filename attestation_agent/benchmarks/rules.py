@@ -0,0 +1,83 @@
+"""
+Benchmark of the rule based parsers against the hand-written ones, with
+the `auth` and `audit` sources of `attestation_agent/rules.json`:
+
+- `auth.log` lines: `AuthParser` and `RuleParser`
+- audit records of the single-record event types: `AuditParser` and
+  `RuleParser` (multi-record events are correlated by `AuditParser` only)
+
+Run: `python -m attestation_agent.benchmarks.rules`
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from attestation_agent.benchmarks.synthetic import audit_records, auth_lines
+from attestation_agent.config import RULES_FILE
+from attestation_agent.logs.parsers import (AuditParser, AuthParser,
+                                            RuleParser, RuleSet)
+
+
+def _rate(parser, lines: list[str], repeat: int) -> float:
+    # Best of the passes, the others are slowed down by the rest of the machine
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for line in lines:
+            parser._data = line
+            parser._parse_event()
+        best = min(best, time.perf_counter() - start)
+    return len(lines) / best
+
+
+def run(lines: int, repeat: int, rules_file: str = RULES_FILE) -> dict:
+    """
+    Return the lines per second parsed by the hand-written and the rule
+    based parsers, per log source
+    """
+    with open(rules_file) as fp:
+        specs = {spec["name"]: spec for spec in json.load(fp)["sources"]}
+
+    records = [
+        record
+        for event_type in AuditParser.EVENT_TYPES
+        if event_type not in AuditParser.CORRELATED_TYPES
+        for record in audit_records(event_type, lines // 8)
+    ]
+
+    fd, path = tempfile.mkstemp(suffix=".log")
+    os.close(fd)
+
+    try:
+        return {
+            "auth": {
+                "class": _rate(AuthParser(path), auth_lines(lines), repeat),
+                "rules": _rate(RuleParser(path, RuleSet(specs["auth"])), auth_lines(lines), repeat),
+            },
+            "audit": {
+                "class": _rate(AuditParser(path), records, repeat),
+                "rules": _rate(RuleParser(path, RuleSet(specs["audit"])), records, repeat),
+            },
+        }
+    finally:
+        os.remove(path)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--lines", type=int, default=20_000, help="lines per source")
+    arg_parser.add_argument("--repeat", type=int, default=5, help="passes over the lines")
+    arg_parser.add_argument("--rules", default=RULES_FILE, help="rule file")
+    args = arg_parser.parse_args()
+
+    print(f"{'source':<10}{'class':>14}{'rules':>14}{'ratio':>10}  (lines/sec)")
+    for source, result in run(args.lines, args.repeat, args.rules).items():
+        before, after = result["class"], result["rules"]
+        print(f"{source:<10}{before:>14,.0f}{after:>14,.0f}{after / before:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
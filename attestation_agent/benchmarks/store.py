@@ -0,0 +1,119 @@
+"""
+Benchmark of the local event store (see `EventStore`):
+
+- events written per second, in transactions of `STORE_BATCH_SIZE` events,
+  and bytes per event on disk
+- latency of the typical forensic queries (logins of an account, events
+  of a pid, of a type over the last hours) and their query plans, which
+  must only search indexes
+- size of the database with a size limit, once the retention ran
+
+Run: `python -m attestation_agent.benchmarks.store`
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from attestation_agent.benchmarks.synthetic import audit_mix, busy_auth_lines
+from attestation_agent.config import STORE_BATCH_SIZE
+from attestation_agent.logs.parsers import AuditParser, AuthParser
+from attestation_agent.store import EventStore
+
+
+def _events(seconds: int, audit: int) -> list:
+    fd, path = tempfile.mkstemp(suffix=".log")
+    os.close(fd)
+
+    try:
+        events = []
+        for parser, lines in (
+            (AuthParser(path), busy_auth_lines(seconds)),
+            (AuditParser(path), audit_mix(audit)),
+        ):
+            events.extend(parser._parse_block(lines) + parser._finish())
+    finally:
+        os.remove(path)
+
+    return events
+
+
+def run(seconds: int, audit: int, batch_size: int, repeat: int, max_bytes: int) -> dict:
+    """
+    Return the write throughput, the latency and plan of each query, and
+    the size of the database before and after the retention
+    """
+    events = _events(seconds, audit)
+    newest = max(event.timestamp for event in events if event.type == "AUTH")
+    newest_audit = max(event.timestamp for event in events if event.type != "AUTH")
+    pid = next(event.pid for event in events if getattr(event, "pid", None))
+
+    queries = {
+        "account": {"account": "root", "since": newest - 6 * 3600},
+        "pid": {"pid": pid},
+        "type": {"type": "USER_LOGIN", "since": newest_audit - 6 * 3600},
+        "time": {"since": newest - 600},
+    }
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = EventStore(
+            os.path.join(directory, "events.db"), batch_size=batch_size, max_age=None, max_bytes=None
+        )
+        db = store.connect()
+
+        start = time.perf_counter()
+        store.add(events)
+        store._write(db)
+        write = time.perf_counter() - start
+        size = store._size(db)
+
+        results = {"events": len(events), "rate": len(events) / write, "bytes": size / len(events)}
+        results["queries"] = {}
+
+        for name, query in queries.items():
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                rows = store.query(**query, limit=100)
+                timings.append(time.perf_counter() - start)
+
+            plan = [row["detail"] for row in store.query(**query, limit=100, explain=True)]
+            results["queries"][name] = {
+                "rows": len(rows), "seconds": statistics.median(timings), "plan": plan,
+            }
+
+        store.max_bytes = max_bytes
+        store._retain(db)
+        results["retained"] = {"before": size, "after": store._size(db), "deleted": store.deleted}
+        db.close()
+
+    return results
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--seconds", type=int, default=4 * 3600, help="seconds of auth.log of a busy host")
+    arg_parser.add_argument("--audit", type=int, default=50_000, help="audit events")
+    arg_parser.add_argument("--batch-size", type=int, default=STORE_BATCH_SIZE, help="events per transaction")
+    arg_parser.add_argument("--repeat", type=int, default=20, help="runs of each query")
+    arg_parser.add_argument("--max-bytes", type=int, default=8 << 20, help="size limit of the retention")
+    args = arg_parser.parse_args()
+
+    result = run(args.seconds, args.audit, args.batch_size, args.repeat, args.max_bytes)
+
+    print(f"written:   {result['events']:,} events, {result['rate']:,.0f} events/s, "
+          f"{result['bytes']:.0f} bytes/event")
+
+    for name, query in result["queries"].items():
+        print(f"query {name:<8} {query['rows']:>4} rows  {query['seconds'] * 1000:>7.2f} ms  "
+              + "; ".join(query["plan"]))
+
+    retained = result["retained"]
+    print(f"retention: {retained['before'] / 1024 ** 2:.1f} MiB -> {retained['after'] / 1024 ** 2:.1f} MiB, "
+          f"{retained['deleted']:,} events deleted")
+
+
+if __name__ == "__main__":
+    main()
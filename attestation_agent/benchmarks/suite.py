@@ -0,0 +1,355 @@
+"""
+Benchmark suite of the hot paths of the agent, each measured on its own
+with synthetic logs generated from fixed seeds:
+
+- `parse_lines`: `Parser.parse_lines` throughput on a realistic mix of
+  `auth.log` lines and of `audit.log` records
+- `parse_event`: `AuthParser` and `AuditParser._parse_event` per line
+  template and per audit event type
+- `serialize`: conversion of the events to the JSON sent to the server
+- `usage`: cost of each `UsageLogger` metric sample and of `_collect_log`
+- `end_to_end`: latency from a line appended to `auth.log` to its event
+  received by a local stub of the attestation server
+
+Results are printed and, with `--output`, written as JSON. With
+`--baseline`, they are compared with an earlier JSON file and the run
+fails if any of them regressed by more than `--tolerance`.
+
+Run: `python -m attestation_agent.benchmarks.suite --output results.json`
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+from attestation_agent.benchmarks import parse_size
+from attestation_agent.benchmarks.synthetic import (AUDIT_WEIGHTS,
+                                                    AUTH_TEMPLATE_NAMES,
+                                                    audit_events, audit_mix,
+                                                    auth_lines,
+                                                    generate_audit_log,
+                                                    generate_auth_log)
+from attestation_agent.logs.loggers import UsageLogger
+from attestation_agent.logs.parsers import AuditParser, AuthParser
+from attestation_agent.transport import Dispatcher, EventShipper
+
+BENCHMARKS = ("parse_lines", "parse_event", "serialize", "usage", "end_to_end")
+
+
+def _result(value: float, unit: str, higher_is_better: bool) -> dict:
+    return {"value": value, "unit": unit, "better": "higher" if higher_is_better else "lower"}
+
+
+def _temp_log() -> str:
+    fd, path = tempfile.mkstemp(suffix=".log")
+    os.close(fd)
+    return path
+
+
+def _parse_file(parser_cls, path: str) -> float:
+    parser = parser_cls(path)
+
+    try:
+        start = time.perf_counter()
+        while parser.parse_lines():
+            parser.flush()
+        elapsed = time.perf_counter() - start
+    finally:
+        parser.watcher.close()
+
+    return parser._line / elapsed
+
+
+def bench_parse_lines(args: argparse.Namespace) -> dict:
+    path = _temp_log()
+
+    try:
+        generate_auth_log(path, args.size)
+        auth = max(_parse_file(AuthParser, path) for _ in range(args.repeat))
+
+        generate_audit_log(path, args.events)
+        audit = max(_parse_file(AuditParser, path) for _ in range(args.repeat))
+    finally:
+        os.remove(path)
+
+    return {
+        "auth": _result(auth, "lines/s", True),
+        "audit": _result(audit, "lines/s", True),
+    }
+
+
+def _event_rate(parser, lines: list[str], repeat: int, finish=None) -> float:
+    best = 0.0
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for line in lines:
+            parser._data = line
+            parser._parse_event()
+        if finish is not None:
+            finish()
+        best = max(best, len(lines) / (time.perf_counter() - start))
+
+    return best
+
+
+def bench_parse_event(args: argparse.Namespace) -> dict:
+    path = _temp_log()
+    results = {}
+
+    try:
+        parser = AuthParser(path)
+        for template in AUTH_TEMPLATE_NAMES:
+            lines = auth_lines(args.events, template=template)
+            results[f"auth.{template}"] = _result(_event_rate(parser, lines, args.repeat), "lines/s", True)
+
+        parser = AuditParser(path)
+        for event_type in AUDIT_WEIGHTS:
+            records = [
+                record.replace("{id}", f"1697624101.{serial % 1000:03d}:{serial}")
+                for serial, event in enumerate(audit_events(event_type, args.events, 0), start=1)
+                for record in event
+            ]
+            rate = _event_rate(parser, records, args.repeat, parser._drain)
+            results[f"audit.{event_type}"] = _result(rate, "records/s", True)
+    finally:
+        os.remove(path)
+
+    return results
+
+
+def bench_serialize(args: argparse.Namespace) -> dict:
+    path = _temp_log()
+    results = {}
+
+    try:
+        for name, parser, lines in (
+            ("auth", AuthParser(path), auth_lines(args.events)),
+            ("audit", AuditParser(path), audit_mix(args.events)),
+        ):
+            events = parser._parse_block(lines) + parser._finish()
+
+            best = 0.0
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                json.dumps([event.to_dict("machine-id") for event in events])
+                best = max(best, len(events) / (time.perf_counter() - start))
+
+            results[name] = _result(best, "events/s", True)
+    finally:
+        os.remove(path)
+
+    return results
+
+
+def bench_usage(args: argparse.Namespace) -> dict:
+    logger = UsageLogger(detailed=True)
+    results = {}
+
+    for metric in logger.metrics:
+        samples = []
+        for _ in range(args.repeat * 5):
+            start = time.perf_counter()
+            logger.samples[metric] = (time.monotonic(), logger._sample(metric))
+            samples.append(time.perf_counter() - start)
+
+        results[f"sample.{metric}"] = _result(statistics.median(samples) * 1e6, "us", False)
+
+    samples = []
+    for _ in range(args.repeat * 5):
+        start = time.perf_counter()
+        logger._collect_log()
+        samples.append(time.perf_counter() - start)
+
+    results["collect_log"] = _result(statistics.median(samples) * 1e6, "us", False)
+    return results
+
+
+class _StubServer:
+    """
+    Stub of the attestation server, records when each marked event is received
+    """
+
+    def __init__(self) -> None:
+        received = self.received = {}
+        marker = re.compile(r"bench(\d+)")
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                # No formats endpoint, the events are sent as plain JSON
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                now = time.monotonic()
+
+                events = json.loads(body)
+                for event in events if isinstance(events, list) else [events]:
+                    match = marker.search(event["props"].get("raw_content", ""))
+                    if match is not None:
+                        received[int(match.group(1))] = now
+
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def bench_end_to_end(args: argparse.Namespace) -> dict:
+    path = _temp_log()
+    stub = _StubServer()
+
+    parser = AuthParser(path)
+    shipper = EventShipper(stub.url, spill_dir=None)
+    dispatcher = Dispatcher(shipper, "machine-id")
+    dispatcher.register(parser)
+
+    threads = [Thread(target=target, daemon=True) for target in (parser.run, dispatcher.run, shipper.run)]
+    for thread in threads:
+        thread.start()
+
+    written = {}
+
+    try:
+        with open(path, "a") as fp:
+            for index in range(args.lines):
+                fp.write(f"Jan  1 00:00:00 bastion sshd[1]: Invalid user bench{index} from 10.0.0.1 port 22\n")
+                fp.flush()
+                written[index] = time.monotonic()
+                time.sleep(args.interval)
+
+        deadline = time.monotonic() + 10
+        while len(stub.received) < len(written) and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        parser.stop()
+        dispatcher.stop()
+        shipper.stop()
+        for thread in threads:
+            thread.join(5)
+        stub.close()
+        os.remove(path)
+
+    latencies = sorted(
+        (stub.received[index] - written[index]) * 1000 for index in written if index in stub.received
+    )
+
+    # Nothing to measure, the events are lost somewhere on the way
+    if not latencies:
+        raise RuntimeError(f"none of the {len(written)} lines written reached the stub server")
+
+    return {
+        "p50": _result(statistics.median(latencies), "ms", False),
+        "p95": _result(latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)], "ms", False),
+        "max": _result(latencies[-1], "ms", False),
+        "received": _result(len(latencies) / len(written), "ratio", True),
+    }
+
+
+def run(args: argparse.Namespace) -> dict:
+    """
+    Run the selected benchmarks and return their results along with the
+    environment they ran in
+    """
+    functions = {name: globals()[f"bench_{name}"] for name in BENCHMARKS}
+    results = {}
+
+    for name in args.only or BENCHMARKS:
+        print(f"running {name} ...", file=sys.stderr, flush=True)
+        for key, result in functions[name](args).items():
+            results[f"{name}.{key}"] = result
+
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "time": int(time.time()),
+        },
+        "parameters": {
+            key: value for key, value in vars(args).items()
+            if key not in ("output", "baseline", "tolerance", "only")
+        },
+        "results": results,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Return the results which regressed by more than `tolerance` (relative)
+    compared with the baseline
+    """
+    regressions = []
+
+    for name, result in results["results"].items():
+        previous = baseline.get("results", {}).get(name)
+
+        if previous is None or not previous["value"]:
+            continue
+
+        change = result["value"] / previous["value"] - 1
+        if result["better"] == "lower":
+            change = -change
+
+        if change < -tolerance:
+            regressions.append(f"{name}: {previous['value']:.2f} -> {result['value']:.2f} {result['unit']}")
+
+    return regressions
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--only", nargs="+", choices=BENCHMARKS, help="benchmarks to run")
+    arg_parser.add_argument("--size", type=parse_size, default="16M", help="auth.log size, e.g. 512M")
+    arg_parser.add_argument("--events", type=int, default=20_000, help="events per record type")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="runs of each measure")
+    arg_parser.add_argument("--lines", type=int, default=200, help="lines of the end to end run")
+    arg_parser.add_argument("--interval", type=float, default=0.01, help="seconds between those lines")
+    arg_parser.add_argument("--output", help="write the results to this JSON file")
+    arg_parser.add_argument("--baseline", help="compare the results with this JSON file")
+    arg_parser.add_argument("--tolerance", type=float, default=0.15, help="allowed regression")
+    args = arg_parser.parse_args()
+
+    results = run(args)
+
+    for name, result in results["results"].items():
+        print(f"{name:<40}{result['value']:>16,.2f} {result['unit']}")
+
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump(results, fp, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as fp:
+            regressions = compare(results, json.load(fp), args.tolerance)
+
+        for regression in regressions:
+            print(f"regression: {regression}", file=sys.stderr)
+
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""
+Generators of synthetic log files for the benchmarks.
+"""
+
+import random
+
+MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun",
+          "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+
+# Templates of `auth.log` lines, along with their relative frequency
+AUTH_TEMPLATES = (
+    (40, "{ts} {host} CRON[{pid}]: pam_unix(cron:session): session opened for user root(uid=0) by (uid=0)"),
+    (40, "{ts} {host} CRON[{pid}]: pam_unix(cron:session): session closed for user root"),
+    (20, "{ts} {host} sshd[{pid}]: Failed password for invalid user {user} from {ip} port {port} ssh2"),
+    (10, "{ts} {host} sshd[{pid}]: Invalid user {user} from {ip} port {port}"),
+    (5, "{ts} {host} sshd[{pid}]: Accepted publickey for {user} from {ip} port {port} ssh2: ED25519 SHA256:8sKxqUwbGvAa1v4m"),
+    (5, "{ts} {host} sshd[{pid}]: pam_unix(sshd:session): session opened for user {user}(uid=1000) by (uid=0)"),
+    (5, "{ts} {host} systemd-logind[{pid}]: New session {port} of user {user}."),
+    (5, "{ts} {host} sudo:   {user} : TTY=pts/0 ; PWD=/home/{user} ; USER=root ; COMMAND=/usr/bin/apt update"),
+)
+
+# Names of the `auth.log` templates, in the same order
+AUTH_TEMPLATE_NAMES = (
+    "cron_session_opened", "cron_session_closed", "ssh_failed_password", "ssh_invalid_user",
+    "ssh_accepted", "ssh_session_opened", "logind_new_session", "sudo_command",
+)
+
+# Templates of `audit.log` records per record type, `{id}` is the
+# `<time>:<serial>` audit id. Multi-record events list all their records.
+AUDIT_TEMPLATES = {
+    "USER_AUTH": (
+        "type=USER_AUTH msg=audit({id}): pid={pid} uid=0 auid=4294967295 ses=4294967295 "
+        "subj=unconfined msg='op=PAM:authentication grantors=pam_unix acct=\"{user}\" "
+        "exe=\"/usr/sbin/sshd\" hostname={ip} addr={ip} terminal=ssh res=success'",
+    ),
+    "USER_ACCT": (
+        "type=USER_ACCT msg=audit({id}): pid={pid} uid=0 auid=4294967295 ses=4294967295 "
+        "subj=unconfined msg='op=PAM:accounting grantors=pam_unix,pam_permit acct=\"{user}\" "
+        "exe=\"/usr/sbin/cron\" hostname=? addr=? terminal=cron res=success'",
+    ),
+    "USER_LOGIN": (
+        "type=USER_LOGIN msg=audit({id}): pid={pid} uid=0 auid=1000 ses=3 subj=unconfined "
+        "msg='op=login id=1000 exe=\"/usr/sbin/sshd\" hostname=? addr={ip} "
+        "terminal=/dev/pts/0 res=success'",
+    ),
+    "SERVICE_START": (
+        "type=SERVICE_START msg=audit({id}): pid=1 uid=0 auid=4294967295 ses=4294967295 "
+        "subj=unconfined msg='unit=systemd-tmpfiles-clean comm=\"systemd\" "
+        "exe=\"/usr/lib/systemd/systemd\" hostname=? addr=? terminal=? res=success'",
+    ),
+    "SERVICE_STOP": (
+        "type=SERVICE_STOP msg=audit({id}): pid=1 uid=0 auid=4294967295 ses=4294967295 "
+        "subj=unconfined msg='unit=systemd-tmpfiles-clean comm=\"systemd\" "
+        "exe=\"/usr/lib/systemd/systemd\" hostname=? addr=? terminal=? res=success'",
+    ),
+    "ADD_USER": (
+        "type=ADD_USER msg=audit({id}): pid={pid} uid=0 auid=1000 ses=3 subj=unconfined "
+        "msg='op=add-user acct=\"{user}\" exe=\"/usr/sbin/useradd\" hostname=bastion "
+        "addr=? terminal=pts/0 res=success'",
+    ),
+    "ADD_GROUP": (
+        "type=ADD_GROUP msg=audit({id}): pid={pid} uid=0 auid=1000 ses=3 subj=unconfined "
+        "msg='op=add-group acct=\"{user}\" exe=\"/usr/sbin/groupadd\" hostname=bastion "
+        "addr=? terminal=pts/0 res=success'",
+    ),
+    "CHUSER_ID": (
+        "type=CHUSER_ID msg=audit({id}): pid={pid} uid=0 auid=1000 ses=3 subj=unconfined "
+        "msg='op=changing-shell acct=\"{user}\" exe=\"/usr/sbin/usermod\" hostname=bastion "
+        "addr=? terminal=pts/0 res=success'",
+    ),
+    "CHGRP_ID": (
+        "type=CHGRP_ID msg=audit({id}): pid={pid} uid=0 auid=1000 ses=3 subj=unconfined "
+        "msg='op=add-user-to-group target=\"{user}\" name=\"docker\" "
+        "exe=\"/usr/sbin/usermod\" hostname=bastion addr=? terminal=pts/0 res=success'",
+    ),
+    "ANOM_LOGIN_FAILURES": (
+        "type=ANOM_LOGIN_FAILURES msg=audit({id}): pid={pid} uid=0 auid=4294967295 "
+        "ses=4294967295 subj=unconfined msg='pam_faillock uid=1000 exe=\"/usr/sbin/sshd\" "
+        "hostname=? addr=? terminal=ssh res=success'",
+    ),
+    "CONFIG_CHANGE": (
+        "type=CONFIG_CHANGE msg=audit({id}): auid=4294967295 ses=4294967295 "
+        "subj=unconfined op=add_rule key=\"exec\" list=4 res=1",
+    ),
+    "KERNEL": (
+        "type=KERNEL msg=audit({id}): state=initialized audit_enabled=1 res=1",
+    ),
+    "EXECVE": (
+        "type=SYSCALL msg=audit({id}): arch=c000003e syscall=59 success=yes exit=0 "
+        "a0=55d0c1e2a8f0 a1=55d0c1e2b120 a2=55d0c1e2b3a0 a3=8 items=2 ppid={ppid} "
+        "pid={pid} auid=1000 uid=0 gid=0 euid=0 suid=0 fsuid=0 egid=0 sgid=0 fsgid=0 "
+        "tty=pts0 ses=3 comm=\"apt\" exe=\"/usr/bin/apt\" subj=unconfined key=\"exec\"",
+        "type=EXECVE msg=audit({id}): argc=3 a0=\"apt\" a1=\"install\" a2=\"{user}\"",
+        "type=CWD msg=audit({id}): cwd=\"/home/ubuntu\"",
+        "type=PATH msg=audit({id}): item=0 name=\"/usr/bin/apt\" inode=1835 dev=fd:00 "
+        "mode=0100755 ouid=0 ogid=0 rdev=00:00 nametype=NORMAL cap_fp=0 cap_fi=0 "
+        "cap_fe=0 cap_fver=0 cap_frootid=0",
+        "type=PATH msg=audit({id}): item=1 name=\"/lib64/ld-linux-x86-64.so.2\" "
+        "inode=4521 dev=fd:00 mode=0100755 ouid=0 ogid=0 rdev=00:00 nametype=NORMAL "
+        "cap_fp=0 cap_fi=0 cap_fe=0 cap_fver=0 cap_frootid=0",
+        "type=PROCTITLE msg=audit({id}): proctitle=61707400696E7374616C6C00{user_hex}",
+    ),
+}
+
+# Relative frequency of the audit event types in a realistic `audit.log`:
+# mostly command executions and PAM records of cron and ssh
+AUDIT_WEIGHTS = {
+    "EXECVE": 30, "USER_ACCT": 20, "USER_AUTH": 10, "USER_LOGIN": 5,
+    "SERVICE_START": 8, "SERVICE_STOP": 8, "CONFIG_CHANGE": 2, "KERNEL": 1,
+    "ADD_USER": 1, "ADD_GROUP": 1, "CHUSER_ID": 1, "CHGRP_ID": 1, "ANOM_LOGIN_FAILURES": 2,
+}
+
+USERS = ("root", "ubuntu", "admin", "deploy", "postgres", "test", "oracle", "git")
+
+
+def _random_ip(rng: random.Random) -> str:
+    return ".".join(str(rng.randint(1, 254)) for _ in range(4))
+
+
+def auth_lines(count: int, seed: int = 0, template: str = None) -> list[str]:
+    """
+    Return `count` synthetic `auth.log` lines (without the newline), of the
+    given template only (see `AUTH_TEMPLATE_NAMES`) if any
+    """
+    rng = random.Random(seed)
+    weights = [weight for weight, _ in AUTH_TEMPLATES]
+    templates = [template for _, template in AUTH_TEMPLATES]
+
+    if template is not None:
+        index = AUTH_TEMPLATE_NAMES.index(template)
+        weights, templates = [1], [templates[index]]
+
+    lines = []
+    for template in rng.choices(templates, weights, k=count):
+        ts = "{} {:2d} {:02d}:{:02d}:{:02d}".format(
+            rng.choice(MONTHS), rng.randint(1, 28),
+            rng.randint(0, 23), rng.randint(0, 59), rng.randint(0, 59),
+        )
+        lines.append(template.format(
+            ts=ts,
+            host="bastion",
+            pid=rng.randint(300, 99999),
+            user=rng.choice(USERS),
+            ip=_random_ip(rng),
+            port=rng.randint(1024, 65535),
+        ))
+
+    return lines
+
+
+def busy_auth_lines(seconds: int, seed: int = 0, scanners: int = 3, rate: float = 2.0) -> list[str]:
+    """
+    Return the `auth.log` lines of a busy host over `seconds` seconds, in
+    order: cron sessions opened and closed every minute, `scanners` hosts
+    trying passwords `rate` times per second each, and now and then a
+    distinct line of `AUTH_TEMPLATES`
+    """
+    rng = random.Random(seed)
+    scanner_ips = [_random_ip(rng) for _ in range(scanners)]
+    lines = []
+
+    def line(second: int, template: str, **values) -> str:
+        ts = "Oct {:2d} {:02d}:{:02d}:{:02d}".format(
+            18 + second // 86400, second // 3600 % 24, second // 60 % 60, second % 60
+        )
+        values = {
+            "user": rng.choice(USERS), "ip": _random_ip(rng), "port": rng.randint(1024, 65535),
+            **values,
+        }
+        return template.format(ts=ts, host="bastion", pid=rng.randint(300, 99999), **values)
+
+    for second in range(seconds):
+        if second % 60 == 0:
+            for job in range(5):
+                lines.append(line(second, AUTH_TEMPLATES[0][1]))
+                lines.append(line(second, AUTH_TEMPLATES[1][1]))
+
+        for ip in scanner_ips:
+            for _ in range(int(rate) + (rng.random() < rate % 1)):
+                lines.append(line(second, AUTH_TEMPLATES[2][1], ip=ip))
+
+        if rng.random() < 0.02:
+            lines.append(line(second, rng.choice(AUTH_TEMPLATES[3:])[1]))
+
+    return lines
+
+
+def write_log(path: str, lines: list[str], size: int) -> int:
+    """
+    Write the lines repeatedly to the given path until the file is at least
+    `size` bytes long. Returns the number of lines written.
+    """
+    block = ("\n".join(lines) + "\n").encode("utf-8")
+    written = 0
+    count = 0
+
+    with open(path, "wb") as fp:
+        while written < size:
+            fp.write(block)
+            written += len(block)
+            count += len(lines)
+
+    return count
+
+
+def generate_auth_log(path: str, size: int, seed: int = 0) -> int:
+    """
+    Generate a synthetic `auth.log` of at least `size` bytes,
+    returns the number of lines written.
+    """
+    return write_log(path, auth_lines(10_000, seed), size)
+
+
+def audit_records(event_type: str, count: int, seed: int = 0) -> list[str]:
+    """
+    Return the records of `count` synthetic audit events of the given type
+    (as in `AUDIT_TEMPLATES`), with increasing serial numbers
+    """
+    rng = random.Random(seed)
+    records = []
+    timestamp = 1697624101.0
+
+    for serial in range(1, count + 1):
+        timestamp += rng.random()
+        user = rng.choice(USERS)
+        values = {
+            "id": f"{timestamp:.3f}:{serial}",
+            "pid": rng.randint(300, 99999),
+            "ppid": rng.randint(300, 99999),
+            "user": user,
+            "user_hex": user.encode().hex().upper(),
+            "ip": _random_ip(rng),
+        }
+        records.extend(template.format(**values) for template in AUDIT_TEMPLATES[event_type])
+
+    return records
+
+
+def audit_mix(count: int, seed: int = 0) -> list[str]:
+    """
+    Return the records of `count` synthetic audit events, with the event
+    types mixed as in `AUDIT_WEIGHTS` and increasing serial numbers
+    """
+    rng = random.Random(seed)
+    types = rng.choices(list(AUDIT_WEIGHTS), list(AUDIT_WEIGHTS.values()), k=count)
+    records = []
+
+    # Generate the events of each type, then renumber them in the mixed order
+    pending = {
+        event_type: iter(audit_events(event_type, types.count(event_type), seed))
+        for event_type in set(types)
+    }
+
+    timestamp = 1697624101.0
+    for serial, event_type in enumerate(types, start=1):
+        timestamp += rng.random() * 0.01
+        audit_id = f"{timestamp:.3f}:{serial}"
+        records.extend(
+            record.replace("{id}", audit_id) for record in next(pending[event_type])
+        )
+
+    return records
+
+
+def audit_events(event_type: str, count: int, seed: int) -> list[list[str]]:
+    """
+    Return `count` synthetic audit events of the given type as lists of
+    records, with an `{id}` placeholder for the audit id
+    """
+    rng = random.Random(seed)
+    events = []
+
+    for _ in range(count):
+        user = rng.choice(USERS)
+        values = {
+            "id": "{id}",
+            "pid": rng.randint(300, 99999),
+            "ppid": rng.randint(300, 99999),
+            "user": user,
+            "user_hex": user.encode().hex().upper(),
+            "ip": _random_ip(rng),
+        }
+        events.append([template.format(**values) for template in AUDIT_TEMPLATES[event_type]])
+
+    return events
+
+
+def generate_audit_log(path: str, count: int, seed: int = 0) -> int:
+    """
+    Generate a synthetic `audit.log` of `count` events mixed as in
+    `AUDIT_WEIGHTS`, returns the number of records written.
+    """
+    records = audit_mix(count, seed)
+
+    with open(path, "w") as fp:
+        fp.write("\n".join(records) + "\n")
+
+    return len(records)
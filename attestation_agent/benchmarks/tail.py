@@ -0,0 +1,158 @@
+"""
+Benchmark of the log tailing engine while catching up on a large synthetic
+`auth.log`, before and after block reads:
+
+- before: `seek` + `readline` + `tell` and one lock acquisition per line
+- after: `LogTail` block reads and one lock acquisition per block
+
+Run: `python -m attestation_agent.benchmarks.tail --size 2G`
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from attestation_agent.benchmarks import parse_size
+from attestation_agent.benchmarks.synthetic import generate_auth_log
+from attestation_agent.logs.parsers import AuthParser
+from attestation_agent.logs.parsers.tail import LogTail
+
+
+def read_per_line(path: str) -> int:
+    """
+    Read the whole file the way the parser used to, line by line
+    """
+    count = 0
+    pos = 0
+
+    with open(path, "rb") as file:
+        while True:
+            file.seek(pos)
+            line = file.readline()
+            pos = file.tell()
+
+            if not line:
+                return count
+
+            _ = line.decode("utf-8").strip()
+            count += 1
+
+
+def read_blocks(path: str) -> int:
+    """
+    Read the whole file with `LogTail`
+    """
+    count = 0
+
+    with open(path, "rb") as file:
+        tail = LogTail(file)
+
+        while lines := tail.read_lines():
+            for line in lines:
+                _ = line.strip()
+            count += len(lines)
+
+    return count
+
+
+def parse_per_line(parser: AuthParser, limit: int) -> int:
+    """
+    Parse at most `limit` lines the way the parser used to, one line per lock
+    """
+    count = 0
+
+    while count < limit:
+        with parser.lock:
+            parser.file.seek(parser._pos)
+            line = parser.file.readline()
+            parser._pos = parser.file.tell()
+
+            if not line:
+                break
+
+            parser._data = line.decode("utf-8").strip()
+            event = parser._parse_event()
+
+            if event is not None:
+                parser.events.append(event)
+
+            parser._line += 1
+
+        count += 1
+
+        # Don't let the events pile up in memory
+        if len(parser.events) >= 10_000:
+            parser.flush()
+
+    return count
+
+
+def parse_blocks(parser: AuthParser, limit: int) -> int:
+    """
+    Parse at most `limit` lines (rounded up to a whole block) with `parse_lines`
+    """
+    while parser._line < limit and parser.parse_lines():
+        parser.flush()
+
+    return parser._line
+
+
+def _rate(func, *args) -> tuple[int, float]:
+    start = time.perf_counter()
+    count = func(*args)
+    return count, count / (time.perf_counter() - start)
+
+
+def run(size: int, parse_lines: int, path: str | None = None) -> dict:
+    """
+    Run the benchmark on a synthetic log of `size` bytes and return
+    the measured lines per second.
+    """
+    cleanup = path is None
+
+    if path is None:
+        fd, path = tempfile.mkstemp(suffix=".log")
+        os.close(fd)
+
+    try:
+        lines = generate_auth_log(path, size)
+        size = os.path.getsize(path)
+
+        _, read_before = _rate(read_per_line, path)
+        _, read_after = _rate(read_blocks, path)
+        _, parse_before = _rate(parse_per_line, AuthParser(path), parse_lines)
+        _, parse_after = _rate(parse_blocks, AuthParser(path), parse_lines)
+    finally:
+        if cleanup:
+            os.remove(path)
+
+    return {
+        "size_bytes": size,
+        "lines": lines,
+        "read_lines_per_second": {"before": read_before, "after": read_after},
+        "parse_lines_per_second": {"before": parse_before, "after": parse_after},
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--size", default="2G", help="size of the synthetic log")
+    arg_parser.add_argument(
+        "--parse-lines", type=int, default=1_000_000,
+        help="number of lines to run through the parser"
+    )
+    arg_parser.add_argument("--path", help="where to write the synthetic log")
+    args = arg_parser.parse_args()
+
+    results = run(parse_size(args.size), args.parse_lines, args.path)
+
+    print(f"Synthetic auth.log: {results['lines']} lines")
+    for name in ("read_lines_per_second", "parse_lines_per_second"):
+        before = results[name]["before"]
+        after = results[name]["after"]
+        print(f"{name}: before={before:,.0f} after={after:,.0f} ({after / before:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Microbenchmark of the timestamp conversion of `AuthParser`, before and
+after the per-day epoch cache:
+
+- before: `strptime` for the month, `datetime.now()` and `timestamp()` per line
+- after: `SyslogClock`, a month table and the cached epoch of each day
+
+Run: `python -m attestation_agent.benchmarks.timestamps`
+"""
+
+import argparse
+import time
+from datetime import datetime
+
+from attestation_agent.benchmarks.synthetic import auth_lines
+from attestation_agent.logs.parsers.timestamps import SyslogClock
+
+
+def legacy_parse_date_time(__date: str, __time: str) -> int:
+    """
+    Convert a timestamp the way `AuthParser` used to
+    """
+    _month, _date = __date.split()
+    _month = datetime.strptime(_month, "%b").month
+    _year = datetime.now().year
+    _hour, _minute, _second = map(int, __time.split(":"))
+    return int(
+        datetime(
+            _year, _month, int(_date), _hour, _minute, _second
+        ).timestamp()
+    )
+
+
+def _rate(convert, timestamps: list[tuple[str, ...]], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for timestamp in timestamps:
+            convert(*timestamp)
+    return len(timestamps) * repeat / (time.perf_counter() - start)
+
+
+def run(lines: int, repeat: int) -> dict:
+    """
+    Return the lines per second converted before and after
+    """
+    timestamps = [line.split(None, 3)[:3] for line in auth_lines(lines)]
+    clock = SyslogClock()
+
+    # The same timestamps in RFC 3339 format, with microseconds
+    year = datetime.now().year - 1
+    rfc3339 = [
+        (datetime.strptime(f"{year} {month} {day} {clock_time}", "%Y %b %d %H:%M:%S")
+         .strftime("%Y-%m-%dT%H:%M:%S.123456+02:00"),)
+        for month, day, clock_time in timestamps
+    ]
+
+    return {
+        "before": _rate(lambda month, day, clock_time: legacy_parse_date_time(
+            f"{month} {day}", clock_time), timestamps, repeat),
+        "after": _rate(clock.local, timestamps, repeat),
+        "rfc3339": _rate(clock.rfc3339, rfc3339, repeat),
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--lines", type=int, default=10_000, help="distinct lines")
+    arg_parser.add_argument("--repeat", type=int, default=10, help="passes over the lines")
+    args = arg_parser.parse_args()
+
+    results = run(args.lines, args.repeat)
+
+    before, after = results["before"], results["after"]
+    print(f"lines_per_second: before={before:,.0f} after={after:,.0f} ({after / before:.1f}x)")
+    print(f"lines_per_second (RFC 3339): {results['rfc3339']:,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Benchmark of the wire formats of the events and of the usage logs:
+
+- bytes on the wire per 10k events, as sent in batches of `SHIP_BATCH_SIZE`,
+  for each encoding and compression (see `WireFormat`)
+- CPU time spent encoding them on the agent, and decoding them as the
+  attestation server would (decompress, parse, expand the columns)
+- bytes per usage log sent over socket.io, as is and compressed
+
+Run: `python -m attestation_agent.benchmarks.wire`
+"""
+
+import argparse
+import gzip
+import json
+import os
+import tempfile
+import time
+import zlib
+
+from attestation_agent.benchmarks.synthetic import audit_mix, auth_lines
+from attestation_agent.config import SHIP_BATCH_SIZE
+from attestation_agent.logs.loggers import UsageLogger
+from attestation_agent.logs.parsers import AuditParser, AuthParser
+from attestation_agent.transport import WireFormat
+from attestation_agent.transport.codec import decode_columnar
+
+FORMATS = [
+    (encoding, compression, level)
+    for encoding in ("json", "columnar")
+    for compression, level in ((None, 0), ("deflate", 1), ("deflate", 6), ("gzip", 6))
+]
+
+
+def _events(count: int) -> list[dict]:
+    fd, path = tempfile.mkstemp(suffix=".log")
+    os.close(fd)
+
+    try:
+        events = []
+        for parser, lines in (
+            (AuthParser(path), auth_lines(count // 2)),
+            (AuditParser(path), audit_mix(count // 2)),
+        ):
+            events.extend(parser._parse_block(lines) + parser._finish())
+    finally:
+        os.remove(path)
+
+    machine_id = "5f0c8a1e2b7d4c6f9a3e1d0b8c7a6f5e"
+    return [event.to_dict(machine_id) for event in events[:count]]
+
+
+def _decode(body: bytes, headers: dict) -> list[dict]:
+    encoding = headers.get("Content-Encoding")
+
+    if encoding == "gzip":
+        body = gzip.decompress(body)
+    elif encoding == "deflate":
+        body = zlib.decompress(body)
+
+    data = json.loads(body)
+    return data if isinstance(data, list) else decode_columnar(data)
+
+
+def run(count: int, batch_size: int, repeat: int) -> dict:
+    """
+    Return the size and the encoding and decoding times of the events in
+    each format, scaled to 10k events, and the sizes of the usage logs
+    """
+    events = _events(count)
+    batches = [events[index:index + batch_size] for index in range(0, len(events), batch_size)]
+    scale = 10_000 / len(events)
+    results = {}
+
+    for encoding, compression, level in FORMATS:
+        wire_format = WireFormat(encoding, compression, level=level, min_size=0)
+        encode = decode = float("inf")
+
+        for _ in range(repeat):
+            start = time.process_time()
+            bodies = [wire_format.encode_batch(batch) for batch in batches]
+            encode = min(encode, time.process_time() - start)
+
+            start = time.process_time()
+            for body, headers in bodies:
+                _decode(body, headers)
+            decode = min(decode, time.process_time() - start)
+
+        name = f"{encoding}+{compression}:{level}" if compression else encoding
+        results[name] = {
+            "bytes": sum(len(body) for body, _ in bodies) * scale,
+            "encode": encode * scale,
+            "decode": decode * scale,
+        }
+
+    logger = UsageLogger(detailed=True)
+    for metric in logger.metrics:
+        logger.samples[metric] = (time.monotonic(), logger._sample(metric))
+    log = logger._collect_log()
+
+    plain = len(json.dumps(log))
+    compressed = len(WireFormat(log_compression="deflate").encode_log(log))
+
+    return {"events": results, "log": {"plain": plain, "compressed": compressed}}
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--events", type=int, default=20_000, help="events encoded")
+    arg_parser.add_argument("--batch-size", type=int, default=SHIP_BATCH_SIZE, help="events per request")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="runs of each format")
+    arg_parser.add_argument("--logs", type=int, default=720, help="usage logs per hour, for the totals")
+    args = arg_parser.parse_args()
+
+    result = run(args.events, args.batch_size, args.repeat)
+    baseline = result["events"]["json"]["bytes"]
+
+    print(f"{'per 10k events':<22}{'bytes':>12}{'ratio':>8}{'encode ms':>12}{'decode ms':>12}")
+    for name, values in result["events"].items():
+        print(
+            f"{name:<22}{values['bytes']:>12,.0f}{baseline / values['bytes']:>8.2f}"
+            f"{values['encode'] * 1000:>12.1f}{values['decode'] * 1000:>12.1f}"
+        )
+
+    log = result["log"]
+    print(f"\nusage log:            {log['plain']:>8,} bytes as is, {log['compressed']:,} bytes compressed")
+    print(
+        f"usage logs per hour:  {log['plain'] * args.logs / 1024:>8,.0f} KiB as is, "
+        f"{log['compressed'] * args.logs / 1024:,.0f} KiB compressed"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Crash-safe checkpoints of the session, see `Checkpointer`.
+"""
+
+from threading import Event as ThreadEvent
+from threading import Thread
+
+from attestation_agent.config import CHECKPOINT_INTERVAL, SESSION_FILEPATH
+from attestation_agent.errors import AttestationError, report
+from attestation_agent.metrics.agent import CHECKPOINT_LAG, CHECKPOINTS
+from attestation_agent.transport import Dispatcher
+from attestation_agent.utils import write_session
+
+
+class Checkpointer:
+    """
+    Saves the session every `interval` seconds, from a daemon thread, so
+    that a killed or crashed agent resumes close to where it stopped
+    instead of from its last clean exit.
+
+    The saved state of a parser is the one as of the last of its events
+    delivered by the shipper, see `Dispatcher.checkpoint`: after a crash,
+    the events which were not delivered yet are parsed and sent again, and
+    the ones which were are not. The session is written atomically, and
+    only when it changed.
+    """
+
+    def __init__(
+        self,
+        dispatcher: Dispatcher,
+        interval: float = CHECKPOINT_INTERVAL,
+        filepath: str = SESSION_FILEPATH,
+        session: dict = None,
+    ) -> None:
+        self.dispatcher: Dispatcher = dispatcher
+        self.interval: float = interval
+        self.filepath: str = filepath
+
+        # Session saved last, the parsers without any event delivered yet
+        # keep their state from the session the agent resumed from
+        self._saved: dict = dict(session or {})
+
+        # Set to stop the checkpointer
+        self._stopping: ThreadEvent = ThreadEvent()
+        self._thread: Thread = None
+
+    def start(self) -> None:
+        """
+        Start checkpointing the session
+        """
+        self._thread = Thread(target=self.run, name="checkpoint", daemon=True)
+        self._thread.start()
+
+    def run(self) -> None:
+        while not self._stopping.wait(self.interval):
+            self.checkpoint()
+
+    def checkpoint(self) -> bool:
+        """
+        Save the state of the parsers as of the last events delivered.
+        Returns whether the session was written.
+        """
+        # Record the state of the parsers which read lines without
+        # generating any event since their last dispatch
+        for parser in self.dispatcher.parsers:
+            self.dispatcher.dispatch(parser)
+
+        shipper = self.dispatcher.shipper
+        acknowledged = shipper.acknowledged()
+        CHECKPOINT_LAG.set(shipper.sequence - acknowledged)
+
+        data = {**self._saved, **self.dispatcher.checkpoint(acknowledged)}
+
+        if data == self._saved:
+            return False
+
+        try:
+            write_session(data, self.filepath)
+        except (OSError, TypeError, ValueError) as exc:
+            report(
+                AttestationError(
+                    title="SessionError",
+                    msg="error while saving a checkpoint of the session",
+                    path=self.filepath,
+                    exc=exc
+                )
+            )
+            return False
+
+        self._saved = data
+        CHECKPOINTS.inc()
+        return True
+
+    def stop(self) -> None:
+        """
+        Stop checkpointing the session, waiting for a checkpoint being written
+        """
+        self._stopping.set()
+
+        if self._thread is not None:
+            self._thread.join()
@@ -1,13 +1,23 @@
 import os
+import signal
 
 # Path to a session file to save the state of the attestation agent
 # so that we can resume last session without re-parsing already parsed logs
 SESSION_FILEPATH = os.path.expanduser("~/.attestation-agent.session")
 
+# Interval (in seconds) between two checkpoints of the session while the
+# agent runs, `None` to only save it on exit. A checkpoint holds the state
+# of the parsers as of the last events delivered to the attestation server
+# (or synced to the spill directory), and is only written when it changed.
+CHECKPOINT_INTERVAL = 5.0
+
 # Path to various log files
 AUTH_LOG = "/var/log/auth.log"
 AUDIT_LOG = "/var/log/audit/audit.log"
 
+# Rule file describing additional log sources, parsed by rule based parsers
+RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules.json")
+
 # Path to obtain a device identifier
 MACHINE_ID_PATH = "/etc/machine-id"
 
@@ -15,3 +25,262 @@ MACHINE_ID_PATH = "/etc/machine-id"
 ATTESTATION_HOST = "10.10.10.185"
 ATTESTATION_PORT = "3000"
 BASE_URL = f"http://{ATTESTATION_HOST}:{ATTESTATION_PORT}"
+
+# Event shipping related configurations
+# Maximum number of events sent to the attestation server in a single request
+SHIP_BATCH_SIZE = 256
+
+# Maximum size (in bytes, before compression) of the events sent in a single
+# request, larger batches are split. Must stay below the body limit of the
+# attestation server (`EVENT_BODY_LIMIT`, 10 MB by default).
+SHIP_BATCH_BYTES = 1 << 20
+
+# Maximum time (in seconds) an event may wait in the buffer before it is sent
+SHIP_FLUSH_INTERVAL = 1.0
+
+# Number of keep-alive connections kept open to the attestation server
+SHIP_POOL_SIZE = 4
+
+# Number of threads sending batches concurrently, at most `SHIP_POOL_SIZE`
+SHIP_SENDERS = 2
+
+# Timeout (in seconds) of a single request to the attestation server
+SHIP_TIMEOUT = 5.0
+
+# Encoding of the batches of events: "json", "columnar" (events grouped by
+# type and log file, their properties sent as columns) or "auto" for the
+# most compact one the attestation server accepts. Servers which don't
+# advertise their formats are sent plain JSON.
+SHIP_ENCODING = "auto"
+
+# Compression of the requests and of the usage logs: "gzip", "deflate",
+# "auto" for any the attestation server accepts, or `None`
+SHIP_COMPRESSION = "auto"
+
+# Compression level (1 to 9) and smallest request body (in bytes) compressed
+SHIP_COMPRESS_LEVEL = 6
+SHIP_COMPRESS_MIN = 1024
+
+# Local event store related configurations, see `EventStore`
+# SQLite database keeping the parsed events for local queries, even while the
+# attestation server is unreachable (`python -m attestation_agent.store`),
+# e.g. `os.path.expanduser("~/.attestation-agent.events.db")`. `None` to disable.
+STORE_PATH = None
+
+# Events written in a single transaction at most, and maximum time (in
+# seconds) an event waits before it is written
+STORE_BATCH_SIZE = 4096
+STORE_FLUSH_INTERVAL = 1.0
+
+# Events waiting to be written at most, the oldest are dropped beyond, e.g.
+# while the database can't be written to
+STORE_MAX_PENDING = 100_000
+
+# Retention of the events: events older than `STORE_MAX_AGE` seconds are
+# deleted, and the oldest ones while the database is larger than
+# `STORE_MAX_BYTES`, every `STORE_RETENTION_INTERVAL` seconds
+STORE_MAX_AGE = 7 * 24 * 3600
+STORE_MAX_BYTES = 128 << 20
+STORE_RETENTION_INTERVAL = 60.0
+
+# Coalescing of repetitive events, see `EventCoalescer`: repeats of an event
+# within `COALESCE_WINDOW` seconds of the first one are sent as a single
+# event with their count. `None` to send every event as is.
+COALESCE_WINDOW = 60.0
+
+# Attributes of the events identifying the repeats of an event, besides
+# "template" (the action with its addresses and numbers masked) and "source"
+# (the first address in the action)
+COALESCE_KEYS = ("type", "process", "template", "source")
+
+# Windows kept open at most, the oldest one is closed beyond
+COALESCE_MAX_KEYS = 4096
+
+# Streaming detections, see `DetectionEngine`: detections run on the events
+# as they are dispatched (brute force, bursts of privilege changes, ...), their
+# alerts are sent as `ALERT` events right away. `None` to disable.
+DETECTIONS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "detections.json")
+
+# Keys (e.g. source address and account) tracked per detection at most, the
+# least recently seen one is evicted beyond
+DETECTION_MAX_KEYS = 10_000
+
+# Socket.io channel of the usage logs related configurations, see `LogChannel`
+# Logs kept while they can't be sent or wait to be acknowledged, the oldest
+# are dropped beyond it (720 logs are an hour of logs every 5 seconds)
+CHANNEL_BUFFER_SIZE = 720
+
+# Delay (in seconds) before retrying to connect to the attestation server,
+# doubled after each failure up to the maximum
+CHANNEL_BACKOFF_MIN = 1.0
+CHANNEL_BACKOFF_MAX = 60.0
+
+# Time (in seconds) to wait for the connection to be established
+CHANNEL_CONNECT_TIMEOUT = 5.0
+
+# Time (in seconds) after which a log sent but not acknowledged is
+# considered delivered, as long as the connection is up
+CHANNEL_ACK_TIMEOUT = 10.0
+
+# Logs sent after a reconnection, evenly spread over the outage,
+# `None` to send all of the buffered logs
+CHANNEL_REPLAY_MAX = 32
+
+# Log parsing related configurations
+# Size (in bytes) of the blocks in which the log files are read
+TAIL_CHUNK_SIZE = 1 << 20
+
+# Backend used to wait for new lines in the log files: "auto", "inotify" or "poll"
+WATCH_BACKEND = "auto"
+
+# Interval (in seconds) between reads of a log file when polling
+POLL_INTERVAL = 1.0
+
+# Maximum time (in seconds) a parser waits for a notification before
+# checking the log file anyway, `None` waits indefinitely
+WATCH_TIMEOUT = 30.0
+
+# Number of bytes at the start of a log file used to recognize it after rotation
+FINGERPRINT_SIZE = 256
+
+# Whether to read the rotated logs (`auth.log.1`, `auth.log.2.gz`, ...)
+# written while the agent was not running, before the current log file
+READ_ROTATED = True
+
+# Audit records of one event (sharing a serial number) are merged. A partial
+# event is completed after this many seconds, or once more events are open
+CORRELATION_WINDOW = 2.0
+CORRELATION_MAX_GROUPS = 1024
+
+# Maximum number of records kept per event, e.g. `PATH` records
+CORRELATION_MAX_RECORDS = 64
+
+# Backpressure: a parser stops reading once this many of its events are
+# waiting to be handed over, and resumes when they drop to the low watermark.
+# The unread part of the log file acts as the parser's buffer meanwhile.
+EVENT_QUEUE_HIGH = 10_000
+EVENT_QUEUE_LOW = 2_000
+
+# Events buffered in memory by the shipper. Past the high watermark, new
+# events are spilled to disk and read back once the buffer drops to the
+# low watermark, for instance when the attestation server is unreachable.
+SHIP_QUEUE_HIGH = 50_000
+SHIP_QUEUE_LOW = 10_000
+
+# Directory of the spill segments, kept across restarts
+SPILL_DIR = os.path.expanduser("~/.attestation-agent.spill")
+
+# Size (in bytes) at which a new spill segment is started
+SPILL_SEGMENT_SIZE = 16 << 20
+
+# Maximum size (in bytes) of the spilled events, the oldest segments are dropped
+SPILL_MAX_BYTES = 512 << 20
+
+# Spilled events are synced to disk at most once per interval (in seconds)
+SPILL_FSYNC_INTERVAL = 1.0
+
+# Runtime of the agent, can be overridden with `--runtime`:
+# - `threads`: a thread per logger and parser
+# - `asyncio`: loggers and parsers as tasks of a single event loop
+RUNTIME = "threads"
+
+# Threads running the blocking steps (parsing a block, collecting metrics)
+# of the tasks in the `asyncio` runtime, regardless of the number of sources
+RUNTIME_WORKERS = 4
+
+# Catch-up mode: when at least this many bytes of a log are unread at start,
+# they are parsed in parallel by a pool of worker processes
+CATCHUP_THRESHOLD = 64 << 20
+
+# Number of worker processes of the catch-up mode, less than 2 disables it
+CATCHUP_WORKERS = os.cpu_count() or 1
+
+# Size (in bytes) of the chunks parsed by each catch-up worker at a time
+CATCHUP_CHUNK_SIZE = 16 << 20
+
+# Usage logging related configurations
+# Interval (in seconds) between two usage logs sent to the attestation server.
+# Metrics are sampled at this interval too, unless they have their own below.
+LOG_INTERVAL = 1.0
+
+# Sampling intervals (in seconds) of specific usage metrics:
+# "cpu", "memory", "disk" or "network", and "disks", "nics" or "processes"
+# in detailed mode
+LOG_METRIC_INTERVALS = {"cpu": 0.25, "disk": 5.0, "disks": 5.0, "processes": 5.0}
+
+# Adaptive sampling: a metric is sampled up to `1 / LOG_ADAPT_MIN_FACTOR` times
+# more often while it is changing rapidly, and up to `LOG_ADAPT_MAX_FACTOR`
+# times less often while it is steady
+LOG_ADAPT_MIN_FACTOR = 0.25
+LOG_ADAPT_MAX_FACTOR = 4.0
+
+# Relative change between two samples of a metric above which it is changing
+# rapidly, and below which it is steady
+LOG_ADAPT_CHANGE = 0.25
+LOG_ADAPT_IDLE = 0.05
+
+# Shortest sampling interval (in seconds) of any metric, whatever its activity
+LOG_MIN_INTERVAL = 0.1
+
+# Aggregation of the usage logs before they are sent, see `UsageAggregator`
+LOG_AGGREGATE = True
+
+# Interval (in seconds) between two rolled up usage logs, kept well below the
+# 16 seconds window of logs kept by the attestation server
+LOG_ROLLUP_INTERVAL = 5.0
+
+# Length (in seconds) of the rolling window of samples summarized by a rollup
+LOG_ROLLUP_WINDOW = 10.0
+
+# A rollup is only sent when a metric changed by at least this much (relative)
+# since the last log sent, or when no log was sent for `LOG_HEARTBEAT` seconds
+LOG_SUPPRESS_CHANGE = 0.1
+LOG_HEARTBEAT = 10.0
+
+# Detailed usage logging: rates per disk and per network interface, and the
+# top processes by CPU, resident memory and IO. Costs more to collect and send.
+LOG_DETAILED = False
+
+# Number of processes in each table of the top processes
+LOG_TOP_PROCESSES = 10
+
+# CPU time spent reading the processes, as a fraction of one CPU (0.02 = 2%)
+LOG_PROCESS_CPU_BUDGET = 0.02
+
+# Self-instrumentation related configurations
+# Port on which the metrics of the agent are served on localhost, in the
+# Prometheus text exposition format at `/metrics`. `None` to disable.
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9464
+
+# Interval (in seconds) between two summaries of the metrics printed by the
+# agent, `None` to disable
+METRICS_REPORT_INTERVAL = None
+
+# Profiling of a live agent, see `attestation_agent/profiling.py`:
+# `None`, "cprofile" or "sampling". Can be set with `--profile` as well.
+PROFILE = None
+
+# Directory in which the profiles are written
+PROFILE_DIR = os.path.expanduser("~/.attestation-agent.profiles")
+
+# Samples per second taken by the sampling profiler
+PROFILE_RATE = 100
+
+# Signal on which the profiles are written
+PROFILE_SIGNAL = signal.SIGUSR2
+
+# Error reporting related configurations
+# Format of the errors printed: "json" (one line each), "pretty" (rich
+# tables), or "auto" for pretty only when stderr is a terminal
+ERROR_FORMAT = "auto"
+
+# Errors of a kind printed in each window, the next ones are only counted
+# and summarized at the end of the window
+ERROR_BURST = 5
+
+# Length (in seconds) of the rate limiting window of the errors
+ERROR_REPORT_INTERVAL = 60
+
+# Fields of the suppressed errors of a kind kept in their summary
+ERROR_SAMPLES = 3
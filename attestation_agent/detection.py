@@ -0,0 +1,354 @@
+"""
+Streaming detections run by the agent on the events as they are
+dispatched, configured from a JSON file. See `attestation_agent/detections.json`.
+
+A detection file lists detections, each one counting the events it
+matches per key over a sliding window:
+
+    {
+        "detections": [
+            {
+                "name": "ssh_brute_force",
+                "description": "Repeated SSH authentication failures",
+                "severity": "high",
+                "types": ["AUTH"],
+                "process": ["sshd"],
+                "action": "^(Failed password|Invalid user)",
+                "key": ["source", "account"],
+                "window": 60,
+                "threshold": 10,
+                "cooldown": 300
+            }
+        ]
+    }
+
+An event matches a detection if its type is one of `types`, its process
+one of `process`, its action matches the `action` regex (searched), and its
+attributes have the values given in `fields` (a value or a list of values),
+each condition being optional. The `key` names the attributes the events
+are counted by, besides:
+- `source`: the address of the event (`address` attribute, or the first
+  address in the action)
+- `account`: the account of the event (`account` or `user` attribute, or
+  the user named in the action)
+
+Once `threshold` events of a key come within `window` seconds (in the time
+of the logs), an `ALERT` event is raised right away. The key isn't alerted
+on again for `cooldown` seconds (`window` by default). Detections with
+`"enabled": false` are not run.
+"""
+
+import json
+import re
+from collections import OrderedDict, deque
+from typing import Iterable
+
+from attestation_agent.config import DETECTION_MAX_KEYS
+from attestation_agent.errors import DetectionError, report
+from attestation_agent.logs.events import Event
+from attestation_agent.logs.parsers.coalescer import first_address
+from attestation_agent.metrics.agent import DETECTION_ALERTS, DETECTION_EVENTS
+from attestation_agent.store import account_of
+
+
+class AlertEvent(Event):
+    """
+    Event raised by a detection, with the key it was raised for, the
+    number of events counted and the time of the first and last ones in
+    `extras`
+
+    Attributes:
+    - `rule`: `str`, the name of the detection
+    - `severity`: `str`
+    """
+
+    __slots__ = ("rule", "severity")
+
+    fields = Event.fields + ("rule", "severity")
+
+    type = "ALERT"
+
+    def __init__(self, rule: str = None, severity: str = None, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.rule = rule
+        self.severity = severity
+
+
+def _values(value) -> frozenset | None:
+    if value is None:
+        return None
+
+    return frozenset(value if isinstance(value, list) else (value,))
+
+
+class Detection:
+    """
+    A detection of a detection file, see the module documentation
+    """
+
+    __slots__ = (
+        "name", "description", "severity", "types", "process", "action",
+        "fields", "key", "window", "threshold", "cooldown", "enabled",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        key: list[str],
+        window: float,
+        threshold: int,
+        description: str = None,
+        severity: str = "medium",
+        types: list[str] = None,
+        process: list[str] | str = None,
+        action: str = None,
+        fields: dict = None,
+        cooldown: float = None,
+        enabled: bool = True,
+    ) -> None:
+        if threshold < 1 or window <= 0:
+            raise ValueError(f"detection '{name}' needs a positive threshold and window")
+
+        self.name: str = name
+        self.description: str = description or name
+        self.severity: str = severity
+        self.types: frozenset | None = _values(types)
+        self.process: frozenset | None = _values(process)
+        self.action: re.Pattern | None = re.compile(action) if action is not None else None
+        self.fields: dict[str, frozenset] = {
+            field: _values(value) for field, value in (fields or {}).items()
+        }
+        self.key: tuple[str, ...] = tuple(key)
+        self.window: float = window
+        self.threshold: int = threshold
+        self.cooldown: float = window if cooldown is None else cooldown
+        self.enabled: bool = enabled
+
+    def conditions(self) -> tuple:
+        """
+        Return the conditions of the detection, detections with the same
+        ones are matched at once
+        """
+        return (
+            self.types, self.process, self.action and self.action.pattern,
+            frozenset(self.fields.items()),
+        )
+
+    def matches(self, event: Event) -> bool:
+        """
+        Return whether the event matches the detection, whatever its type
+        """
+        if self.process is not None and getattr(event, "process", None) not in self.process:
+            return False
+
+        for field, values in self.fields.items():
+            if getattr(event, field, None) not in values:
+                return False
+
+        return self.action is None or (
+            event.action is not None and self.action.search(event.action) is not None
+        )
+
+
+class _Counter:
+    """
+    Times of the last `threshold` events of a key, and of its last alert
+    """
+
+    __slots__ = ("times", "alerted")
+
+    def __init__(self, threshold: int) -> None:
+        self.times: deque[int] = deque(maxlen=threshold)
+        self.alerted: int = None
+
+
+def _field(event: Event, name: str):
+    """
+    Return the value of an attribute of the event, or of `source` and `account`
+    """
+    extras = event.extras
+
+    if name == "source":
+        address = extras.get("address") if extras else None
+        return address if address not in (None, "?") else first_address(event.action or "")
+
+    if name == "account":
+        account = extras.get("account") or extras.get("user") if extras else None
+        return account_of(account, event.action)
+
+    return getattr(event, name, None)
+
+
+class DetectionEngine:
+    """
+    Runs detections on a stream of events, see the module documentation.
+
+    The window of a key only keeps the times of its last `threshold`
+    events: the threshold is crossed when the oldest of them is within the
+    window of the newest, so each event costs a constant time. Each
+    detection tracks at most `max_keys` keys, the least recently seen one
+    is evicted beyond. Not thread safe, the dispatcher serializes the calls.
+    """
+
+    def __init__(self, detections: Iterable[Detection], max_keys: int = DETECTION_MAX_KEYS) -> None:
+        self.detections: list[Detection] = [detection for detection in detections if detection.enabled]
+        self.max_keys: int = max_keys
+
+        # Detections grouped by conditions, so that an event is matched once
+        # per group, and the groups by event type they apply to (`None` for any)
+        groups: dict[tuple, list[Detection]] = {}
+        for detection in self.detections:
+            groups.setdefault(detection.conditions(), []).append(detection)
+
+        self._by_type: dict[str | None, list[list[Detection]]] = {}
+        for group in groups.values():
+            for type in group[0].types or (None,):
+                self._by_type.setdefault(type, []).append(group)
+
+        self._any: list[list[Detection]] = self._by_type.pop(None, [])
+
+        # Counters of each detection by key, least recently seen first
+        self._counters: dict[str, OrderedDict[tuple, _Counter]] = {
+            detection.name: OrderedDict() for detection in self.detections
+        }
+
+        # Counters
+        self.matched: int = 0
+        self.alerts: int = 0
+        self.evicted: int = 0
+
+        # Metrics of the engine, looked up once for the hot paths
+        self._matched_metric = DETECTION_EVENTS.labels(result="matched")
+        self._evicted_metric = DETECTION_EVENTS.labels(result="evicted")
+        self._alert_metrics = {
+            detection.name: DETECTION_ALERTS.labels(detection=detection.name)
+            for detection in self.detections
+        }
+
+    def process(self, events: Iterable[Event]) -> list[AlertEvent]:
+        """
+        Run the detections on the events, and return the alerts raised
+        """
+        alerts = []
+        matched = self.matched
+        by_type = self._by_type
+        any_type = self._any
+
+        for event in events:
+            # Windows are counted in the time of the logs, events without one can't be counted
+            if not isinstance(event.timestamp, int):
+                continue
+
+            groups = by_type.get(event.type)
+
+            if groups is None:
+                if not any_type:
+                    continue
+                groups = any_type
+            elif any_type:
+                groups = groups + any_type
+
+            # Key attributes of the event, shared by its detections
+            values = None
+
+            for group in groups:
+                if not group[0].matches(event):
+                    continue
+
+                if values is None:
+                    values = {}
+
+                for detection in group:
+                    matched += 1
+                    alert = self._count(detection, event, values)
+
+                    if alert is not None:
+                        alerts.append(alert)
+
+        self._matched_metric.inc(matched - self.matched)
+        self.matched = matched
+        return alerts
+
+    def _count(self, detection: Detection, event: Event, values: dict) -> AlertEvent | None:
+        key = []
+        for name in detection.key:
+            value = values.get(name, values)
+
+            if value is values:
+                value = values[name] = _field(event, name)
+
+            key.append(value)
+
+        key = tuple(key)
+        counters = self._counters[detection.name]
+        counter = counters.get(key)
+
+        if counter is None:
+            counter = counters[key] = _Counter(detection.threshold)
+
+            if len(counters) > self.max_keys:
+                counters.popitem(last=False)
+                self.evicted += 1
+                self._evicted_metric.inc()
+        else:
+            counters.move_to_end(key)
+
+        times = counter.times
+        timestamp = event.timestamp
+        times.append(timestamp)
+
+        if (
+            len(times) < detection.threshold
+            or timestamp - times[0] >= detection.window
+            or (counter.alerted is not None and timestamp - counter.alerted < detection.cooldown)
+        ):
+            return None
+
+        counter.alerted = timestamp
+        self.alerts += 1
+        self._alert_metrics[detection.name].inc()
+
+        action = f"{detection.description}: {len(times)} events in {timestamp - times[0] + 1}s"
+        if key:
+            action += " (" + ", ".join(f"{name}={value}" for name, value in zip(detection.key, key)) + ")"
+
+        return AlertEvent(
+            timestamp=timestamp,
+            action=action,
+            raw_content=event.raw_content,
+            rule=detection.name,
+            severity=detection.severity,
+            count=len(times),
+            first_timestamp=times[0],
+            last_timestamp=timestamp,
+            window=detection.window,
+            **dict(zip(detection.key, key)),
+        )
+
+    def as_dict(self) -> dict:
+        """
+        Return the counters of the engine
+        """
+        return {
+            "matched": self.matched,
+            "alerts": self.alerts,
+            "evicted": self.evicted,
+            "keys": sum(len(counters) for counters in self._counters.values()),
+        }
+
+
+def load_detections(filepath: str) -> list[Detection]:
+    """
+    Load the detections of a detection file, returns none if it is
+    missing or invalid
+    """
+    try:
+        with open(filepath) as fp:
+            specs = json.load(fp)["detections"]
+
+        return [Detection(**spec) for spec in specs]
+    except FileNotFoundError:
+        return []
+    except (OSError, ValueError, KeyError, TypeError, re.error) as exc:
+        report(DetectionError(msg="error while loading detection file", path=filepath, exc=exc))
+        return []
@@ -1,25 +1,18 @@
-from rich.table import Table
-
-from attestation_agent.utils import console
+from attestation_agent.errors.reporter import format_error, report
+from attestation_agent.metrics.agent import ERRORS
 
 
 class AttestationError(Exception):
     def __init__(self, title="AttestationError", msg="generic logging error", **kwargs):
         super().__init__(msg)
         self.title = title
+        self.msg = msg
         self.kwargs = kwargs
 
-    def __str__(self) -> str:
-        with console.capture() as capture:
-            table = Table(
-                *self.kwargs.keys(),
-                title=self.title
-            )
-
-            table.add_row(*map(lambda attr: str(attr), self.kwargs.values()))
-            console.print(table)
+        ERRORS.labels(kind=type(self).__name__).inc()
 
-        return capture.get()
+    def __str__(self) -> str:
+        return format_error(self.title, self.msg, self.kwargs)
 
 
 class LogError(AttestationError):
@@ -38,3 +31,30 @@ class ParseError(AttestationError):
 
     def __init__(self, title="ParseError", msg="generic parse error", **kwargs):
         super().__init__(title, msg, **kwargs)
+
+
+class ShipError(AttestationError):
+    """
+    Generic failure while sending events to the attestation server.
+    """
+
+    def __init__(self, title="ShipError", msg="generic shipping error", **kwargs):
+        super().__init__(title, msg, **kwargs)
+
+
+class StoreError(AttestationError):
+    """
+    Generic failure of the local event store.
+    """
+
+    def __init__(self, title="StoreError", msg="generic event store error", **kwargs):
+        super().__init__(title, msg, **kwargs)
+
+
+class DetectionError(AttestationError):
+    """
+    Generic failure of the detections.
+    """
+
+    def __init__(self, title="DetectionError", msg="generic detection error", **kwargs):
+        super().__init__(title, msg, **kwargs)
@@ -0,0 +1,159 @@
+import json
+import sys
+import time
+from threading import Lock, Timer
+
+from attestation_agent.config import (ERROR_BURST, ERROR_FORMAT,
+                                      ERROR_REPORT_INTERVAL, ERROR_SAMPLES)
+
+
+def _pretty(file) -> bool:
+    if ERROR_FORMAT == "auto":
+        return hasattr(file, "isatty") and file.isatty()
+
+    return ERROR_FORMAT == "pretty"
+
+
+def format_error(title: str, msg: str, fields: dict, file=sys.stderr) -> str:
+    """
+    Format an error as a rich table when `file` is a terminal (see
+    `ERROR_FORMAT`), as a single line of JSON otherwise
+    """
+    if not _pretty(file):
+        return json.dumps(
+            {"time": round(time.time(), 3), "error": title, "msg": msg, **fields},
+            default=str
+        )
+
+    # Rich takes a while to import, only the interactive agent needs it
+    from rich.table import Table
+
+    from attestation_agent.utils import console
+
+    with console.capture() as capture:
+        table = Table(*fields.keys(), title=title, caption=msg)
+        table.add_row(*map(lambda attr: str(attr), fields.values()))
+        console.print(table)
+
+    return capture.get()
+
+
+class _ErrorKind:
+    """
+    Errors of a kind reported in the current window
+    """
+
+    __slots__ = ("title", "msg", "started", "count", "suppressed", "samples")
+
+    def __init__(self, title: str, msg: str, started: float) -> None:
+        self.title: str = title
+        self.msg: str = msg
+        self.started: float = started
+        self.count: int = 0
+        self.suppressed: int = 0
+        self.samples: list[dict] = []
+
+    def summary(self) -> str:
+        return format_error(self.title, self.msg, {
+            "count": self.count,
+            "suppressed": self.suppressed,
+            "samples": self.samples,
+        })
+
+
+class ErrorReporter:
+    """
+    Prints the errors of the agent, rate limited by kind: the title and
+    message of the error, and the class of the exception it carries.
+
+    In each window of `interval` seconds, the first `burst` errors of a
+    kind are printed, the next ones are only counted and the fields of the
+    first `samples` of them kept. At the end of the window, a summary of
+    the suppressed errors of each kind is printed. A burst of malformed
+    lines costs a counter increment per line instead of a formatted error.
+    """
+
+    def __init__(
+        self,
+        interval: float = ERROR_REPORT_INTERVAL,
+        burst: int = ERROR_BURST,
+        samples: int = ERROR_SAMPLES,
+    ) -> None:
+        self.interval: float = interval
+        self.burst: int = burst
+        self.samples: int = samples
+
+        self._kinds: dict[tuple, _ErrorKind] = {}
+        self._lock: Lock = Lock()
+
+        # Prints the summaries at the end of the window
+        self._timer: Timer = None
+
+    def report(self, error: Exception) -> None:
+        """
+        Print the error, unless too many of its kind were printed recently
+        """
+        title = getattr(error, "title", type(error).__name__)
+        msg = getattr(error, "msg", str(error))
+        fields = getattr(error, "kwargs", {})
+        exc = fields.get("exc")
+
+        key = (title, msg, type(exc).__name__ if exc is not None else None)
+        now = time.monotonic()
+        summary = None
+
+        with self._lock:
+            kind = self._kinds.get(key)
+
+            if kind is None or now - kind.started >= self.interval:
+                if kind is not None and kind.suppressed:
+                    summary = kind.summary()
+
+                kind = self._kinds[key] = _ErrorKind(title, msg, now)
+
+            kind.count += 1
+
+            if kind.count > self.burst:
+                kind.suppressed += 1
+
+                if len(kind.samples) < self.samples:
+                    kind.samples.append({name: str(value) for name, value in fields.items()})
+
+                if self._timer is None:
+                    self._timer = Timer(self.interval, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+
+                error = None
+
+        if summary is not None:
+            print(summary, file=sys.stderr)
+
+        if error is not None:
+            print(error, file=sys.stderr)
+
+    def flush(self) -> None:
+        """
+        Print the summaries of the suppressed errors and start new windows
+        """
+        with self._lock:
+            summaries = [kind.summary() for kind in self._kinds.values() if kind.suppressed]
+            self._kinds.clear()
+
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+        for summary in summaries:
+            print(summary, file=sys.stderr)
+
+
+# Reporter of the errors of the agent
+reporter = ErrorReporter()
+
+
+def report(error: Exception) -> None:
+    """
+    Print the error through the agent's `ErrorReporter`
+    """
+    reporter.report(error)
@@ -1,10 +1,11 @@
 from .events import Event
 from .loggers import Logger, UsageLogger
-from .parsers import AuditEvent, AuditParser, AuthEvent, AuthParser, Parser
+from .parsers import (AuditEvent, AuditParser, AuthEvent, AuthParser, Parser,
+                      RuleEvent, RuleParser)
 
 __all__ = (
     "Event", "Logger", "Parser",
-    "AuditEvent", "AuthEvent",
-    "AuditParser", "AuthParser",
+    "AuditEvent", "AuthEvent", "RuleEvent",
+    "AuditParser", "AuthParser", "RuleParser",
     "UsageLogger"
 )
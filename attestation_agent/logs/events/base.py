@@ -6,22 +6,73 @@ class Event(ABC):
     Abstract class defining the general structure of a logged event.
     Inherit this class to prepare specific event structures for various logs.
 
+    Events are queued in large numbers, so attributes are stored in slots
+    rather than a per-instance `__dict__`. Subclasses declare their fixed
+    attributes in `__slots__` and `fields`, any other keyword argument is
+    kept in the `extras` mapping and is readable as an attribute as well.
+
     Attributes:
     - `timestamp`: `int`
     - `action`: `str`
     - `raw_content`: `str`
+    - `extras`: `dict[str, Any] | None`, attributes outside the fixed fields
     """
 
-    def __init__(self, **kwargs) -> None:
-        _defaults = {
-            "timestamp": None,
-            "action": None,
-            "raw_content": None,
-        }
+    __slots__ = ("timestamp", "action", "raw_content", "extras")
+
+    # Attributes serialized as the properties of the event, in order.
+    # `timestamp` and `type` are sent alongside the properties.
+    fields: tuple[str, ...] = ("action", "raw_content")
+
+    # Set by subclasses, as class attributes or slots
+    log_file: str = None
+    type: str = None
+
+    def __init__(
+        self,
+        timestamp: int = None,
+        action: str = None,
+        raw_content: str = None,
+        **extras
+    ) -> None:
+        self.timestamp = timestamp
+        self.action = action
+        self.raw_content = raw_content
+
+        # Most events have no extra attributes, don't allocate a dict for them
+        self.extras = extras or None
 
-        for attr, def_value in _defaults.items():
-            setattr(self, attr, kwargs.get(attr, def_value))
+    def __getattr__(self, name: str):
+        # Only called when `name` is neither a slot nor a class attribute
+        if name != "extras" and self.extras and name in self.extras:
+            return self.extras[name]
+
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    def props(self) -> dict:
+        """
+        Return the properties of the event: its fields and extra attributes
+        """
+        props = {field: getattr(self, field) for field in self.fields}
+
+        if self.extras:
+            props.update(self.extras)
+
+        return props
+
+    def to_dict(self, machine_id: str) -> dict:
+        """
+        Return the event in the format expected by the attestation server
+        """
+        return {
+            "machine_id": machine_id,
+            "timestamp": self.timestamp,
+            "type": self.type,
+            "log_filepath": self.log_file,
+            "props": self.props(),
+        }
 
     def __str__(self) -> str:
-        _obj_state = [f"{attr}: {value}" for attr, value in self.__dict__.items()]
+        _obj_state = [f"{attr}: {value}" for attr, value in self.props().items()]
+        _obj_state.insert(0, f"timestamp: {self.timestamp}")
         return "{\n\t" + "\n\t".join(_obj_state) + "}"
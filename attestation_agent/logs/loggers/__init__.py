@@ -1,4 +1,6 @@
+from .aggregator import UsageAggregator
 from .base import Logger
+from .scheduler import SampleScheduler
 from .usage import UsageLogger
 
-__all__ = ("Logger", "UsageLogger")
+__all__ = ("Logger", "SampleScheduler", "UsageAggregator", "UsageLogger")
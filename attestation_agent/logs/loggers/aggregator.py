@@ -0,0 +1,256 @@
+import json
+import math
+from collections import deque
+
+from attestation_agent.config import (LOG_HEARTBEAT, LOG_ROLLUP_INTERVAL,
+                                      LOG_ROLLUP_WINDOW, LOG_SUPPRESS_CHANGE)
+
+
+# Order of the statistics of each field in the `aggregate` of a rollup
+AGGREGATE_STATS = ("min", "max", "mean", "p95", "count")
+_MEAN = AGGREGATE_STATS.index("mean")
+
+
+def _fields(value, prefix: str = ""):
+    """
+    Yield the numeric fields of a sample as `(name, value)` pairs, the fields
+    of nested dictionaries being named `"<key>.<key>"`
+    """
+    if isinstance(value, bool):
+        return
+
+    if isinstance(value, (int, float)):
+        yield prefix, value
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            yield from _fields(item, f"{prefix}.{key}" if prefix else key)
+
+
+def _encoded_size(data: dict) -> int:
+    # Size of the log as it is sent over socket.io
+    return len(json.dumps(data, separators=(",", ":")))
+
+
+class RollingWindow:
+    """
+    Samples of a numeric field over the last `length` seconds, on the
+    monotonic clock. The latest sample is always kept, so that a field
+    sampled less often than `length` still has a value.
+    """
+
+    __slots__ = ("length", "samples")
+
+    def __init__(self, length: float) -> None:
+        self.length: float = length
+        self.samples: deque[tuple[float, float]] = deque()
+
+    def add(self, now: float, value: float) -> None:
+        self.samples.append((now, value))
+
+    def expire(self, now: float) -> None:
+        """
+        Drop the samples older than the window, except the latest one
+        """
+        samples = self.samples
+        while len(samples) > 1 and now - samples[0][0] > self.length:
+            samples.popleft()
+
+    def summary(self, digits: int = 2) -> list[float]:
+        """
+        Return the min, max, mean and 95th percentile of the samples, rounded
+        to `digits` decimal places, and their count (see `AGGREGATE_STATS`)
+        """
+        values = sorted(value for _, value in self.samples)
+        count = len(values)
+
+        return [
+            round(values[0], digits),
+            round(values[-1], digits),
+            round(sum(values) / count, digits),
+            round(values[max(math.ceil(0.95 * count) - 1, 0)], digits),
+            count,
+        ]
+
+
+class AggregatorStats:
+    """
+    Bandwidth counters of a `UsageAggregator`.
+
+    Attributes:
+    - `raw_logs`: `int`, logs handed over by the logger
+    - `raw_bytes`: `int`, size of those logs as they would have been sent
+    - `sent_logs`: `int`, rolled up logs sent
+    - `sent_bytes`: `int`
+    - `suppressed`: `int`, rollups not sent as nothing changed significantly
+    """
+
+    def __init__(self) -> None:
+        self.raw_logs: int = 0
+        self.raw_bytes: int = 0
+        self.sent_logs: int = 0
+        self.sent_bytes: int = 0
+        self.suppressed: int = 0
+
+    def as_dict(self) -> dict:
+        """
+        Return the counters along with the achieved bandwidth reduction ratio
+        """
+        return {
+            "raw_logs": self.raw_logs,
+            "raw_bytes": self.raw_bytes,
+            "sent_logs": self.sent_logs,
+            "sent_bytes": self.sent_bytes,
+            "suppressed": self.suppressed,
+            "reduction": self.raw_bytes / self.sent_bytes if self.sent_bytes else 0.0,
+        }
+
+
+class UsageAggregator:
+    """
+    Downsamples the logs of a logger before they are sent.
+
+    Every sample of the logger is added to a rolling window of `window`
+    seconds per numeric field (`"cpu"`, `"memory.primary"`, ...). Every
+    `interval` seconds, the latest log is rolled up: its fields hold the
+    mean of their window, so the log keeps the shape the attestation server
+    and the dashboard expect, and `aggregate` holds the min, max, mean,
+    95th percentile and count of the samples of each field, as a list in
+    the order of `AGGREGATE_STATS`.
+
+    A rollup is only sent when a field changed by more than `change` since
+    the last log sent (relative to the larger of the two values and the
+    field's scale), or when no log was sent for `heartbeat` seconds.
+
+    The window of a field missing from the samples of its metric for a
+    full window is dropped, e.g. the field of a network interface or a
+    disk which went away, so that transient devices don't pile up.
+    """
+
+    def __init__(
+        self,
+        interval: float = LOG_ROLLUP_INTERVAL,
+        window: float = LOG_ROLLUP_WINDOW,
+        change: float = LOG_SUPPRESS_CHANGE,
+        heartbeat: float = LOG_HEARTBEAT,
+        scales: dict[str, float] = None,
+    ) -> None:
+        self.interval: float = interval
+        self.window: float = window
+        self.change: float = change
+        self.heartbeat: float = heartbeat
+
+        # Scale of the fields of each metric, a change of this much is a change of
+        # the whole range of the field, see `Logger.activity_scales`
+        self.scales: dict[str, float] = scales or {}
+
+        self.windows: dict[str, RollingWindow] = {}
+        self.stats: AggregatorStats = AggregatorStats()
+
+        # Fields of the last log sent, and when it was sent
+        self._last_sent: dict[str, float] = {}
+        self._last_sent_at: float = None
+
+        # Monotonic time at which the next rollup is due
+        self._next_rollup: float = None
+
+        # Monotonic time of the last sample of each metric
+        self._sampled: dict[str, float] = {}
+
+    def add(self, metric: str, now: float, value) -> None:
+        """
+        Add a sample of a metric to the windows of its fields
+        """
+        self._sampled[metric] = now
+
+        for field, number in _fields(value, metric):
+            window = self.windows.get(field)
+
+            if window is None:
+                window = self.windows[field] = RollingWindow(self.window)
+
+            window.add(now, number)
+
+    def rollup(self, data: dict, now: float) -> dict | None:
+        """
+        Hand over a log of the logger. Returns the rolled up log to send,
+        or `None` when no rollup is due or nothing changed significantly.
+        """
+        self.stats.raw_logs += 1
+        self.stats.raw_bytes += _encoded_size(data)
+
+        if self._next_rollup is None:
+            self._next_rollup = now
+
+        if now < self._next_rollup:
+            return None
+
+        self._next_rollup += self.interval
+        if self._next_rollup <= now:
+            self._next_rollup = now + self.interval
+
+        aggregate = {}
+        for field, window in list(self.windows.items()):
+            last = window.samples[-1][0]
+
+            # Left out of the samples of its metric since a full window
+            if now - last > self.window and self._sampled.get(field.partition(".")[0], last) > last:
+                del self.windows[field]
+                continue
+
+            window.expire(now)
+            aggregate[field] = window.summary()
+
+        if not self._changed(aggregate, now):
+            self.stats.suppressed += 1
+            return None
+
+        log = self._rolled_up(data, aggregate)
+        log["aggregate"] = aggregate
+        log["window"] = self.window
+
+        self._last_sent = {field: summary[_MEAN] for field, summary in aggregate.items()}
+        self._last_sent_at = now
+
+        self.stats.sent_logs += 1
+        self.stats.sent_bytes += _encoded_size(log)
+        return log
+
+    def _changed(self, aggregate: dict[str, list], now: float) -> bool:
+        """
+        Whether any field changed significantly since the last log sent
+        """
+        if self._last_sent_at is None or now - self._last_sent_at >= self.heartbeat:
+            return True
+
+        for field, summary in aggregate.items():
+            last = self._last_sent.get(field)
+
+            if last is None:
+                return True
+
+            mean = summary[_MEAN]
+            scale = self.scales.get(field.partition(".")[0], 1.0)
+
+            if abs(mean - last) / max(abs(mean), abs(last), scale) >= self.change:
+                return True
+
+        return False
+
+    @staticmethod
+    def _rolled_up(data: dict, aggregate: dict[str, list], prefix: str = "") -> dict:
+        """
+        Return a copy of the log with the mean of each aggregated field
+        """
+        log = {}
+
+        for key, value in data.items():
+            field = f"{prefix}.{key}" if prefix else key
+
+            if isinstance(value, dict):
+                value = UsageAggregator._rolled_up(value, aggregate, field)
+            elif field in aggregate:
+                value = aggregate[field][_MEAN]
+
+            log[key] = value
+
+        return log
@@ -1,18 +1,43 @@
-import sys
 import time
 from abc import ABC, abstractmethod
 from collections import deque
+from threading import Event as ThreadEvent
 from threading import Lock
+from typing import Any
 
-from attestation_agent.errors import LogError
+from attestation_agent.config import LOG_INTERVAL, LOG_METRIC_INTERVALS
+from attestation_agent.errors import LogError, report
+from attestation_agent.metrics.agent import LOGGER_LOGS, LOGGER_SAMPLE_SECONDS
+
+from .aggregator import UsageAggregator
+from .scheduler import SampleScheduler
 
 
 class Logger(ABC):
     """
     Base class for all loggers.
+
+    A logger samples each of its `metrics` on its own schedule (see
+    `SampleScheduler`) and sends a log built from the latest samples
+    every `interval` seconds, on the monotonic clock. With an `aggregator`,
+    the logs are rolled up by it and only the rollups it returns are sent.
     """
 
-    def __init__(self) -> None:
+    # Type of the logs sent by the logger
+    type: str = None
+
+    # Metrics sampled by `_sample`
+    metrics: tuple[str, ...] = ()
+
+    # Scale of the activity of each metric, see `SampleScheduler`
+    activity_scales: dict[str, float] = {}
+
+    def __init__(
+        self,
+        interval: float = LOG_INTERVAL,
+        metric_intervals: dict[str, float] = LOG_METRIC_INTERVALS,
+        aggregator: UsageAggregator = None,
+    ) -> None:
         # Store the state of logger
         self._running: bool = True
 
@@ -27,7 +52,43 @@ class Logger(ABC):
         # high memory consumption when machine runs for longer durations.
         self.logs: deque[str] = deque()
 
-    def run(self, machine_id: str, sio: "socketio.Client") -> None:
+        # Interval (in seconds) between two logs
+        self.interval: float = interval
+
+        # Latest sample of each metric, along with its monotonic time
+        self.samples: dict[str, tuple[float, Any]] = {}
+
+        # Decides when each metric is sampled
+        now = time.monotonic()
+        self.scheduler: SampleScheduler = SampleScheduler()
+
+        for metric in self.metrics:
+            self.scheduler.add(metric, metric_intervals.get(metric, interval), now)
+
+        # Downsamples the logs before they are sent, if any
+        self.aggregator: UsageAggregator | None = aggregator
+
+        if aggregator is not None and not aggregator.scales:
+            aggregator.scales = dict(self.activity_scales)
+
+        # Encodes the logs as negotiated with the attestation server,
+        # see `WireFormat`, they are sent as is until then
+        self.wire_format: "WireFormat" = None
+
+        # Monotonic time at which the next log is due
+        self._next_log: float = now
+
+        # Set to interrupt the waiting logger
+        self._wakeup: ThreadEvent = ThreadEvent()
+
+        # Metrics of the logger, looked up once for the hot paths
+        self._sample_metrics = {
+            metric: LOGGER_SAMPLE_SECONDS.labels(logger=self.type, metric=metric)
+            for metric in self.metrics
+        }
+        self._logs_metric = LOGGER_LOGS.labels(logger=self.type)
+
+    def run(self, machine_id: str, channel: "LogChannel") -> None:
         """
         Run the logger.
         """
@@ -37,52 +98,116 @@ class Logger(ABC):
         # While the logger can run, it will collect
         # usage metrics and send them to the attestation server
         while self._running:
-            # Try to collect usage metrics and catch any error
+            wake = self.step(channel)
+
+            # Wait for the next sample or log, without drifting
+            self._wakeup.wait(max(0.0, wake - time.monotonic()))
+
+    def step(self, channel: "LogChannel") -> float:
+        """
+        Take the samples which are due and send a log if one is due.
+        Returns the monotonic time at which the next step is due.
+        """
+        now = time.monotonic()
+
+        for metric in self.scheduler.due(now):
+            # Try to collect the metric and catch any error
             # and print it as LogError
+            try:
+                start = time.perf_counter()
+                value = self._sample(metric)
+                self._sample_metrics[metric].observe(time.perf_counter() - start)
+            except Exception as exc:
+                report(
+                    LogError(
+                        msg="error while collecting usage metrics",
+                        metric=metric,
+                        exc=exc
+                    )
+                )
+                self.scheduler.record(metric, now)
+                continue
+
+            self.samples[metric] = (now, value)
+
+            if self.aggregator is not None:
+                self.aggregator.add(metric, now, value)
+
+            self.scheduler.record(
+                metric, now, self._activity(metric, value), self.activity_scales.get(metric, 1.0)
+            )
+
+        if now >= self._next_log:
             try:
                 data = self._collect_log()
             except Exception as exc:
-                print(
+                report(
                     LogError(
                         msg="error while collecting usage metrics",
                         exc=exc
-                    ),
-                    file=sys.stderr
+                    )
                 )
-            finally:
+            else:
+                if self.aggregator is not None:
+                    data = self.aggregator.rollup(data, now)
+
                 # Send the data to the attestation server
-                self._send_log(sio, data)
+                if data is not None:
+                    self._send_log(channel, data)
+
+            self._next_log += self.interval
 
-            # Wait for some time
-            # NOTE: Can be adjusted: SLOW, NORMAL, FAST
-            time.sleep(1)
+            if self._next_log <= now:
+                self._next_log = now + self.interval
+
+        if not self.metrics:
+            return self._next_log
+
+        return min(self._next_log, self.scheduler.next_due())
+
+    def _sample(self, metric: str) -> Any:
+        """
+        Sample a single metric
+        """
+        raise NotImplementedError("Implementation required for: _sample")
+
+    def _activity(self, metric: str, value: Any) -> float | None:
+        """
+        Return a single number describing a sample of the metric, to adapt
+        its sampling interval, or `None` to keep the interval fixed
+        """
+        return None
 
     @abstractmethod
     def _collect_log(self) -> dict:
         """
-        Collect data to be logged
+        Collect data to be logged, from the latest `samples` of the metrics
         For example:
          - application usage
          - system usage
         """
         raise NotImplementedError("Implementation required for: _collect_log")
 
-    def _send_log(self, sio: "socketio.Client", data: dict) -> None:
+    def _send_log(self, channel: "LogChannel", data: dict) -> None:
         """
-        Sends data to the attestation server
+        Sends data to the attestation server, through the channel which
+        buffers it until it can be sent
         """
         # Create a timestamp at which the log was recorded
         timestamp = int(time.time())
 
         try:
-            sio.emit("collect_log", (self.machine_id, timestamp, self.type, data))
+            if self.wire_format is not None:
+                data = self.wire_format.encode_log(data)
+
+            channel.emit("collect_log", (self.machine_id, timestamp, self.type, data))
+            self._logs_metric.inc()
         except Exception as exc:
-            print(
+            report(
                 LogError(
                     msg="error while sending logs",
                     exc=exc
-                ),
-                file=sys.stderr
+                )
             )
 
     def resume(self):
@@ -90,9 +215,11 @@ class Logger(ABC):
         Set the logger state to running
         """
         self._running = True
+        self._wakeup.clear()
 
     def stop(self):
         """
         Set the logger state to stopped
         """
         self._running = False
+        self._wakeup.set()
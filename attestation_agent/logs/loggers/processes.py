@@ -0,0 +1,187 @@
+import time
+from bisect import bisect_left
+from heapq import nlargest
+
+from psutil import AccessDenied, NoSuchProcess, Process, ZombieProcess, pids
+
+from attestation_agent.config import LOG_PROCESS_CPU_BUDGET, LOG_TOP_PROCESSES
+
+# Errors of a process which exited or can't be read
+_PROCESS_ERRORS = (NoSuchProcess, ZombieProcess, AccessDenied, OSError)
+
+
+class ProcessUsage:
+    """
+    Cached handle of a process and its latest usage
+
+    Attributes:
+    - `handle`: `psutil.Process`
+    - `cpu`: `float`, CPU utilization (percent of one CPU) between the last two reads
+    - `rss`: `int`, resident memory in bytes
+    - `io`: `float`, bytes read and written per second between the last two reads
+    """
+
+    __slots__ = ("handle", "name", "cpu", "rss", "io", "_read_at", "_cpu_time", "_io_bytes")
+
+    def __init__(self, handle: Process) -> None:
+        self.handle: Process = handle
+        self.name: str = None
+        self.cpu: float = 0.0
+        self.rss: int = 0
+        self.io: float = 0.0
+
+        # Counters of the last read, to compute the rates
+        self._read_at: float = None
+        self._cpu_time: float = None
+        self._io_bytes: int = None
+
+    def read(self, now: float) -> None:
+        """
+        Read the counters of the process and update its usage
+        """
+        handle = self.handle
+
+        with handle.oneshot():
+            cpu_times = handle.cpu_times()
+            self.rss = handle.memory_info().rss
+
+            try:
+                io = handle.io_counters()
+                io_bytes = io.read_bytes + io.write_bytes
+            except (AccessDenied, AttributeError):
+                # Not readable without privileges, or not available on the platform
+                io_bytes = None
+
+        cpu_time = cpu_times.user + cpu_times.system
+
+        if self._read_at is not None and now > self._read_at:
+            elapsed = now - self._read_at
+            self.cpu = (cpu_time - self._cpu_time) / elapsed * 100
+
+            if io_bytes is not None and self._io_bytes is not None:
+                self.io = (io_bytes - self._io_bytes) / elapsed
+
+        self._read_at = now
+        self._cpu_time = cpu_time
+        self._io_bytes = io_bytes
+
+    def as_dict(self, pid: int) -> dict:
+        if self.name is None:
+            try:
+                self.name = self.handle.name()
+            except _PROCESS_ERRORS:
+                self.name = ""
+
+        return {
+            "pid": pid,
+            "name": self.name,
+            "cpu": round(self.cpu, 2),
+            "rss": self.rss,
+            "io": round(self.io, 2),
+        }
+
+
+class ProcessTable:
+    """
+    Top processes by CPU, resident memory and IO, updated incrementally.
+
+    The `psutil.Process` handles are cached across scans, only the new PIDs
+    get a handle of their own, when they are first read, and so do the
+    PIDs reused by another process since. A scan reads the processes in turns, from
+    where the previous scan stopped, until it has used `budget` times the
+    time elapsed since the previous scan in CPU time (e.g. 0.02 is 2% of
+    a CPU): on hosts with thousands of processes, each process is read
+    every few scans instead of all of them at once, and the processes not
+    read keep their latest usage. Listing the PIDs counts towards the budget.
+    """
+
+    def __init__(self, top: int = LOG_TOP_PROCESSES, budget: float = LOG_PROCESS_CPU_BUDGET) -> None:
+        self.top: int = top
+        self.budget: float = budget
+
+        # Processes by PID, `None` until the process is read for the first time
+        self.processes: dict[int, ProcessUsage | None] = {}
+
+        # PIDs in the order they are read, and the position of the next one
+        self._order: list[int] = []
+        self._cursor: int = 0
+
+        self._scanned_at: float = None
+
+        # Counters of the last scan
+        self.last_read: int = 0
+        self.last_cpu_time: float = 0.0
+
+    def scan(self, now: float) -> None:
+        """
+        Pick up the new processes, drop the exited ones and read as many
+        processes as the CPU budget allows
+        """
+        start = time.thread_time()
+
+        current = set(pids())
+        processes = self.processes
+
+        for pid in processes.keys() - current:
+            del processes[pid]
+
+        new = current - processes.keys()
+        for pid in new:
+            processes[pid] = None
+
+        if new or len(self._order) != len(processes):
+            # Carry on from the process which was next in turn
+            following = self._order[self._cursor] if self._order else 0
+            self._order = sorted(processes)
+            self._cursor = bisect_left(self._order, following)
+
+            if self._cursor >= len(self._order):
+                self._cursor = 0
+
+        # The first scan is allowed as much as a scan after a second
+        elapsed = 1.0 if self._scanned_at is None else now - self._scanned_at
+        allowance = self.budget * elapsed
+        self._scanned_at = now
+
+        read = 0
+        order = self._order
+
+        while read < len(order):
+            if time.thread_time() - start >= allowance:
+                break
+
+            pid = order[self._cursor]
+            self._cursor = (self._cursor + 1) % len(order)
+            read += 1
+
+            if pid not in processes:
+                continue
+
+            try:
+                process = processes[pid]
+
+                # Creating a handle reads the process as well. A PID reused
+                # since the last read (the creation time differs) is a new process
+                if process is None or not process.handle.is_running():
+                    process = processes[pid] = ProcessUsage(Process(pid))
+
+                process.read(now)
+            except _PROCESS_ERRORS:
+                del processes[pid]
+
+        self.last_read = read
+        self.last_cpu_time = time.thread_time() - start
+
+    def table(self) -> dict[str, list[dict]]:
+        """
+        Return the `top` processes by CPU, resident memory and IO
+        """
+        items = [(pid, process) for pid, process in self.processes.items() if process is not None]
+
+        return {
+            key: [
+                process.as_dict(pid)
+                for pid, process in nlargest(self.top, items, key=lambda item: getattr(item[1], key))
+            ]
+            for key in ("cpu", "rss", "io")
+        }
@@ -0,0 +1,105 @@
+from attestation_agent.config import (LOG_ADAPT_CHANGE, LOG_ADAPT_IDLE,
+                                      LOG_ADAPT_MAX_FACTOR,
+                                      LOG_ADAPT_MIN_FACTOR, LOG_MIN_INTERVAL)
+
+
+class MetricSchedule:
+    """
+    Sampling schedule of a single metric, on the monotonic clock
+
+    Attributes:
+    - `name`: `str`
+    - `base`: `float`, configured interval in seconds
+    - `interval`: `float`, current interval, adapted between `minimum` and `maximum`
+    - `due`: `float`, monotonic time of the next sample
+    - `activity`: `float | None`, activity measured by the last sample
+    """
+
+    __slots__ = ("name", "base", "interval", "minimum", "maximum", "due", "activity")
+
+    def __init__(self, name: str, base: float, minimum: float, maximum: float, due: float) -> None:
+        self.name: str = name
+        self.base: float = base
+        self.interval: float = base
+        self.minimum: float = minimum
+        self.maximum: float = maximum
+        self.due: float = due
+        self.activity: float | None = None
+
+
+class SampleScheduler:
+    """
+    Decides when each metric of a logger is sampled.
+
+    Samples are due at fixed steps of the monotonic clock, so the time spent
+    collecting and sending doesn't add up to the period. A metric falling
+    behind by more than one interval skips the missed samples.
+
+    The interval of a metric adapts to its activity: it is halved when two
+    samples differ by more than `change` (relative to the larger of them and
+    the metric's `scale`), down to `min_factor` times its base interval (and
+    no less than `min_interval`), and
+    grows by half when they differ by less than `idle`, up to `max_factor`
+    times its base interval.
+    """
+
+    def __init__(
+        self,
+        min_factor: float = LOG_ADAPT_MIN_FACTOR,
+        max_factor: float = LOG_ADAPT_MAX_FACTOR,
+        change: float = LOG_ADAPT_CHANGE,
+        idle: float = LOG_ADAPT_IDLE,
+        min_interval: float = LOG_MIN_INTERVAL,
+    ) -> None:
+        self.min_factor: float = min_factor
+        self.max_factor: float = max_factor
+        self.change: float = change
+        self.idle: float = idle
+        self.min_interval: float = min_interval
+
+        self.schedules: dict[str, MetricSchedule] = {}
+
+    def add(self, name: str, interval: float, now: float) -> None:
+        """
+        Schedule a metric every `interval` seconds, starting at `now`
+        """
+        minimum = min(interval, max(interval * self.min_factor, self.min_interval))
+        self.schedules[name] = MetricSchedule(
+            name, interval, minimum, interval * self.max_factor, now
+        )
+
+    def due(self, now: float) -> list[str]:
+        """
+        Return the metrics whose sample is due
+        """
+        return [name for name, schedule in self.schedules.items() if schedule.due <= now]
+
+    def next_due(self) -> float:
+        """
+        Return the monotonic time of the next sample of any metric
+        """
+        return min(schedule.due for schedule in self.schedules.values())
+
+    def record(self, name: str, now: float, activity: float | None = None, scale: float = 1.0) -> None:
+        """
+        Record that a metric was sampled at `now`, with the given activity
+        (a single number describing the sample), and schedule its next sample
+        """
+        schedule = self.schedules[name]
+
+        if activity is not None and schedule.activity is not None:
+            change = abs(activity - schedule.activity) / max(
+                abs(activity), abs(schedule.activity), scale
+            )
+
+            if change >= self.change:
+                schedule.interval = max(schedule.interval / 2, schedule.minimum)
+            elif change <= self.idle:
+                schedule.interval = min(schedule.interval * 1.5, schedule.maximum)
+
+        schedule.activity = activity
+        schedule.due += schedule.interval
+
+        # Skip the samples missed while the logger was held up
+        if schedule.due <= now:
+            schedule.due = now + schedule.interval
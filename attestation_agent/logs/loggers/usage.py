@@ -20,21 +20,78 @@ from psutil import (
     sensors_temperatures
 )
 
+from attestation_agent.config import LOG_DETAILED
+
 from .base import Logger
+from .processes import ProcessTable
 
 
 class UsageLogger(Logger):
-    """Logger for system usage logging"""
+    """
+    Logger for system usage logging
+
+    CPU and memory are sampled as they are, disk and network as rates per
+    second since their previous sample. A log holds the latest sample of
+    each metric, with the monotonic time it was taken at in `sampled_at`.
+
+    In detailed mode, the logs also hold the rates per disk (`disks`) and
+    per network interface (`nics`), and the top processes by CPU, resident
+    memory and IO (`processes`, see `ProcessTable`).
+    """
 
     type = "USAGE"
 
-    def __init__(self, *args, **kwargs) -> None:
+    metrics = ("cpu", "memory", "disk", "network")
+
+    # Metrics added in detailed mode
+    detailed_metrics = ("disks", "nics", "processes")
+
+    # A change of this much in a sample is a change of its whole range,
+    # see `_activity`: CPU percent, memory percent and bytes per second
+    activity_scales = {
+        "cpu": 10.0,
+        "memory": 5.0,
+        "disk": 1024.0 * 1024.0,
+        "network": 100.0 * 1024.0,
+    }
+
+    def __init__(self, *args, detailed: bool = LOG_DETAILED, **kwargs) -> None:
+        self.detailed: bool = detailed
+
+        if detailed:
+            self.metrics = self.metrics + self.detailed_metrics
+
         super().__init__(*args, **kwargs)
-        self._data = self._record_io_data()
 
-    def _record_io_data(self) -> dict[str, dict[str,int]]:
-        du = disk_io_counters()
-        disk_usage = {
+        # Previous disk and network counters, and their monotonic time
+        self._counters: dict[str, tuple[float, dict]] = {}
+
+        now = time.monotonic()
+        for category, counters in self._record_io_data().items():
+            self._counters[category] = (now, counters)
+
+        # Top processes, read incrementally in detailed mode
+        self.processes: ProcessTable | None = ProcessTable() if detailed else None
+
+        # Start measuring the CPU utilization between two samples
+        cpu_percent()
+
+    def _record_io_data(self) -> dict[str, dict]:
+        data = {
+            "disk": self._disk_counters(),
+            "network": self._network_counters(),
+        }
+
+        if self.detailed:
+            data["disks"] = self._per_disk_counters()
+            data["nics"] = self._per_nic_counters()
+
+        return data
+
+    @staticmethod
+    def _disk_counters(du=None) -> dict[str, int]:
+        du = du or disk_io_counters()
+        return {
             "read_count": du.read_count,
             "write_count": du.write_count,
             "read_bytes": du.read_bytes,
@@ -42,45 +99,108 @@ class UsageLogger(Logger):
             "busy_time": du.busy_time
         }
 
-        nu = net_io_counters()
-        network_usage = {
+    @staticmethod
+    def _network_counters(nu=None) -> dict[str, int]:
+        nu = nu or net_io_counters()
+        return {
             "bytes_sent": nu.bytes_sent,
             "bytes_recv": nu.bytes_recv,
             "packets_sent": nu.packets_sent,
             "packets_recv": nu.packets_recv
         }
 
-        data = {
-            "disk": disk_usage,
-            "network": network_usage,
+    @classmethod
+    def _per_disk_counters(cls) -> dict[str, dict[str, int]]:
+        return {
+            disk: cls._disk_counters(du)
+            for disk, du in disk_io_counters(perdisk=True).items()
         }
-        return data
 
-    def _collect_log(self) -> dict:
+    @classmethod
+    def _per_nic_counters(cls) -> dict[str, dict[str, int]]:
+        return {
+            nic: cls._network_counters(nu)
+            for nic, nu in net_io_counters(pernic=True).items()
+        }
+
+    def _rates(self, category: str, current: dict[str, int]) -> dict[str, float]:
         """
-        Collect various system usage metrics
+        Return the rates per second of the counters since their previous sample
         """
-        uptime = boot_time()
-        cpu_usage = cpu_percent()
+        now = time.monotonic()
+        previous_time, previous = self._counters[category]
+        self._counters[category] = (now, current)
+
+        elapsed = max(now - previous_time, 1e-6)
+        return {key: (current[key] - previous[key]) / elapsed for key in previous}
 
-        sm = swap_memory()
-        vm = virtual_memory()
-        mem_usage = {
-            "primary": vm.percent,
-            "swap": sm.percent
+    def _device_rates(self, category: str, current: dict[str, dict[str, int]]) -> dict[str, dict[str, float]]:
+        """
+        Return the rates per second of the counters of each device since their
+        previous sample, devices which just appeared are left out until the next one
+        """
+        now = time.monotonic()
+        previous_time, previous = self._counters[category]
+        self._counters[category] = (now, current)
+
+        elapsed = max(now - previous_time, 1e-6)
+        return {
+            device: {key: (counters[key] - previous[device][key]) / elapsed for key in counters}
+            for device, counters in current.items()
+            if device in previous
         }
 
-        # Record IO data
-        current_data = self._record_io_data()
+    def _sample(self, metric: str):
+        if metric == "cpu":
+            return cpu_percent()
 
-        data = {
-            category: {
-                key: current_data[category][key] - self._data[category][key]
-                for (key, value) in self._data[category].items()
-            } for category in current_data
-        }
+        if metric == "memory":
+            sm = swap_memory()
+            vm = virtual_memory()
+            return {
+                "primary": vm.percent,
+                "swap": sm.percent
+            }
+
+        if metric == "disk":
+            return self._rates("disk", self._disk_counters())
+
+        if metric == "network":
+            return self._rates("network", self._network_counters())
+
+        if metric == "disks":
+            return self._device_rates("disks", self._per_disk_counters())
+
+        if metric == "nics":
+            return self._device_rates("nics", self._per_nic_counters())
+
+        if metric == "processes":
+            self.processes.scan(time.monotonic())
+            return self.processes.table()
+
+        raise ValueError(f"unknown metric '{metric}'")
 
-        self._data = current_data
+    def _activity(self, metric: str, value) -> float | None:
+        if metric == "cpu":
+            return value
+
+        if metric == "memory":
+            return value["primary"]
+
+        if metric == "disk":
+            return value["read_bytes"] + value["write_bytes"]
+
+        if metric == "network":
+            return value["bytes_sent"] + value["bytes_recv"]
+
+        # The detailed metrics are sampled at fixed intervals
+        return None
+
+    def _collect_log(self) -> dict:
+        """
+        Collect various system usage metrics
+        """
+        uptime = boot_time()
 
         # NOTE: We are using VMs, they don't have any physical batteries (but virtual)
         #battery_percentage = sensors_battery().percent
@@ -93,10 +213,15 @@ class UsageLogger(Logger):
 
         log = {
             "timestamp": int(time.time()),
+            "monotonic": time.monotonic(),
             "uptime": uptime,
             "battery": battery_percentage,
-            "cpu": cpu_usage,
-            "memory": mem_usage
+            "sampled_at": {},
         }
-        log.update(data)
-        return log
\ No newline at end of file
+
+        # Latest sample of each metric, metrics not sampled yet are left out
+        for metric, (sampled_at, value) in self.samples.items():
+            log[metric] = value
+            log["sampled_at"][metric] = sampled_at
+
+        return log
@@ -2,5 +2,10 @@ from .base import Event, Parser
 
 from .audit import AuditEvent, AuditParser
 from .auth import AuthEvent, AuthParser
+from .coalescer import EventCoalescer
+from .rules import RuleEvent, RuleParser, RuleSet, load_rule_parsers
 
-__all__ = ("Event", "Parser", "AuditEvent", "AuditParser", "AuthEvent", "AuthParser")
+__all__ = (
+    "Event", "Parser", "AuditEvent", "AuditParser", "AuthEvent", "AuthParser",
+    "EventCoalescer", "RuleEvent", "RuleParser", "RuleSet", "load_rule_parsers",
+)
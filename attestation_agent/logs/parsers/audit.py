@@ -1,136 +1,361 @@
 import re
+from typing import BinaryIO
 
 from attestation_agent.config import AUDIT_LOG
 
 from .base import Event, Parser
+from .correlation import AuditCorrelator, RecordGroup
+
+# Bare values of untrusted string fields are hex encoded by auditd
+_hex_re = re.compile(r"(?:[0-9A-F]{2})+")
+
+# Fields which auditd hex encodes when they contain special characters,
+# along with the `a0`, `a1`, ... arguments of `EXECVE` records
+ENCODED_FIELDS = frozenset((
+    "acct", "cmd", "comm", "cwd", "data", "dir", "exe", "file", "key",
+    "name", "ocomm", "path", "proctitle", "watch",
+))
+
+
+def split_fields(record: str) -> dict[str, str]:
+    """
+    Split an audit record into its raw `key=value` fields in a single pass.
+    Values are left quoted or encoded, see `decode_field`. auditd hex encodes
+    any value with whitespace in it, so fields are separated by whitespace.
+
+    The fields of the nested `msg='...'` section are merged in. If a key
+    occurs more than once, the first occurrence wins, so `msg` holds the
+    `audit(<time>:<serial>):` id.
+    """
+    # Unwrap the nested section so that its fields are split along with the rest
+    start = record.find("msg='")
+    if start >= 0:
+        end = record.rfind("'")
+        record = f"{record[:start + 4]} {record[start + 5:end]} {record[end + 1:]}"
+
+    fields = {}
+    for token in record.split():
+        key, _, value = token.partition("=")
+
+        if key not in fields:
+            fields[key] = value
+
+    return fields
+
+
+def decode_field(key: str, value: str, execve: bool = False) -> str:
+    """
+    Decode a raw field value: remove the quotes or decode the hex encoding.
+    `execve` tells whether the field belongs to an `EXECVE` record, whose
+    `a0`, `a1`, ... arguments may be encoded (they are numbers elsewhere).
+    """
+    if value[:1] == '"':
+        return value[1:-1]
+
+    if (
+        value
+        and (key in ENCODED_FIELDS or (execve and key[0] == "a" and key[1:].isdigit()))
+        and _hex_re.fullmatch(value)
+    ):
+        return bytes.fromhex(value).decode("utf-8", "replace").replace("\0", " ")
+
+    return value
+
+
+def tokenize(record: str) -> dict[str, str]:
+    """
+    Split an audit record into its decoded `key=value` fields
+    """
+    fields = split_fields(record)
+    execve = fields.get("type") == "EXECVE"
+    return {key: decode_field(key, value, execve) for key, value in fields.items()}
+
+
+def parse_audit_id(record: str) -> tuple[float, int]:
+    """
+    Return the time and the serial number of an audit record,
+    from its `msg=audit(1697624101.123:4521):` id
+    """
+    start = record.index("audit(") + 6
+    sep = record.index(":", start)
+    return float(record[start:sep]), int(record[sep + 1:record.index(")", sep)])
 
 
 class AuditEvent(Event):
-    """Event logged by `auditd`"""
+    """
+    Event logged by `auditd`. Record specific attributes are kept in `extras`.
+
+    Attributes:
+    - `type`: `str`, the audit record type
+    - `serial`: `int`, the audit serial number
+    """
+
+    __slots__ = ("type", "serial")
+
+    fields = Event.fields + ("serial",)
 
     log_file = AUDIT_LOG
 
-    def __init__(self, **kwargs) -> None:
+    def __init__(self, type: str = None, serial: int = None, **kwargs) -> None:
         super().__init__(**kwargs)
+        self.type = type
+        self.serial = serial
+
+
+# Fields of the user authentication records and the event attributes they are stored as
+_USER_FIELDS = (
+    ("pid", "pid"),
+    ("uid", "uid"),
+    ("op", "operation"),
+    ("grantors", "grantors"),
+    ("acct", "account"),
+    ("exe", "exec_path"),
+    ("hostname", "hostname"),
+    ("addr", "address"),
+    ("terminal", "terminal"),
+)
+
+# Fields of the service records
+_SERVICE_FIELDS = (
+    ("pid", "pid"),
+    ("uid", "uid"),
+    ("unit", "unit"),
+    ("comm", "command"),
+    ("exe", "exec_path"),
+)
+
+
+# Fields of the records of a multi-record event which are merged into its event
+_MERGED_FIELDS = {
+    "SYSCALL": (
+        ("syscall", "syscall"),
+        ("success", "success"),
+        ("exit", "exit"),
+        ("ppid", "ppid"),
+        ("pid", "pid"),
+        ("auid", "auid"),
+        ("uid", "uid"),
+        ("euid", "euid"),
+        ("gid", "gid"),
+        ("ses", "session"),
+        ("tty", "terminal"),
+        ("comm", "command"),
+        ("exe", "exec_path"),
+        ("key", "key"),
+    ),
+    "CWD": (("cwd", "cwd"),),
+    "PROCTITLE": (("proctitle", "proctitle"),),
+    "CONFIG_CHANGE": (
+        ("op", "operation"),
+        ("key", "key"),
+        ("list", "list"),
+    ),
+}
 
-        for attr, value in kwargs.items():
-            if attr not in self.__dict__.keys():
-                setattr(self, attr, value)
+
+def _convert(value: str) -> str | int:
+    return int(value) if value.isdigit() else value
 
 
 class AuditParser(Parser):
     """Parser for logs generated by `auditd`"""
 
-    timestamp_re = re.compile(r"\d{10}\.\d{3}")
-    event_type_re = re.compile(r"type=(?P<type>[A-Z_]+)")
+    # Record types written by the kernel as part of a multi-record event,
+    # they are grouped by serial number and merged into a single event
+    CORRELATED_TYPES = frozenset((
+        "SYSCALL", "EXECVE", "CWD", "PATH", "PROCTITLE", "SOCKADDR",
+        "CONFIG_CHANGE", "BPRM_FCAPS", "MMAP", "OBJ_PID", "EOE",
+    ))
+
+    # Record types to generate events for, along with the fields to extract
+    # from each of them as `(field, attribute)` pairs.
+    # Record types without fields only provide the record type and timestamp
+    # as useful properties.
+    # For instance, `ANOM_LOGIN_FAILURES` suggests that
+    # the number of login failures were exceeded
+    # and thus does not require any more details to be parsed.
+    EVENT_TYPES = {
+        "CONFIG_CHANGE": (),
+        "KERNEL": (),
+        "EXECVE": (),
+        "SERVICE_START": _SERVICE_FIELDS,
+        "SERVICE_STOP": _SERVICE_FIELDS,
+        "ADD_USER": (),
+        "ADD_GROUP": (),
+        "ANOM_LOGIN_FAILURES": (),
+        "CHGRP_ID": (
+            ("op", "operation"),
+            ("target", "target"),
+            ("name", "name"),
+        ),
+        "CHUSER_ID": (
+            ("op", "operation"),
+            ("acct", "account"),
+            ("exe", "exec_path"),
+            ("hostname", "hostname"),
+            ("addr", "address"),
+            ("terminal", "terminal"),
+            ("old", "old_value"),
+            ("new", "new_value"),
+        ),
+        "USER_LOGIN": (("id", "user_id"),) + _USER_FIELDS,
+        "USER_ACCT": _USER_FIELDS,
+        "USER_AUTH": _USER_FIELDS,
+    }
 
     def __init__(self, filepath: str) -> None:
         super().__init__(filepath)
 
-        # Record types which do not correspond to any property
-        # parsing method only provide the record type and timestamp
-        # as useful properties.
-        # For instance, `ANOM_LOGIN_FAILURES` suggests that
-        # the number of login failures were exceeded
-        # and thus does not require any more details to be parsed.
-        self.EVENT_TYPES = {
-            "CONFIG_CHANGE": None,
-            "KERNEL": None,
-            "EXECVE": None,
-            "SERVICE_START": self._parse_service_start_stop,
-            "SERVICE_STOP": self._parse_service_start_stop,
-            "ADD_USER": None,
-            "ADD_GROUP": None,
-            "ANOM_LOGIN_FAILURES": None,
-            "CHGRP_ID": self._parse_chgrp_id,
-            "CHUSER_ID": self._parse_chuser_id,
-            "USER_LOGIN": self._parse_user_login,
-            "USER_ACCT": self._parse_user_acct,
-            "USER_AUTH": self._parse_user_auth,
-        }
+        # Groups the records of multi-record events
+        self.correlator: AuditCorrelator = AuditCorrelator()
 
     def _parse_event(self) -> Event | None:
-        timestamp = int(float(self.timestamp_re.search(self._data).group(0)))
-        event_type = self.event_type_re.search(self._data).group("type")
+        # Cheap check of the record type before tokenizing the whole record
+        start = self._data.find("type=") + 5
+        event_type = self._data[start:self._data.find(" ", start)]
+
+        if event_type in self.CORRELATED_TYPES:
+            timestamp, serial = parse_audit_id(self._data)
+            self.correlator.add(
+                serial, timestamp, event_type, split_fields(self._data), self._data
+            )
+            return None
 
         if event_type not in self.EVENT_TYPES:
             return None
 
-        if self.EVENT_TYPES[event_type] == None:
-            return AuditEvent(timestamp=timestamp, type=event_type, raw_content=self._data)
+        timestamp, serial = parse_audit_id(self._data)
+
+        # Split the record only if there are fields to extract
+        attrs = {}
+        wanted = self.EVENT_TYPES[event_type]
+
+        if wanted:
+            fields = split_fields(self._data)
+
+            for field, attr in wanted:
+                value = fields.get(field)
+
+                if value is None:
+                    continue
 
-        return self.EVENT_TYPES[event_type](
-            AuditEvent(timestamp=timestamp, type=event_type, raw_content=self._data)
+                # Inlined `decode_field`, for the common unencoded values
+                if value[:1] == '"':
+                    value = value[1:-1]
+                elif field in ENCODED_FIELDS:
+                    value = decode_field(field, value)
+
+                attrs[attr] = int(value) if value.isdigit() else value
+
+        return AuditEvent(
+            timestamp=int(timestamp), type=event_type, serial=serial,
+            raw_content=self._data, **attrs
         )
 
-    def _set_attrs(self, event_obj: AuditEvent, patterns: list[str]) -> AuditEvent:
+    def _drain(self) -> list[Event]:
+        self.correlator.expire()
+
+        events = []
+        for group in self.correlator.pop_complete():
+            event = self._merge(group)
+
+            if event is not None:
+                events.append(event)
+
+        return events
+
+    def _drain_timeout(self) -> float | None:
+        return self.correlator.timeout()
+
+    def _finish(self) -> list[Event]:
+        self.correlator.complete_all()
+        return self._drain()
+
+    def _align_chunk(self, fp: BinaryIO, offset: int) -> int:
+        # Don't split the records of an event, skip to the next serial number
+        offset = super()._align_chunk(fp, offset)
+        fp.seek(offset)
+        serial = None
+
+        for line in fp:
+            try:
+                line_serial = parse_audit_id(line.decode("utf-8", "replace"))[1]
+            except ValueError:
+                line_serial = None
+
+            if serial is None:
+                serial = line_serial
+            elif line_serial != serial:
+                break
+
+            offset += len(line)
+
+        return offset
+
+    def _merge(self, group: RecordGroup) -> AuditEvent | None:
         """
-        Compile all patterns, search them in the raw event string and
-        set the discovered attributes in the event object.
+        Merge the records of a multi-record event into a single event.
+        Returns `None` if none of the records is of interest.
         """
-        for pattern in patterns:
-            p_obj = re.compile(pattern)
-            try:
-                for key, value in (
-                    p_obj.search(event_obj.raw_content).groupdict().items()
-                ):
-                    value = value.strip('"')
-                    value = int(value) if value.isdigit() else value
-                    setattr(event_obj, key, value)
-            except AttributeError:
-                # Raised if `p_obj.search()` returns None
-                pass
-        return event_obj
-
-    def _parse_user_auth(self, event_obj: AuditEvent) -> AuditEvent:
-        patterns = (
-            r"""pid=(?P<pid>[0-9]+)""",
-            r"""uid=(?P<uid>[0-9]+)""",
-            r"""op=(?P<operation>[A-Za-z_:]+)""",
-            r"""grantors=(?P<grantors>[A-Za-z_,]+)""",
-            r"""acct=(?P<account>[A-Za-z_"\-]+)""",
-            r"""exe=(?P<exec_path>[A-Za-z_/\-"]+)""",
-            r"""hostname=(?P<hostname>[A-Za-z0-9_\-\?\.]+)""",
-            r"""addr=(?P<address>[a-z0-9\.:]+)""",
-            r"""terminal=(?P<terminal>[A-Za-z0-9/\-]+)""",
-        )
-        return self._set_attrs(event_obj, patterns)
-
-    def _parse_user_acct(self, event_obj: AuditEvent) -> AuditEvent:
-        return self._parse_user_auth(event_obj)
-
-    def _parse_user_login(self, event_obj: AuditEvent) -> AuditEvent:
-        id_pattern = re.compile(r"id=(?P<user_id>[0-9]+)")
-        event_obj.user_id = id_pattern.search(event_obj.raw_content).group("user_id")
-        return self._parse_user_auth(event_obj)
-
-    def _parse_chuser_id(self, event_obj: AuditEvent) -> AuditEvent:
-        patterns = (
-            r"""op=(?P<operation>[a-zA-Z0-9_\-]+)""",
-            r"""acct=(?P<account>[a-zA-Z_"\-]+)""",
-            r"""exe=(?P<exec_path>[a-zA-Z_"\-/]+)""",
-            r"""hostname=(?P<exec_path>[a-zA-Z_"\-\.\?]+)""",
-            r"""addr=(?P<address>[a-z0-9\.:]+)""",
-            r"""terminal=(?P<terminal>[A-Za-z0-9/\-]+)""",
-            r"""old=(?P<old_value>[a-zA-Z0-9_"\-]+)""",
-            r"""new=(?P<new_value>[a-zA-Z0-9_"\-]+)""",
+        record_types = [record_type for record_type, _, _ in group.records]
+        event_type = next(
+            (record_type for record_type in record_types if record_type in self.EVENT_TYPES),
+            None
         )
-        return self._set_attrs(event_obj, patterns)
 
-    def _parse_chgrp_id(self, event_obj: AuditEvent) -> AuditEvent:
-        patterns = (
-            r"""op=(?P<operation>[a-zA-Z0-9_\-]+)""",
-            r"""target=(?P<target>[a-zA-Z0-9_\-"]+)""",
-            r"""name=(?P<name>[a-zA-Z0-9_\-"]+)""",
-        )
-        return self._set_attrs(event_obj, patterns)
-
-    def _parse_service_start_stop(self, event_obj: AuditEvent) -> AuditEvent:
-        patterns = (
-            r"""pid=(?P<pid>[0-9]+)""",
-            r"""uid=(?P<uid>[0-9]+)""",
-            r"""unit=(?P<unit>[a-zA-Z\-]+)""",
-            r"""comm=(?P<command>[a-zA-Z\-"]+)""",
-            r"""exe=(?P<exec_path>[a-zA-Z\-/"]+)""",
+        if event_type is None:
+            return None
+
+        attrs = {}
+        paths = []
+
+        for record_type, fields, _ in group.records:
+            for field, attr in _MERGED_FIELDS.get(record_type, ()):
+                if field in fields and attr not in attrs:
+                    attrs[attr] = _convert(decode_field(field, fields[field]))
+
+            if record_type == "EXECVE":
+                attrs["arguments"] = self._arguments(fields)
+                attrs["command_line"] = " ".join(attrs["arguments"])
+            elif record_type == "PATH" and "name" in fields:
+                paths.append(decode_field("name", fields["name"]))
+
+        if paths:
+            attrs["paths"] = paths
+
+        if group.dropped:
+            attrs["dropped_records"] = group.dropped
+
+        return AuditEvent(
+            timestamp=int(group.timestamp),
+            type=event_type,
+            serial=group.serial,
+            records=record_types,
+            raw_content="\n".join(record for _, _, record in group.records),
+            **attrs
         )
-        return self._set_attrs(event_obj, patterns)
+
+    @staticmethod
+    def _arguments(fields: dict[str, str]) -> list[str]:
+        """
+        Return the decoded arguments of an `EXECVE` record. Long arguments are
+        split by auditd into hex encoded chunks `a1[0]`, `a1[1]`, ...
+        """
+        arguments = []
+        argc = int(fields.get("argc", 0))
+
+        for index in range(argc):
+            key = f"a{index}"
+
+            if key in fields:
+                arguments.append(decode_field(key, fields[key], execve=True))
+                continue
+
+            chunks = []
+            while (chunk := fields.get(f"{key}[{len(chunks)}]")) is not None:
+                chunks.append(chunk)
+
+            if chunks:
+                arguments.append(decode_field(key, "".join(chunks), execve=True))
+
+        return arguments
@@ -1,47 +1,66 @@
-from datetime import datetime
-
 from attestation_agent.config import AUTH_LOG
 
 from .base import Event, Parser
+from .timestamps import SyslogClock
 
 
 class AuthEvent(Event):
-    """Event logged in `auth.log`"""
+    """
+    Event logged in `auth.log`
+
+    Attributes:
+    - `hostname`: `str`
+    - `process`: `str`
+    - `pid`: `int | None`
+    """
+
+    __slots__ = ("hostname", "process", "pid")
+
+    fields = Event.fields + ("hostname", "process", "pid")
 
     log_file = AUTH_LOG
     type = "AUTH"
 
-    def __init__(self, **kwargs) -> None:
+    def __init__(
+        self, hostname: str = None, process: str = None, pid: int = None, **kwargs
+    ) -> None:
         super().__init__(**kwargs)
+        self.hostname = hostname
+        self.process = process
+        self.pid = pid
 
 
 class AuthParser(Parser):
-    """Parser for authentication logs in `auth.log`"""
+    """
+    Parser for authentication logs in `auth.log`. Lines may start with a
+    traditional syslog timestamp (`Oct 18 10:15:01`) or an RFC 3339 one
+    (`2023-10-18T10:15:01.123456+02:00`).
+    """
 
     def __init__(self, filepath: str) -> None:
         super().__init__(filepath)
 
+        # Converts the timestamps of the lines, caching the epoch of each day
+        self.clock: SyslogClock = SyslogClock()
+
     def _parse_event(self) -> Event:
         _event_split = self._data.split()
-        _month, _date, _time = _event_split[:3]
-        _proc_info = _event_split[4].split("[")
+
+        if _event_split[0][:1].isdigit():
+            _timestamp = self.clock.rfc3339(_event_split[0])
+            _event_split = _event_split[1:]
+        else:
+            _month, _date, _time = _event_split[:3]
+            _timestamp = self.clock.local(_month, _date, _time)
+            _event_split = _event_split[3:]
+
+        _proc_info = _event_split[1].split("[")
 
         return AuthEvent(
-            timestamp=self._parse_date_time(f"{_month} {_date}", _time),
-            hostname=_event_split[3],
-            process=_proc_info[0],
+            timestamp=_timestamp,
+            hostname=_event_split[0],
+            process=_proc_info[0].rstrip(":"),
             pid=int(_proc_info[1][:-2]) if len(_proc_info) > 1 else None,
-            action=" ".join(_event_split[5:]),
+            action=" ".join(_event_split[2:]),
             raw_content=self._data,
         )
-
-    def _parse_date_time(self, __date: str, __time: str) -> int:
-        _month, _date = __date.split()
-        _month = datetime.strptime(_month, "%b").month
-        _year = datetime.now().year
-        _hour, _minute, _second = map(int, __time.split(":"))
-        return int(
-            datetime(
-                _year, _month, int(_date), _hour, _minute, _second
-            ).timestamp()
-        )
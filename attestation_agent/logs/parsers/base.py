@@ -1,12 +1,24 @@
 import os
-import sys
 import time
+import weakref
 from abc import ABC, abstractmethod
 from collections import deque
+from threading import Event as ThreadEvent
 from threading import Lock
+from typing import BinaryIO, Callable, Iterable
 
-from attestation_agent.errors import ParseError
+from attestation_agent.config import (EVENT_QUEUE_HIGH, EVENT_QUEUE_LOW,
+                                      FINGERPRINT_SIZE, READ_ROTATED)
+from attestation_agent.errors import ParseError, report
 from attestation_agent.logs.events import Event
+from attestation_agent.metrics.agent import (PARSER_BLOCK_SECONDS,
+                                             PARSER_EVENTS, PARSER_LINES,
+                                             PARSER_QUEUE, PARSER_THROTTLED)
+
+from .catchup import catch_up
+from .tail import (LogTail, fingerprint, has_fingerprint,
+                   matches_fingerprint, open_log, rotated_logs)
+from .watch import FileWatcher, create_watcher
 
 
 class Parser(ABC):
@@ -26,8 +38,33 @@ class Parser(ABC):
         # Absolute path of the log file
         self.filepath: str = filepath
 
-        # Open the file and keep it open during the whole runtime
-        self.file = open(self.filepath, "rb")
+        # Path of the file being read, it differs from `self.filepath`
+        # while catching up on rotated logs
+        self._current: str = filepath
+
+        # Rotated logs left to be read before `self.filepath`, oldest first
+        self._backlog: deque[str] = deque()
+
+        # Open the file and keep it open until the log is rotated
+        self.file = open_log(self.filepath)
+
+        # Reads the log file in large blocks and splits them into lines
+        self.tail: LogTail = LogTail(self.file)
+
+        # Fingerprint of the head of the log file as of the last check at
+        # its EOF, to notice that it has been truncated and written again
+        self._head: list[int] | None = None
+
+        # Fingerprint of the file being read for the saved state, kept once
+        # its head can't change anymore
+        self._fingerprint: list[int] | None = None
+
+        # State of the previous file until the lines drained from it when
+        # switching files are published, checkpoints still point at it
+        self._previous: dict | None = None
+
+        # Wakes the parser up when the log file changes
+        self.watcher: FileWatcher = create_watcher(self.filepath)
 
         # Starting byte index of the log file.
         # Keeps track of how much of the file has been read.
@@ -45,93 +82,395 @@ class Parser(ABC):
         # high memory consumption when machine runs for longer durations.
         self.events: deque[Event] = deque()
 
-    def flush(self) -> list[Event]:
+        # Called with the parser whenever new events have been added to `self.events`
+        self.on_events: Callable[["Parser"], None] | None = None
+
+        # Watermarks of `self.events`: the parser stops reading the log
+        # at the high one and resumes once the events drop to the low one
+        self.queue_high: int = EVENT_QUEUE_HIGH
+        self.queue_low: int = EVENT_QUEUE_LOW
+
+        # Set when the parser may read again after being throttled
+        self._resume: ThreadEvent = ThreadEvent()
+
+        # Number of times the parser was throttled by a full queue
+        self.throttled: int = 0
+
+        # Metrics of the parser, looked up once for the hot paths
+        labels = {"parser": type(self).__name__, "log": filepath}
+        self._lines_metric = PARSER_LINES.labels(**labels)
+        self._events_metric = PARSER_EVENTS.labels(**labels)
+        self._block_metric = PARSER_BLOCK_SECONDS.labels(**labels)
+        self._throttled_metric = PARSER_THROTTLED.labels(**labels)
+
+        # The registry doesn't keep the parser alive
+        parser = weakref.ref(self)
+        PARSER_QUEUE.labels(**labels).set_function(
+            lambda: len(parser().events) if parser() is not None else 0
+        )
+
+    def flush(self) -> deque[Event]:
         """
-        Return the generated events and clear the current list
+        Return the generated events and start a new queue.
+        Must be called with `self.lock` held.
         """
-        events = self.events.copy()
-        self.events.clear()
+        events, self.events = self.events, deque()
+
+        # Let a throttled parser read again
+        self._resume.set()
         return events
 
-    def parse_line(self) -> bool:
+    def parse_lines(self) -> bool:
         """
-        Read a line from the log file, parse it and add it to the event queue.
+        Read a block of lines from the log file, parse them and add the
+        generated events to the event queue in one go.
+        Returns `False` if there was nothing new to read.
         """
-        # Skip the parsed bytes, read a line and store
-        # the current cursor position in the file
-        self.file.seek(self._pos)
-        line = self.file.readline()
-        self._pos = self.file.tell()
+        lines = self.tail.read_lines()
 
         # Check if there is no data, if we have reached the EOF
-        if line is None or len(line) == 0:
+        # check whether the log has been rotated or truncated meanwhile
+        if not lines:
+            lines = self._follow()
+
+        # Parse the whole block without holding the lock,
+        # it is only needed to publish the events and the new position
+        start = time.perf_counter()
+        events = self._parse_block(lines or ())
+
+        # Collect the events completed by the parser from earlier lines
+        try:
+            events.extend(self._drain())
+        except Exception as exc:
+            report(ParseError(msg="error while completing events", exc=exc))
+
+        if lines:
+            self._lines_metric.inc(len(lines))
+            self._block_metric.observe(time.perf_counter() - start)
+
+        if lines is None and not events:
             return False
 
-        # Convert to UTF-8 and parse the line
-        self._data = line.decode("utf-8").strip()
-        event = self._parse_event()
+        if events:
+            self._events_metric.inc(len(events))
+
+        with self.lock:
+            self.events.extend(events)
+            self._pos = self.tail.position
+            self._previous = None
+
+        if events and self.on_events is not None:
+            self.on_events(self)
+
+        return lines is not None
+
+    def _parse_block(self, lines: Iterable[str]) -> list[Event]:
+        """
+        Parse a block of lines and return the generated events
+        """
+        events = []
+
+        for line in lines:
+            self._data = line.strip()
 
-        if event is not None:
-            self.events.append(event)
+            # Keep track of the number of lines parsed so far
+            self._line += 1
 
-        return True
+            if not self._data:
+                continue
+
+            # Try to parse the line and catch any error
+            # and report it as ParseError
+            try:
+                event = self._parse_event()
+            except Exception as exc:
+                report(
+                    ParseError(
+                        msg="error while parsing line",
+                        line=self._line,
+                        position=self._pos,
+                        data=self._data,
+                        exc=exc
+                    )
+                )
+                continue
+
+            if event is not None:
+                events.append(event)
+
+        return events
+
+    def catch_up(self) -> int:
+        """
+        Parse the unread part of the file being read in worker processes,
+        if it is large enough to be worth it. See `catchup.catch_up`.
+        Returns the number of events generated.
+        """
+        return catch_up(self)
 
     def run(self) -> None:
         """Run the parser."""
+        # Work through a large backlog on all the cores first
+        self.catch_up()
+
         # While the parser can run, it will read
         # and parse the log files to generate events
         while self._running:
-            # Whether to wait for next line or not (when EOF is reached)
-            wait_for_nextline = False
+            # Stop reading while the events are not taken,
+            # the unread part of the log file holds them meanwhile
+            if len(self.events) >= self.queue_high:
+                self._throttle()
+                continue
+
+            # Check if we have reached the EOF of the log file
+            if not self.parse_lines():
+                # Wait for the log file to change, or for pending events to complete
+                self.watcher.wait(self._drain_timeout())
+
+        self.watcher.close()
+
+    def _throttle(self) -> None:
+        """
+        Wait until the events drop to the low watermark or the parser is stopped
+        """
+        self.throttled += 1
+        self._throttled_metric.inc()
+
+        while self._running and len(self.events) > self.queue_low:
+            self._resume.clear()
+
+            # Check again, the events may have been taken before clearing
+            if len(self.events) > self.queue_low:
+                self._resume.wait()
+
+    def _switch(self, path: str) -> None:
+        """
+        Continue reading from the start of the given file once the file being
+        read is done with. Must be called with `self.lock` held.
+        """
+        self._previous = self.snapshot_state()
+        self._open(path)
+
+    def _open(self, path: str, position: int = 0) -> None:
+        """
+        Close the file being read and continue reading from the given file
+        and byte offset. Must be called with `self.lock` held.
+        """
+        self.file.close()
+        self.file = open_log(path)
+        self.tail = LogTail(self.file, position)
+        self._current = path
+        self._pos = position
+        self._head = None
+        self._fingerprint = None
+
+    def _follow(self) -> list[str] | None:
+        """
+        Called at the EOF of the file being read. Switch to the next file
+        if the rotated log being read is done with, or if the log file has been
+        rotated or truncated. Returns the lines left at the end of the
+        previous file, or `None` if the parser should keep waiting.
+        """
+        if self._current != self.filepath:
+            lines = self.tail.read_remainder()
 
             with self.lock:
-                # Try to parse a line and catch any error
-                # and print it as ParseError
-                try:
-                    wait_for_nextline = not self.parse_line()
-                except Exception as exc:
-                    print(
-                        ParseError(
-                            msg="error while parsing line",
-                            line=self._line,
-                            position=self._pos,
-                            data=self._data,
-                            exc=exc
-                        ),
-                        file=sys.stderr
-                    )
-                finally:
-                    # Keep track of the number of lines parsed so far
-                    self._line += 1
+                self._switch(self._backlog.popleft() if self._backlog else self.filepath)
 
-            # Check if we have reached the EOF of the log file
-            if wait_for_nextline:
-                # The below sleep should allow any new content to appear
-                # and the main program to acquire `self.lock` to read `self.events`
-                time.sleep(1)
+            return lines
+
+        try:
+            stat = os.stat(self.filepath)
+        except FileNotFoundError:
+            # Rotated, but the new log file hasn't been created yet
+            return None
+
+        if (stat.st_dev, stat.st_ino) != self.tail.identity:
+            # Drain whatever was written to the rotated file before the
+            # logging daemon switched over to the new file
+            lines = []
+            while block := self.tail.read_lines():
+                lines.extend(block)
+            lines.extend(self.tail.read_remainder())
+
+            with self.lock:
+                self._switch(self.filepath)
+
+            self.watcher.rewatch()
+            return lines
+
+        # Truncated in place, for instance by `logrotate copytruncate`, and
+        # possibly written again past the position read before this check
+        if stat.st_size < self.tail.position or (
+            self._head is not None and not has_fingerprint(self.file, self._head)
+        ):
+            with self.lock:
+                self.tail.seek(0)
+                self._pos = 0
+                self._head = None
+                self._fingerprint = None
+
+            return []
+
+        # The head of the file is only fixed once it is fully written
+        if self._head is None or self._head[1] < FINGERPRINT_SIZE:
+            self._head = fingerprint(self.file)
+
+        return None
 
     def get_state(self):
         """
-        Return a `dict` of the state variables
+        Return a `dict` of the state variables, including the identity of
+        the file being read so that it can be found again after rotation
         """
+        with self.lock:
+            return self.snapshot_state()
+
+    def snapshot_state(self) -> dict:
+        """
+        Return the state variables like `get_state`, as of the last events
+        published. Must be called with `self.lock` held.
+        """
+        if self._previous is not None:
+            return self._previous
+
+        value = self._fingerprint
+
+        # Reading the head of a compressed log means decompressing it, it is
+        # only read again while the head of the log file is still written
+        if value is None:
+            value = fingerprint(self.file)
+
+            if value[1] >= FINGERPRINT_SIZE or self._current != self.filepath:
+                self._fingerprint = value
+
         return {
             "line": self._line,
             "position": self._pos,
+            "path": self._current,
+            "device": self.tail.identity[0],
+            "inode": self.tail.identity[1],
+            "fingerprint": value,
         }
 
     def set_state(self, state={}):
         """
-        Set the state variables of the parser: _line, _pos
+        Set the state variables of the parser: _line, _pos and the file
+        being read. If the file of the saved state has been rotated since,
+        continue reading from it (if `READ_ROTATED` is set) before reading
+        the newer logs. If it is gone or truncated, read the log from the start.
         """
         with self.lock:
             self._line = state.get("line", self._line)
-            self._pos = state.get("position", self._pos)
+            position = state.get("position", 0)
+
+            # Sessions saved by older agents don't identify the file
+            if "inode" not in state:
+                if position <= os.path.getsize(self.filepath):
+                    self.tail.seek(position)
+                    self._pos = position
+                return
+
+            identity = (state["device"], state["inode"])
+            value = state.get("fingerprint")
+
+            def is_saved_file(path: str, file_identity: tuple[int, int] | None) -> bool:
+                if path.endswith(".gz"):
+                    return value is not None and matches_fingerprint(path, value)
+
+                return file_identity == identity and (
+                    value is None or matches_fingerprint(path, value)
+                )
+
+            if is_saved_file(self.filepath, self.tail.identity):
+                if position <= os.path.getsize(self.filepath):
+                    self.tail.seek(position)
+                    self._pos = position
+                return
+
+            if not READ_ROTATED:
+                return
+
+            siblings = rotated_logs(self.filepath)
+
+            for index, sibling in enumerate(siblings):
+                stat = os.stat(sibling)
+
+                if is_saved_file(sibling, (stat.st_dev, stat.st_ino)):
+                    self._backlog = deque(siblings[index + 1:])
+                    self._open(sibling, position)
+                    return
 
     def stop(self):
         """
         Set the parser state to stopped
         """
         self._running = False
+        self._resume.set()
+        self.watcher.wakeup()
+
+    def finish(self) -> None:
+        """
+        Publish the events still pending once the parser has stopped, e.g.
+        audit events waiting for more records. Their lines are behind the
+        saved position, they wouldn't be parsed again after a restart.
+        """
+        try:
+            events = self._finish()
+        except Exception as exc:
+            report(ParseError(msg="error while completing events", exc=exc))
+            return
+
+        if not events:
+            return
+
+        self._events_metric.inc(len(events))
+
+        with self.lock:
+            self.events.extend(events)
+
+        if self.on_events is not None:
+            self.on_events(self)
+
+    def _drain(self) -> list[Event]:
+        """
+        Return the events completed from previously parsed lines, for parsers
+        which combine several lines into one event. Called after each block.
+        """
+        return []
+
+    def _finish(self) -> list[Event]:
+        """
+        Return the events still pending at the end of the input, for parsers
+        which combine several lines into one event
+        """
+        return self._drain()
+
+    def _align_chunk(self, fp: BinaryIO, offset: int) -> int:
+        """
+        Return the first offset at or after `offset` where the file can be
+        split for parsing in parallel, i.e. the start of a line
+        """
+        if offset == 0:
+            return 0
+
+        fp.seek(offset - 1)
+        fp.readline()
+        return fp.tell()
+
+    def _worker_args(self) -> tuple:
+        """
+        Arguments of the parser besides the file path, to create
+        it again in a catch-up worker process
+        """
+        return ()
+
+    def _drain_timeout(self) -> float | None:
+        """
+        Seconds after which `_drain` may return events even if no new lines
+        arrive, `None` if there is nothing pending.
+        """
+        return None
 
     @abstractmethod
     def _parse_event(self) -> Event:
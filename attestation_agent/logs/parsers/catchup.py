@@ -0,0 +1,171 @@
+"""
+Catch-up mode: parse a large unread part of a log file on all the cores.
+
+The unread byte range is split into chunks at line boundaries (and at event
+boundaries for parsers which combine lines, see `Parser._align_chunk`),
+the chunks are parsed in a process pool and their events are published in
+file order, advancing the parser position chunk by chunk. The live tailer
+then continues from the exact end of the last chunk.
+"""
+
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from attestation_agent.config import (CATCHUP_CHUNK_SIZE, CATCHUP_THRESHOLD,
+                                      CATCHUP_WORKERS)
+from attestation_agent.errors import ParseError, report
+
+# Parsers of a worker process, by parser class and log file
+_parsers: dict = {}
+
+
+def _parse_chunk(
+    parser_cls: type, args: tuple, path: str, start: int, end: int
+) -> tuple[list, int]:
+    """
+    Parse the lines between the byte offsets in a worker process, with a
+    parser created by `parser_cls(path, *args)`.
+    Returns the events and the number of lines parsed.
+    """
+    key = (parser_cls, args, path)
+    parser = _parsers.get(key)
+
+    if parser is None:
+        parser = _parsers[key] = parser_cls(path, *args)
+        parser.watcher.close()
+
+    with open(path, "rb") as fp:
+        fp.seek(start)
+        data = fp.read(end - start)
+
+    parser._pos = start
+    events = parser._parse_block(data.decode("utf-8", "replace").split("\n"))
+    events.extend(parser._finish())
+
+    return events, data.count(b"\n")
+
+
+def split_chunks(parser, path: str, start: int, end: int, chunk_size: int) -> list[tuple[int, int]]:
+    """
+    Split the byte range into chunks of about `chunk_size` bytes,
+    aligned with `parser._align_chunk`
+    """
+    bounds = [start]
+
+    with open(path, "rb") as fp:
+        offset = start + chunk_size
+
+        while offset < end:
+            offset = parser._align_chunk(fp, offset)
+
+            if offset >= end:
+                break
+
+            bounds.append(offset)
+            offset += chunk_size
+
+    bounds.append(end)
+    return list(zip(bounds, bounds[1:]))
+
+
+def _last_line_end(path: str, start: int, size: int) -> int:
+    """
+    Return the offset right after the last whole line of the file,
+    a line being written may not be complete yet
+    """
+    with open(path, "rb") as fp:
+        pos = size
+
+        while pos > start:
+            block = min(1 << 16, pos - start)
+            fp.seek(pos - block)
+            index = fp.read(block).rfind(b"\n")
+
+            if index >= 0:
+                return pos - block + index + 1
+
+            pos -= block
+
+    return start
+
+
+def catch_up(
+    parser,
+    workers: int = CATCHUP_WORKERS,
+    chunk_size: int = CATCHUP_CHUNK_SIZE,
+    threshold: int = CATCHUP_THRESHOLD,
+) -> int:
+    """
+    Parse the unread part of the file being read by the parser in a pool of
+    `workers` processes, if there are at least `threshold` bytes to read.
+    Returns the number of events published.
+
+    Events are published in file order along with the position after them,
+    so the state of the parser is consistent if it is stopped meanwhile.
+    """
+    path = parser._current
+    start = parser.tail.position
+
+    # Compressed rotated logs can't be read at random offsets
+    if workers < 2 or path.endswith(".gz"):
+        return 0
+
+    size = os.path.getsize(path)
+    if size - start < threshold:
+        return 0
+
+    end = _last_line_end(path, start, size)
+    chunks = deque(split_chunks(parser, path, start, end, chunk_size))
+    published = 0
+    args = parser._worker_args()
+
+    # Spawned workers don't inherit the locks held by the agent's threads
+    context = multiprocessing.get_context("spawn")
+
+    try:
+        with ProcessPoolExecutor(workers, mp_context=context) as pool:
+            # Keep a bounded number of chunks in flight, results are taken in order
+            pending = deque()
+
+            while parser._running and (chunks or pending):
+                while chunks and len(pending) < 2 * workers:
+                    chunk_start, chunk_end = chunks.popleft()
+                    future = pool.submit(
+                        _parse_chunk, type(parser), args, path, chunk_start, chunk_end
+                    )
+                    pending.append((chunk_end, future))
+
+                chunk_end, future = pending.popleft()
+                events, lines = future.result()
+
+                with parser.lock:
+                    parser.events.extend(events)
+                    parser._line += lines
+                    parser.tail.seek(chunk_end)
+                    parser._pos = chunk_end
+
+                published += len(events)
+
+                if events and parser.on_events is not None:
+                    parser.on_events(parser)
+
+                # Wait for the events to be taken, like the live tailer does
+                if len(parser.events) >= parser.queue_high:
+                    parser._throttle()
+
+            for _, future in pending:
+                future.cancel()
+    except Exception as exc:
+        # The live tailer continues from the last published chunk
+        report(
+            ParseError(
+                msg="error while catching up, continuing on a single core",
+                path=path,
+                position=parser.tail.position,
+                exc=exc
+            )
+        )
+
+    return published
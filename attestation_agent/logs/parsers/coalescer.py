@@ -0,0 +1,280 @@
+import re
+import time
+from collections import OrderedDict
+from typing import Iterable
+
+from attestation_agent.config import (COALESCE_KEYS, COALESCE_MAX_KEYS,
+                                      COALESCE_WINDOW)
+from attestation_agent.logs.events import Event
+from attestation_agent.metrics.agent import COALESCER_EVENTS
+
+# Addresses, masked in the templates and kept as the source of the events.
+# IPv6 addresses need at least 5 groups or a `::`, so that times don't match,
+# and are only looked for in texts with enough colons.
+_IPV4 = re.compile(r"\b\d{1,3}(?:\.\d{1,3}){3}\b")
+_IPV6 = re.compile(
+    r"(?<![\w:])(?:[0-9a-fA-F]{1,4}:){4,7}[0-9a-fA-F]{1,4}(?![\w:])"
+    r"|(?<![\w:])(?:[0-9a-fA-F]{1,4}(?::[0-9a-fA-F]{1,4})*)?::(?:[0-9a-fA-F]{1,4}(?::[0-9a-fA-F]{1,4})*)?(?![\w:])"
+)
+
+# Numbers (pids, ports, uids, serial numbers, ...), masked in the templates
+_NUMBER = re.compile(r"\b\d+\b")
+
+# Properties which vary with each occurrence of an event, left out of the
+# templates of the events without an action. The others, the identities
+# (`uid`, `auid`, `user_id`, `session`, ...) above all, tell distinct events apart.
+VARYING_PROPS = frozenset(("raw_content", "serial", "pid", "ppid"))
+
+
+def _addresses(text: str) -> list[re.Match]:
+    patterns = (_IPV4, _IPV6) if "::" in text or text.count(":") > 3 else (_IPV4,)
+    return [match for match in (pattern.search(text) for pattern in patterns) if match is not None]
+
+
+def first_address(text: str) -> str | None:
+    """
+    Return the first address in the text
+    """
+    if "::" not in text and text.count(":") <= 3:
+        match = _IPV4.search(text)
+        return match.group() if match is not None else None
+
+    matches = _addresses(text)
+    return min(matches, key=lambda match: match.start()).group() if matches else None
+
+
+def template(text: str) -> tuple[str, str | None]:
+    """
+    Return the text with its addresses and numbers masked, and the first
+    address in it
+    """
+    matches = _addresses(text)
+    source = min(matches, key=lambda match: match.start()).group() if matches else None
+
+    for match in matches:
+        text = match.re.sub("<addr>", text)
+
+    return _NUMBER.sub("#", text), source
+
+
+def props_template(props: dict) -> tuple[tuple, str | None]:
+    """
+    Return the properties of an event without an action (the ones varying
+    with each occurrence left out, see `VARYING_PROPS`) as a template, and
+    the first address among them
+    """
+    fields = []
+    source = None
+
+    for name, value in props.items():
+        if name in VARYING_PROPS:
+            continue
+
+        if isinstance(value, list):
+            value = tuple(value)
+        elif source is None and isinstance(value, str) and (
+            _IPV4.fullmatch(value) or (":" in value and _IPV6.fullmatch(value))
+        ):
+            source = value
+
+        fields.append((name, value))
+
+    return tuple(fields), source
+
+
+class _Window:
+    """
+    Repeats of an event within a coalescing window
+    """
+
+    __slots__ = ("first", "deadline", "count", "first_repeat", "last")
+
+    def __init__(self, first: int, deadline: float) -> None:
+        self.first: int = first
+        self.deadline: float = deadline
+        self.count: int = 0
+        self.first_repeat: int = None
+        self.last: Event = None
+
+    def summary(self) -> Event | None:
+        """
+        Return the event summarizing the repeats, `None` without any
+        """
+        if self.count == 0:
+            return None
+
+        # A single repeat is sent as is
+        event = self.last
+
+        if self.count > 1:
+            event.extras = {
+                **(event.extras or {}),
+                "count": self.count,
+                "first_timestamp": self.first_repeat,
+                "last_timestamp": event.timestamp,
+            }
+
+        return event
+
+
+class EventCoalescer:
+    """
+    Coalesces the repeats of an event: events with the same key within
+    `window` seconds of the first one. The key is made of the attributes
+    named in `keys`, and of:
+    - `template`: the action of the event with its addresses and numbers
+      masked, or its properties without the ones varying with each
+      occurrence (pid, serial number) if it has no action (audit events)
+    - `source`: the first address in the action, or among the properties
+
+    The first event of a key is passed through at once, the following ones
+    are held back and counted. When the window closes, their last one is
+    sent with their `count` and `first_timestamp` and `last_timestamp`.
+    Distinct events are never held back nor dropped, only repeats.
+
+    A window closes once an event of its key comes `window` seconds after
+    the first one (in the time of the logs, so that backlogs are coalesced
+    as well), after `window` seconds on the monotonic clock (see `expire`),
+    or when it is the oldest of `max_keys` open windows.
+    """
+
+    def __init__(
+        self,
+        window: float = COALESCE_WINDOW,
+        keys: Iterable[str] = COALESCE_KEYS,
+        max_keys: int = COALESCE_MAX_KEYS,
+    ) -> None:
+        self.window: float = window
+        self.keys: tuple[str, ...] = tuple(keys)
+        self.max_keys: int = max_keys
+
+        # Open windows by key, in the order they were opened
+        self._windows: OrderedDict[tuple, _Window] = OrderedDict()
+
+        # Counters
+        self.passed: int = 0
+        self.held: int = 0
+        self.summaries: int = 0
+
+        # Metrics of the coalescer, looked up once for the hot paths
+        self._passed_metric = COALESCER_EVENTS.labels(result="passed")
+        self._held_metric = COALESCER_EVENTS.labels(result="held")
+        self._summaries_metric = COALESCER_EVENTS.labels(result="summary")
+
+    def _key(self, event: Event) -> tuple:
+        if "template" in self.keys or "source" in self.keys:
+            if event.action:
+                masked, source = template(event.action)
+            else:
+                masked, source = props_template(event.props())
+
+        key = []
+        for name in self.keys:
+            if name == "template":
+                key.append(masked)
+            elif name == "source":
+                key.append(source)
+            else:
+                key.append(getattr(event, name, None))
+
+        return tuple(key)
+
+    def add(self, events: Iterable[Event]) -> list[Event]:
+        """
+        Coalesce the events, and return the events to send now
+        """
+        coalesced = []
+        now = time.monotonic()
+
+        for event in events:
+            # Events without a time can't be windowed
+            if event.timestamp is None:
+                coalesced.append(event)
+                self.passed += 1
+                self._passed_metric.inc()
+                continue
+
+            key = self._key(event)
+            window = self._windows.get(key)
+
+            if window is not None:
+                if event.timestamp - window.first < self.window:
+                    if window.count == 0:
+                        window.first_repeat = event.timestamp
+
+                    window.count += 1
+                    window.last = event
+                    self.held += 1
+                    self._held_metric.inc()
+                    continue
+
+                self._close(key, coalesced)
+
+            self._windows[key] = _Window(event.timestamp, now + self.window)
+            coalesced.append(event)
+            self.passed += 1
+            self._passed_metric.inc()
+
+            if len(self._windows) > self.max_keys:
+                self._close(next(iter(self._windows)), coalesced)
+
+        return coalesced
+
+    def expire(self, now: float = None) -> list[Event]:
+        """
+        Close the windows opened `window` seconds ago, and return the
+        events summarizing their repeats
+        """
+        now = time.monotonic() if now is None else now
+        coalesced = []
+
+        # Windows are opened in order of their deadline
+        while self._windows:
+            key, window = next(iter(self._windows.items()))
+
+            if window.deadline > now:
+                break
+
+            self._close(key, coalesced)
+
+        return coalesced
+
+    def flush(self) -> list[Event]:
+        """
+        Close all the windows, and return the events summarizing their repeats
+        """
+        coalesced = []
+
+        while self._windows:
+            self._close(next(iter(self._windows)), coalesced)
+
+        return coalesced
+
+    def timeout(self) -> float | None:
+        """
+        Return the time until the next window closes, `None` without any
+        """
+        if not self._windows:
+            return None
+
+        window = next(iter(self._windows.values()))
+        return max(0.0, window.deadline - time.monotonic())
+
+    def _close(self, key: tuple, coalesced: list[Event]) -> None:
+        event = self._windows.pop(key).summary()
+
+        if event is not None:
+            coalesced.append(event)
+            self.summaries += 1
+            self._summaries_metric.inc()
+
+    def as_dict(self) -> dict:
+        """
+        Return the counters of the coalescer
+        """
+        return {
+            "passed": self.passed,
+            "held": self.held,
+            "summaries": self.summaries,
+            "windows": len(self._windows),
+        }
@@ -0,0 +1,130 @@
+import time
+from collections import OrderedDict
+
+from attestation_agent.config import (CORRELATION_MAX_GROUPS,
+                                      CORRELATION_MAX_RECORDS,
+                                      CORRELATION_WINDOW)
+
+# Record types which end a multi-record event. auditd doesn't write `EOE`
+# records to the log, but `PROCTITLE` is the last record of syscall events.
+FINAL_TYPES = frozenset(("EOE", "PROCTITLE"))
+
+
+class RecordGroup:
+    """
+    Records sharing an `audit(<time>:<serial>)` id, i.e. one logical event.
+
+    Attributes:
+    - `serial`: `int`
+    - `timestamp`: `float`, audit time of the event
+    - `started`: `float`, monotonic time when the first record was seen
+    - `records`: `list[tuple[str, dict[str, str], str]]`, type, raw fields and line
+    - `dropped`: `int`, records not kept as the group was full
+    """
+
+    __slots__ = ("serial", "timestamp", "started", "records", "dropped")
+
+    def __init__(self, serial: int, timestamp: float) -> None:
+        self.serial: int = serial
+        self.timestamp: float = timestamp
+        self.started: float = time.monotonic()
+        self.records: list[tuple[str, dict[str, str], str]] = []
+        self.dropped: int = 0
+
+
+class AuditCorrelator:
+    """
+    Groups audit records by serial number, so that the records of one event
+    (`SYSCALL`, `EXECVE`, `CWD`, `PATH`, `PROCTITLE`, ...) can be merged.
+
+    A group is complete when its final record arrives, when a record more
+    than `window` seconds newer (in audit time) is seen, when it has been
+    open for `window` seconds (in wall time, while the log is idle) or when
+    it is the oldest of more than `max_groups` open groups.
+    """
+
+    def __init__(
+        self,
+        window: float = CORRELATION_WINDOW,
+        max_groups: int = CORRELATION_MAX_GROUPS,
+        max_records: int = CORRELATION_MAX_RECORDS,
+    ) -> None:
+        self.window: float = window
+        self.max_groups: int = max_groups
+        self.max_records: int = max_records
+
+        # Open groups by serial, from the oldest to the newest
+        self.groups: OrderedDict[int, RecordGroup] = OrderedDict()
+
+        # Completed groups waiting to be taken by `pop_complete`
+        self.complete: list[RecordGroup] = []
+
+    def add(
+        self, serial: int, timestamp: float, record_type: str,
+        fields: dict[str, str], record: str
+    ) -> None:
+        """
+        Add a record to the group of its serial number
+        """
+        group = self.groups.get(serial)
+
+        if group is None:
+            group = self.groups[serial] = RecordGroup(serial, timestamp)
+
+        if len(group.records) < self.max_records:
+            group.records.append((record_type, fields, record))
+        else:
+            group.dropped += 1
+
+        if record_type in FINAL_TYPES:
+            self.complete.append(self.groups.pop(serial))
+
+        # Complete the groups left behind by the newer records
+        while self.groups:
+            oldest = next(iter(self.groups.values()))
+
+            if (
+                len(self.groups) <= self.max_groups
+                and timestamp - oldest.timestamp <= self.window
+            ):
+                break
+
+            self.complete.append(self.groups.pop(oldest.serial))
+
+    def expire(self) -> None:
+        """
+        Complete the groups which have been open for longer than the window
+        """
+        deadline = time.monotonic() - self.window
+
+        while self.groups:
+            oldest = next(iter(self.groups.values()))
+
+            if oldest.started > deadline:
+                break
+
+            self.complete.append(self.groups.pop(oldest.serial))
+
+    def complete_all(self) -> None:
+        """
+        Complete all the open groups, at the end of the input
+        """
+        self.complete.extend(self.groups.values())
+        self.groups.clear()
+
+    def timeout(self) -> float | None:
+        """
+        Seconds until the oldest open group expires, `None` if there are none
+        """
+        if not self.groups:
+            return None
+
+        oldest = next(iter(self.groups.values()))
+        return max(0.0, oldest.started + self.window - time.monotonic())
+
+    def pop_complete(self) -> list[RecordGroup]:
+        """
+        Return the completed groups and clear the list
+        """
+        complete, self.complete = self.complete, []
+        return complete
@@ -0,0 +1,333 @@
+"""
+Rule based parsers, configured from a JSON file instead of a `Parser`
+subclass per log source. See `attestation_agent/rules.json`.
+
+A rule file lists sources, each one a log file with its rule set:
+
+    {
+        "sources": [
+            {
+                "name": "sudo",
+                "path": "/var/log/sudo.log",
+                "type": "SUDO",
+                "timestamp": "syslog",
+                "prefix": "(?P<timestamp>\\w{3} +\\d+ [\\d:]{8}) : (?P<user>\\S+) : ",
+                "rules": [
+                    {
+                        "type": "SUDO_COMMAND",
+                        "pattern": "TTY=(?P<terminal>\\S+) ; .*COMMAND=(?P<command>.*)"
+                    }
+                ]
+            }
+        ]
+    }
+
+The optional `prefix` of a source is matched at the start of each line,
+then the `pattern` of its rules: the first rule which matches generates the
+event. The named groups of the prefix and of the rule are the attributes of
+the event, converted as given in the `fields` of the source and of the rule
+(`str`, `int`, `float`, or `auto` for integers made of digits only; `str`
+for the groups not listed). Groups which don't take part in the match are
+left out, unless they have a value in the `defaults` of the source or of the
+rule. Some groups have a meaning of their own:
+- `timestamp`, converted according to the `timestamp` format of the source:
+  `syslog`, `rfc3339`, `clf` or `epoch`
+- `action`, the action of the event
+- `type`, the type of the event, in place of the `type` of the rule
+Lines matched by no rule are skipped, like the record types `AuditParser`
+doesn't generate events for. Sources with `"enabled": false` are not read.
+
+The prefix and the patterns of a source are compiled into a single regex,
+the rules being alternatives, so a line is matched once whatever the number
+of rules. Patterns must use named backreferences (`(?P=name)`), numbered
+ones would refer to the wrong group.
+"""
+
+import json
+import os
+import re
+from typing import Callable
+
+from attestation_agent.errors import ParseError, report
+
+from .base import Event, Parser
+from .timestamps import SyslogClock
+
+
+def _auto(value: str) -> str | int:
+    return int(value) if value.isdigit() else value
+
+
+# Conversions of the `fields` of a rule, `auto` converts digits only
+CONVERTERS = {"str": None, "int": int, "float": float, "auto": _auto}
+
+# Formats of the `timestamp` group of a source
+TIMESTAMP_FORMATS = ("syslog", "rfc3339", "clf", "epoch")
+
+# Groups which are not attributes of the event
+SPECIAL_GROUPS = frozenset(("timestamp", "action", "type"))
+
+# Marks the converted attributes without a default
+_NO_DEFAULT = object()
+
+_group_re = re.compile(r"\(\?P<(\w+)>")
+_backref_re = re.compile(r"\(\?P=(\w+)\)")
+
+
+class RuleEvent(Event):
+    """
+    Event generated by a rule of a `RuleSet`. Its type and log file are
+    given by the rule, the attributes are kept in `extras`.
+
+    Attributes:
+    - `type`: `str`
+    - `log_file`: `str`
+    """
+
+    __slots__ = ("type", "log_file")
+
+    def __init__(self, type: str = None, log_file: str = None, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.type = type
+        self.log_file = log_file
+
+
+# Creates a `RuleEvent` without running its constructor, see `RuleSet.parse`
+_new_event = RuleEvent.__new__
+
+
+class _Rule:
+    """
+    A rule compiled for `RuleSet.parse`: the renamed groups of the prefix
+    and of the rule, sorted by the way their value is used
+    """
+
+    __slots__ = (
+        "type", "timestamp", "action", "type_group",
+        "plain_groups", "plain_attrs", "converted", "defaults", "constants",
+    )
+
+    def __init__(
+        self, type: str, groups: list[tuple[str, str]],
+        converters: dict[str, Callable | None], defaults: dict
+    ) -> None:
+        self.type: str = type
+
+        # Groups with a meaning of their own
+        special = {attr: group for group, attr in groups if attr in SPECIAL_GROUPS}
+        self.timestamp: str | None = special.get("timestamp")
+        self.action: str | None = special.get("action")
+        self.type_group: str | None = special.get("type")
+
+        # Attributes kept as strings, and the converted ones with their default
+        plain = [
+            (group, attr) for group, attr in groups
+            if attr not in SPECIAL_GROUPS and converters.get(attr) is None
+        ]
+        # Without any, the whole match is fetched in their place and left unused
+        self.plain_groups: tuple[str, ...] = tuple(group for group, _ in plain) or (0,)
+        self.plain_attrs: tuple[str, ...] = tuple(attr for _, attr in plain)
+        self.converted: tuple[tuple[str, str, Callable, object], ...] = tuple(
+            (group, attr, converters[attr], defaults.get(attr, _NO_DEFAULT))
+            for group, attr in groups
+            if attr not in SPECIAL_GROUPS and converters.get(attr) is not None
+        )
+
+        # Defaults of the plain attributes, only looked up when a group
+        # doesn't take part in the match, and of the attributes without a group
+        self.defaults: dict = {attr: defaults[attr] for attr in self.plain_attrs if attr in defaults}
+        grouped = {attr for _, attr in groups}
+        self.constants: dict = {
+            attr: value for attr, value in defaults.items() if attr not in grouped
+        }
+
+
+class RuleSet:
+    """
+    Rules of a log source, compiled from their definition in a rule file
+    """
+
+    def __init__(self, spec: dict) -> None:
+        self.spec: dict = spec
+
+        self.name: str = spec["name"]
+        self.path: str = spec["path"]
+        self.type: str = spec.get("type", self.name.upper())
+        self.enabled: bool = spec.get("enabled", True)
+
+        # Compiled rules, by rule index
+        self._rules: list[_Rule] = []
+
+        self.timestamp_format: str = spec.get("timestamp", "syslog")
+        if self.timestamp_format not in TIMESTAMP_FORMATS:
+            raise ParseError(
+                msg=f"unknown timestamp format '{self.timestamp_format}'", source=self.name
+            )
+
+        # Converts the timestamps, caching the epoch of each day
+        self.clock: SyslogClock = SyslogClock()
+
+        # The prefix is shared by all the rules and matched once per line
+        prefix = spec.get("prefix", "")
+        source_fields = spec.get("fields", {})
+        prefix_groups = self._groups(prefix, "p_", "prefix")
+        alternatives = []
+
+        for index, rule in enumerate(spec["rules"]):
+            groups = prefix_groups + self._groups(rule["pattern"], f"r{index}_", index)
+            fields = {**source_fields, **rule.get("fields", {})}
+
+            unknown = set(fields.values()) - CONVERTERS.keys()
+            if unknown:
+                raise ParseError(
+                    msg=f"unknown field conversions {sorted(unknown)}", source=self.name, rule=index
+                )
+
+            self._rules.append(_Rule(
+                rule.get("type", self.type),
+                groups,
+                {key: CONVERTERS[value] for key, value in fields.items()},
+                {**spec.get("defaults", {}), **rule.get("defaults", {})},
+            ))
+            alternatives.append(f"(?P<r{index}>{self._rename(rule['pattern'], f'r{index}_')})")
+
+        self._regex: re.Pattern = re.compile(
+            f"{self._rename(prefix, 'p_')}(?:{'|'.join(alternatives)})"
+        )
+
+        self._timestamp: Callable[[str], int] = {
+            "syslog": self.clock.syslog,
+            "rfc3339": self.clock.rfc3339,
+            "clf": self.clock.clf,
+            "epoch": lambda value: int(float(value)),
+        }[self.timestamp_format]
+
+    def _groups(self, pattern: str, prefix: str, rule: int | str) -> list[tuple[str, str]]:
+        """
+        Return the groups of a pattern, as `(renamed group, attribute)` pairs
+        """
+        try:
+            return [(prefix + group, group) for group in re.compile(pattern).groupindex]
+        except re.error as exc:
+            raise ParseError(msg="invalid rule pattern", source=self.name, rule=rule, exc=exc)
+
+    @staticmethod
+    def _rename(pattern: str, prefix: str) -> str:
+        # The rules share a single pattern, their groups need distinct names
+        pattern = _group_re.sub(rf"(?P<{prefix}\1>", pattern)
+        return _backref_re.sub(rf"(?P={prefix}\1)", pattern)
+
+    def parse(self, line: str) -> RuleEvent | None:
+        """
+        Return the event generated by the first rule which matches the line,
+        `None` if no rule matches
+        """
+        match = self._regex.match(line)
+
+        if match is None:
+            return None
+
+        # The group around the rule is the last one to close
+        rule = self._rules[int(match.lastgroup[1:])]
+
+        # Copy the plain string attributes in one go, and drop the unmatched ones
+        values = match.group(*rule.plain_groups)
+        if len(rule.plain_groups) == 1:
+            values = (values,)
+
+        extras = dict(zip(rule.plain_attrs, values))
+        if None in values:
+            defaults = rule.defaults
+            extras = {
+                attr: defaults[attr] if value is None else value
+                for attr, value in extras.items() if value is not None or attr in defaults
+            }
+
+        for group, attr, convert, default in rule.converted:
+            value = match.group(group)
+            if value is not None:
+                extras[attr] = convert(value)
+            elif default is not _NO_DEFAULT:
+                extras[attr] = default
+
+        if rule.constants:
+            extras.update(rule.constants)
+
+        timestamp = None
+        if rule.timestamp is not None and (value := match.group(rule.timestamp)) is not None:
+            timestamp = self._timestamp(value)
+
+        # Fill in the slots directly, passing the attributes as keyword
+        # arguments through the constructors costs more than the match
+        event = _new_event(RuleEvent)
+        event.type = rule.type if rule.type_group is None else match.group(rule.type_group) or rule.type
+        event.log_file = self.path
+        event.timestamp = timestamp
+        event.action = None if rule.action is None else match.group(rule.action)
+        event.raw_content = line
+        event.extras = extras or None
+        return event
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, RuleSet) and self.spec == other.spec
+
+    def __hash__(self) -> int:
+        return hash((self.name, self.path))
+
+    def __reduce__(self):
+        # Recompiled from the definition, e.g. in the catch-up workers
+        return (RuleSet, (self.spec,))
+
+
+class RuleParser(Parser):
+    """Parser for a log source described by a `RuleSet`"""
+
+    def __init__(self, filepath: str, rules: RuleSet) -> None:
+        super().__init__(filepath)
+        self.rules: RuleSet = rules
+
+    def _parse_event(self) -> Event | None:
+        return self.rules.parse(self._data)
+
+    def _worker_args(self) -> tuple:
+        return (self.rules,)
+
+
+def load_rules(filepath: str) -> list[RuleSet]:
+    """
+    Load the rule sets of a rule file
+    """
+    with open(filepath) as fp:
+        data = json.load(fp)
+
+    return [RuleSet(spec) for spec in data.get("sources", ())]
+
+
+def load_rule_parsers(filepath: str) -> list[RuleParser]:
+    """
+    Create a parser for each enabled source of a rule file. Sources whose
+    log file doesn't exist on this machine are skipped.
+    """
+    try:
+        rule_sets = load_rules(filepath)
+    except FileNotFoundError:
+        return []
+    except (OSError, ValueError, KeyError, ParseError) as exc:
+        report(ParseError(msg="error while loading rule file", path=filepath, exc=exc))
+        return []
+
+    parsers = []
+
+    for rules in rule_sets:
+        if not rules.enabled:
+            continue
+
+        if not os.path.isfile(rules.path):
+            report(
+                ParseError(msg="log file not found, skipping the source", source=rules.name, path=rules.path)
+            )
+            continue
+
+        parsers.append(RuleParser(rules.path, rules))
+
+    return parsers
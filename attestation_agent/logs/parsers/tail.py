@@ -0,0 +1,180 @@
+import glob
+import gzip
+import io
+import os
+import re
+import zlib
+from typing import BinaryIO
+
+from attestation_agent.config import FINGERPRINT_SIZE, TAIL_CHUNK_SIZE
+
+
+def open_log(path: str) -> BinaryIO:
+    """
+    Open a log file for reading, rotated logs compressed with gzip
+    are decompressed on the fly
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+
+    return open(path, "rb")
+
+
+def fingerprint(file: BinaryIO) -> list[int]:
+    """
+    Return the CRC32 and the length of the first `FINGERPRINT_SIZE` bytes
+    of an open log file. It identifies a log file across renames and
+    compression, where its device and inode numbers can't be relied upon.
+    """
+    if isinstance(file, gzip.GzipFile):
+        with gzip.open(file.name, "rb") as fp:
+            head = fp.read(FINGERPRINT_SIZE)
+    else:
+        head = os.pread(file.fileno(), FINGERPRINT_SIZE, 0)
+
+    return [zlib.crc32(head), len(head)]
+
+
+def matches_fingerprint(path: str, value: list[int]) -> bool:
+    """
+    Check whether the log file at the given path has the given fingerprint
+    """
+    crc, length = value
+
+    try:
+        with open_log(path) as fp:
+            return zlib.crc32(fp.read(length)) == crc
+    except (OSError, EOFError, zlib.error):
+        return False
+
+
+def has_fingerprint(file: BinaryIO, value: list[int]) -> bool:
+    """
+    Check whether the head of an open (uncompressed) log file still has the
+    given fingerprint, taken when the file may have been shorter
+    """
+    crc, length = value
+    return zlib.crc32(os.pread(file.fileno(), length, 0)) == crc
+
+
+# Suffix of logs rotated with numbers, `auth.log.1` or `auth.log.2.gz`
+_rotation_number_re = re.compile(r"\.(?P<number>\d+)(\.gz)?$")
+
+
+def rotated_logs(path: str) -> list[str]:
+    """
+    Return the rotated siblings of a log file, for instance `auth.log.1`,
+    `auth.log.2.gz` or `auth.log-20231018`, from the oldest to the newest
+    """
+    def age(sibling: str) -> tuple[int, str]:
+        # Higher numbers are older, dates sort from the oldest
+        match = _rotation_number_re.fullmatch(sibling[len(path):])
+        if match is not None:
+            return (-int(match.group("number")), "")
+        return (0, sibling)
+
+    siblings = [
+        sibling for sibling in glob.glob(glob.escape(path) + "[.-]*")
+        if os.path.isfile(sibling)
+    ]
+    return sorted(siblings, key=age)
+
+
+class LogTail:
+    """
+    Reads a log file in large blocks, starting at a byte offset, and splits
+    the blocks into whole lines.
+
+    Blocks are read straight into a reusable buffer. A partial line at the
+    end of a block stays at the front of the buffer and is completed by the
+    next read, so `position` always points right after the last whole line.
+    """
+
+    def __init__(
+        self, file: BinaryIO, position: int = 0, chunk_size: int = TAIL_CHUNK_SIZE
+    ) -> None:
+        self.file: BinaryIO = file
+        self.chunk_size: int = chunk_size
+
+        # Device and inode numbers of the file being read
+        stat = os.fstat(file.fileno())
+        self.identity: tuple[int, int] = (stat.st_dev, stat.st_ino)
+
+        # Plain files are read at an offset, compressed ones sequentially
+        self._positional: bool = isinstance(file, io.BufferedReader) and hasattr(os, "preadv")
+
+        # Byte offset right after the last line returned by `read_lines`
+        self.position: int = position
+
+        # Read buffer, its first `self._partial` bytes hold an incomplete line
+        self._buffer: bytearray = bytearray(chunk_size)
+        self._partial: int = 0
+
+    def seek(self, position: int) -> None:
+        """
+        Continue reading from the given byte offset, dropping any partial line
+        """
+        self.position = position
+        self._partial = 0
+
+    def read_lines(self) -> list[str]:
+        """
+        Read the next block of whole lines from the log file.
+        Returns an empty list if no complete line is available yet.
+        """
+        while True:
+            # Grow the buffer if a single line doesn't fit in it
+            if self._partial == len(self._buffer):
+                self._buffer.extend(bytes(len(self._buffer)))
+
+            with memoryview(self._buffer) as view:
+                count = self._read_into(
+                    view[self._partial:], self.position + self._partial
+                )
+
+                if count == 0:
+                    return []
+
+                size = self._partial + count
+                end = self._buffer.rfind(b"\n", 0, size) + 1
+
+                # Decode the whole lines at once, the trailing newline
+                # is left out so that splitting doesn't add an empty line
+                if end > 0:
+                    lines = str(view[:end - 1], "utf-8", "replace").split("\n")
+
+            if end == 0:
+                # No line has been completed yet, keep reading
+                self._partial = size
+                continue
+
+            # Carry the incomplete line over to the front of the buffer
+            self._buffer[:size - end] = self._buffer[end:size]
+            self._partial = size - end
+            self.position += end
+
+            return lines
+
+    def read_remainder(self) -> list[str]:
+        """
+        Return the incomplete line left at the end of the file, if any.
+        Used when the file has been rotated and will never be completed.
+        """
+        if self._partial == 0:
+            return []
+
+        line = self._buffer[:self._partial].decode("utf-8", "replace")
+        self.position += self._partial
+        self._partial = 0
+        return [line]
+
+    def _read_into(self, view: memoryview, offset: int) -> int:
+        """
+        Read bytes from the given file offset into the view,
+        returns the number of bytes read.
+        """
+        if self._positional:
+            return os.preadv(self.file.fileno(), [view], offset)
+
+        self.file.seek(offset)
+        return self.file.readinto(view)
@@ -0,0 +1,178 @@
+import calendar
+import time
+
+# Month abbreviations of syslog timestamps, not taken from the locale
+MONTHS = {
+    name: number for number, name in enumerate(
+        ("Jan", "Feb", "Mar", "Apr", "May", "Jun",
+         "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"),
+        start=1,
+    )
+}
+
+# Timestamps further than this in the future (in seconds) are taken to be
+# from the previous year, e.g. `Dec 31` lines read on the 1st of January
+FUTURE_SLACK = 86400
+
+# Number of days kept in the caches
+CACHE_DAYS = 1024
+
+
+class SyslogClock:
+    """
+    Converts syslog timestamps to epoch seconds.
+
+    The epoch of local midnight is looked up once per day, with the local
+    timezone rules, and cached by `(year, month, day)`. The time of day is
+    then added with plain arithmetic. Days with a DST transition are not
+    86400 seconds long and are converted in full instead.
+
+    Traditional timestamps (`Oct 18 10:15:01`) have no year: the current
+    year is assumed, or the previous one if the timestamp would otherwise
+    be in the future. RFC 3339 timestamps (`2023-10-18T10:15:01.123456+02:00`)
+    and Common Log Format ones carry their year and UTC offset, the fraction
+    of a second is dropped.
+    """
+
+    def __init__(self) -> None:
+        # Epoch of local midnight and length of the day, by (year, month, day)
+        self._local_days: dict[tuple[int, int, int], tuple[int, int]] = {}
+
+        # Epoch of UTC midnight, by (year, month, day)
+        self._utc_days: dict[tuple[int, int, int], int] = {}
+
+        # Current local year, and the epoch at which it ends
+        self._year: int = 0
+        self._year_end: float = 0.0
+
+    def local(self, month: str, day: str, time_of_day: str) -> int:
+        """
+        Convert a traditional syslog timestamp, in local time, to epoch seconds
+        """
+        hour, minute, second = time_of_day.split(":")
+        hour, minute, second = int(hour), int(minute), int(second)
+        month, day = MONTHS[month], int(day)
+
+        now = time.time()
+        if now >= self._year_end:
+            self._update_year(now)
+
+        timestamp = self._local_time(self._year, month, day, hour, minute, second)
+
+        # December lines read in January belong to the previous year
+        if timestamp > now + FUTURE_SLACK:
+            timestamp = self._local_time(self._year - 1, month, day, hour, minute, second)
+
+        return timestamp
+
+    def syslog(self, value: str) -> int:
+        """
+        Convert a whole traditional syslog timestamp, `Oct 18 10:15:01`
+        or `Oct  8 10:15:01`, see `local`
+        """
+        if len(value) != 15:
+            return self.local(*value.split())
+
+        now = time.time()
+        if now >= self._year_end:
+            self._update_year(now)
+
+        # The fields are at fixed positions, the day is padded with a space
+        month, day = MONTHS[value[:3]], int(value[4:6])
+        hour, minute, second = int(value[7:9]), int(value[10:12]), int(value[13:15])
+
+        timestamp = self._local_time(self._year, month, day, hour, minute, second)
+
+        if timestamp > now + FUTURE_SLACK:
+            timestamp = self._local_time(self._year - 1, month, day, hour, minute, second)
+
+        return timestamp
+
+    def rfc3339(self, value: str) -> int:
+        """
+        Convert an RFC 3339 timestamp to epoch seconds. Timestamps without
+        a UTC offset are taken to be in local time.
+        """
+        date, _, clock = value.partition("T")
+        year, month, day = date.split("-")
+        hour, minute, second = clock[:8].split(":")
+        year, month, day = int(year), int(month), int(day)
+        hour, minute, second = int(hour), int(minute), int(second)
+
+        # Skip the fraction of a second, if any
+        zone = clock[8:]
+        if zone[:1] == ".":
+            index = 1
+            while index < len(zone) and zone[index].isdigit():
+                index += 1
+            zone = zone[index:]
+
+        if not zone:
+            return self._local_time(year, month, day, hour, minute, second)
+
+        return self._utc_time(year, month, day, hour, minute, second, _utc_offset(zone))
+
+    def clf(self, value: str) -> int:
+        """
+        Convert a Common Log Format timestamp, as written by web servers
+        (`18/Oct/2023:10:15:01 +0200`), to epoch seconds
+        """
+        date, _, zone = value.partition(" ")
+        day, month, rest = date.split("/")
+        year, hour, minute, second = rest.split(":")
+
+        return self._utc_time(
+            int(year), MONTHS[month], int(day),
+            int(hour), int(minute), int(second), _utc_offset(zone)
+        )
+
+    def _utc_time(
+        self, year: int, month: int, day: int, hour: int, minute: int, second: int,
+        offset: int
+    ) -> int:
+        key = (year, month, day)
+        midnight = self._utc_days.get(key)
+
+        if midnight is None:
+            if len(self._utc_days) >= CACHE_DAYS:
+                self._utc_days.clear()
+            midnight = self._utc_days[key] = calendar.timegm((year, month, day, 0, 0, 0))
+
+        return midnight + hour * 3600 + minute * 60 + second - offset
+
+    def _local_time(
+        self, year: int, month: int, day: int, hour: int, minute: int, second: int
+    ) -> int:
+        key = (year, month, day)
+        cached = self._local_days.get(key)
+
+        if cached is None:
+            if len(self._local_days) >= CACHE_DAYS:
+                self._local_days.clear()
+
+            midnight = int(time.mktime((year, month, day, 0, 0, 0, 0, 0, -1)))
+            next_midnight = int(time.mktime((year, month, day + 1, 0, 0, 0, 0, 0, -1)))
+            cached = self._local_days[key] = (midnight, next_midnight - midnight)
+
+        midnight, length = cached
+
+        if length != 86400:
+            return int(time.mktime((year, month, day, hour, minute, second, 0, 0, -1)))
+
+        return midnight + hour * 3600 + minute * 60 + second
+
+    def _update_year(self, now: float) -> None:
+        self._year = time.localtime(now).tm_year
+        self._year_end = time.mktime((self._year + 1, 1, 1, 0, 0, 0, 0, 0, -1))
+
+
+def _utc_offset(zone: str) -> int:
+    """
+    Return the offset in seconds of a `Z`, `+02:00` or `+0200` UTC offset
+    """
+    if zone in ("Z", "z"):
+        return 0
+
+    digits = zone[1:].replace(":", "")
+    offset = int(digits[:2]) * 3600 + int(digits[2:4]) * 60
+    return -offset if zone[0] == "-" else offset
@@ -0,0 +1,249 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from threading import Event as ThreadEvent
+
+from attestation_agent.config import POLL_INTERVAL, WATCH_BACKEND, WATCH_TIMEOUT
+from attestation_agent.errors import AttestationError, report
+
+# Flags from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+
+# Changes of the watched file which may produce new lines to be read
+IN_FILE_EVENTS = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_DELETE_SELF | IN_MOVE_SELF
+
+# Changes of the parent directory which may bring a new log file after rotation
+IN_DIR_EVENTS = IN_CREATE | IN_MOVED_TO
+
+# Header of `struct inotify_event`: wd, mask, cookie and the length of the name
+_EVENT = struct.Struct("iIII")
+
+
+class FileWatcher:
+    """
+    Waits for a log file to change by sleeping for a fixed interval.
+    Used as a fallback when no event driven backend is available.
+    """
+
+    def __init__(self, filepath: str, interval: float = POLL_INTERVAL) -> None:
+        self.filepath: str = filepath
+        self.interval: float = interval
+
+        # Set to interrupt a waiting thread
+        self._wakeup: ThreadEvent = ThreadEvent()
+
+    def wait(self, timeout: float | None = None) -> None:
+        """
+        Block until the file may have changed, or for at most `timeout` seconds
+        """
+        self._wakeup.wait(self.interval if timeout is None else min(timeout, self.interval))
+
+    def wakeup(self) -> None:
+        """
+        Interrupt the thread waiting on the watcher, for instance when stopping
+        """
+        self._wakeup.set()
+
+    def fileno(self) -> int | None:
+        """
+        File descriptor which becomes readable when the file changes, to wait
+        on it from an event loop instead of `wait`. `None` if there is none.
+        """
+        return None
+
+    def clear(self) -> bool:
+        """
+        Discard the pending notifications, after waiting on `fileno`.
+        Returns whether the file may have changed or a wakeup was pending.
+        """
+        return False
+
+    def rewatch(self) -> None:
+        """
+        Watch the file now found at the path, after the log has been rotated
+        """
+
+    def close(self) -> None:
+        """
+        Release the resources held by the watcher
+        """
+
+
+class InotifyWatcher(FileWatcher):
+    """
+    Waits for a log file to change using Linux inotify, so that a parser
+    wakes up as soon as the file grows and sleeps in the kernel otherwise.
+    """
+
+    _libc = None
+
+    def __init__(self, filepath: str, timeout: float | None = WATCH_TIMEOUT) -> None:
+        super().__init__(filepath, timeout)
+
+        libc = self._load_libc()
+
+        self._fd: int = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        try:
+            # Watch the directory as well, to notice a new log file after rotation
+            self._dir_wd: int = self._add_watch(os.path.dirname(filepath) or ".", IN_DIR_EVENTS)
+            self._wd: int = self._add_watch(filepath, IN_FILE_EVENTS)
+        except OSError:
+            os.close(self._fd)
+            raise
+
+        # Only the events of the directory about the log file are of interest
+        self._name: bytes = os.fsencode(os.path.basename(filepath))
+
+        # Pipe used to interrupt a thread blocked in `poll`, drained by `clear`
+        self._pipe_r, self._pipe_w = os.pipe2(os.O_NONBLOCK | os.O_CLOEXEC)
+
+        self._poll = select.poll()
+        self._poll.register(self._fd, select.POLLIN)
+        self._poll.register(self._pipe_r, select.POLLIN)
+
+    @classmethod
+    def _load_libc(cls) -> ctypes.CDLL:
+        if cls._libc is None:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+
+            # Raises AttributeError if inotify is not available
+            libc.inotify_init1.argtypes = (ctypes.c_int,)
+            libc.inotify_add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+            libc.inotify_rm_watch.argtypes = (ctypes.c_int, ctypes.c_int)
+            cls._libc = libc
+
+        return cls._libc
+
+    def _add_watch(self, path: str, mask: int) -> int:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for '{path}'")
+        return wd
+
+    def wait(self, timeout: float | None = None) -> None:
+        if self.interval is not None:
+            timeout = self.interval if timeout is None else min(timeout, self.interval)
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        # Keep waiting through the changes of other files in the directory
+        while True:
+            if deadline is not None:
+                timeout = max(0.0, deadline - time.monotonic())
+
+            if not self._poll.poll(None if timeout is None else int(timeout * 1000)) or self.clear():
+                return
+
+    def fileno(self) -> int | None:
+        return self._fd
+
+    def clear(self) -> bool:
+        # Discard the queued notifications and wakeups, the parser reads
+        # whatever is new
+        changed = False
+
+        for fd in (self._fd, self._pipe_r):
+            if fd < 0:
+                continue
+
+            try:
+                while data := os.read(fd, 4096):
+                    changed = changed or fd == self._pipe_r or self._concerns_file(data)
+            except BlockingIOError:
+                pass
+
+        return changed
+
+    def _concerns_file(self, data: bytes) -> bool:
+        """
+        Check whether a block of inotify events has any event of the log file,
+        as opposed to the creation of other files in its directory
+        """
+        offset = 0
+
+        while offset < len(data):
+            wd, _, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+
+            if wd != self._dir_wd or data[offset:offset + length].rstrip(b"\0") == self._name:
+                return True
+
+            offset += length
+
+        return False
+
+    def wakeup(self) -> None:
+        # Closed already, nothing waits on the watcher anymore
+        if self._pipe_w < 0:
+            return
+
+        try:
+            os.write(self._pipe_w, b"\0")
+        except BlockingIOError:
+            # The pipe is full of wakeups not read yet, the waiting thread wakes up anyway
+            pass
+
+    def rewatch(self) -> None:
+        # The old watch is gone already if the rotated file was deleted
+        self._libc.inotify_rm_watch(self._fd, self._wd)
+
+        try:
+            self._wd = self._add_watch(self.filepath, IN_FILE_EVENTS)
+        except OSError as exc:
+            report(
+                AttestationError(
+                    title="WatchError",
+                    msg="error while watching the new log file after rotation",
+                    path=self.filepath,
+                    exc=exc
+                )
+            )
+
+    def close(self) -> None:
+        # Closed by the runtime when the parser stops, and possibly again after
+        for fd in (self._fd, self._pipe_r, self._pipe_w):
+            if fd >= 0:
+                os.close(fd)
+
+        self._fd = self._pipe_r = self._pipe_w = -1
+
+
+def create_watcher(filepath: str, backend: str = WATCH_BACKEND) -> FileWatcher:
+    """
+    Create a watcher for the log file.
+
+    `backend` is one of:
+    - `inotify`: Linux inotify, falls back to polling if unavailable
+    - `poll`: sleep for `POLL_INTERVAL` seconds between reads
+    - `auto`: `inotify` on Linux, `poll` elsewhere
+    """
+    if backend == "auto":
+        backend = "inotify" if sys.platform.startswith("linux") else "poll"
+
+    if backend == "inotify":
+        try:
+            return InotifyWatcher(filepath)
+        except (AttributeError, OSError) as exc:
+            report(
+                AttestationError(
+                    title="WatchError",
+                    msg="inotify unavailable, falling back to polling",
+                    path=filepath,
+                    exc=exc
+                )
+            )
+
+    return FileWatcher(filepath)
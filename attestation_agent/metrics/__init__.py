@@ -0,0 +1,10 @@
+from .agent import REGISTRY
+from .registry import Counter, Gauge, Histogram, Registry
+from .report import SelfReporter
+from .server import MetricsServer
+
+__all__ = (
+    "REGISTRY", "Registry",
+    "Counter", "Gauge", "Histogram",
+    "MetricsServer", "SelfReporter"
+)
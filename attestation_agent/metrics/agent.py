@@ -0,0 +1,101 @@
+"""
+Metrics of the agent itself, updated on the hot paths of the parsers, the
+dispatcher, the shipper and the loggers. Rates (e.g. lines per second) are
+derived from the counters by the scraper.
+"""
+
+from .registry import Registry
+
+# Registry of the metrics of the agent
+REGISTRY = Registry()
+
+# Parsers, labelled by parser class and log file
+PARSER_LINES = REGISTRY.counter(
+    "agent_parser_lines_total", "Lines read by the parser", ("parser", "log")
+)
+PARSER_EVENTS = REGISTRY.counter(
+    "agent_parser_events_total", "Events generated by the parser", ("parser", "log")
+)
+PARSER_BLOCK_SECONDS = REGISTRY.histogram(
+    "agent_parser_block_seconds", "Time spent parsing a block of lines", ("parser", "log")
+)
+PARSER_QUEUE = REGISTRY.gauge(
+    "agent_parser_queue_events", "Events waiting in the queue of the parser", ("parser", "log")
+)
+PARSER_THROTTLED = REGISTRY.counter(
+    "agent_parser_throttled_total", "Times the parser stopped reading on a full queue", ("parser", "log")
+)
+
+# Dispatcher
+DISPATCHED_EVENTS = REGISTRY.counter(
+    "agent_dispatcher_events_total", "Events handed over to the shipper"
+)
+
+COALESCER_EVENTS = REGISTRY.counter(
+    "agent_coalescer_events_total", "Events passed through or held back as repeats, and summaries sent", ("result",)
+)
+
+# Shipper
+SHIPPER_EVENTS = REGISTRY.counter(
+    "agent_shipper_events_total", "Events sent to the attestation server, or dropped", ("result",)
+)
+SHIPPER_REQUESTS = REGISTRY.counter(
+    "agent_shipper_requests_total", "Requests sent to the attestation server"
+)
+SHIPPER_SEND_SECONDS = REGISTRY.histogram(
+    "agent_shipper_send_seconds", "Time taken to send a batch of events", ("result",)
+)
+SHIPPER_BYTES = REGISTRY.counter(
+    "agent_shipper_bytes_total", "Bytes of the request bodies sent, as sent on the wire"
+)
+SHIPPER_BUFFER = REGISTRY.gauge(
+    "agent_shipper_buffer_events", "Events buffered by the shipper, in memory and spilled"
+)
+
+# Socket.io channel of the logs
+CHANNEL_MESSAGES = REGISTRY.counter(
+    "agent_channel_messages_total", "Logs handled by the socket.io channel, by outcome", ("result",)
+)
+CHANNEL_CONNECTS = REGISTRY.counter(
+    "agent_channel_connects_total", "Connections of the socket.io channel to the attestation server"
+)
+CHANNEL_BUFFER = REGISTRY.gauge(
+    "agent_channel_buffer_logs", "Logs waiting to be sent or acknowledged"
+)
+
+# Loggers, labelled by logger type
+LOGGER_SAMPLE_SECONDS = REGISTRY.histogram(
+    "agent_logger_sample_seconds", "Time spent sampling a metric", ("logger", "metric")
+)
+LOGGER_LOGS = REGISTRY.counter(
+    "agent_logger_logs_total", "Logs sent to the attestation server", ("logger",)
+)
+
+# Local event store
+STORE_EVENTS = REGISTRY.counter(
+    "agent_store_events_total", "Events written to the local store, deleted by the retention, or dropped unwritten", ("result",)
+)
+STORE_BYTES = REGISTRY.gauge(
+    "agent_store_bytes", "Size of the pages in use in the local store"
+)
+
+# Detections
+DETECTION_EVENTS = REGISTRY.counter(
+    "agent_detection_events_total", "Events matched by a detection, and keys evicted", ("result",)
+)
+DETECTION_ALERTS = REGISTRY.counter(
+    "agent_detection_alerts_total", "Alerts raised", ("detection",)
+)
+
+# Session checkpoints
+CHECKPOINTS = REGISTRY.counter(
+    "agent_checkpoints_total", "Checkpoints of the session written to disk"
+)
+CHECKPOINT_LAG = REGISTRY.gauge(
+    "agent_checkpoint_lag_events", "Events dispatched but not delivered at the last checkpoint"
+)
+
+# Errors reported by any part of the agent, by error class
+ERRORS = REGISTRY.counter(
+    "agent_errors_total", "Errors reported by the agent", ("kind",)
+)
@@ -0,0 +1,319 @@
+import time
+from bisect import bisect_left
+from threading import Lock
+from typing import Callable, Iterator
+
+# Upper bounds (in seconds) of the buckets of the latency histograms
+DEFAULT_BUCKETS = (
+    0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: tuple[tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value != value:
+        return "NaN"
+
+    if value in (float("inf"), float("-inf")):
+        return "+Inf" if value > 0 else "-Inf"
+
+    if isinstance(value, int) or value.is_integer():
+        return str(int(value))
+
+    return repr(value)
+
+
+class CounterValue:
+    """Value of a counter, for a set of label values"""
+
+    __slots__ = ("_value", "_lock")
+
+    def __init__(self) -> None:
+        self._value: float = 0
+        self._lock: Lock = Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    def get(self) -> float:
+        return self._value
+
+
+class GaugeValue:
+    """Value of a gauge, for a set of label values, set or read from a function"""
+
+    __slots__ = ("_value", "_function", "_lock")
+
+    def __init__(self) -> None:
+        self._value: float = 0
+        self._function: Callable[[], float] | None = None
+        self._lock: Lock = Lock()
+
+    def set(self, value: float) -> None:
+        self._value = value
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.inc(-amount)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """
+        Read the value from `function` when the gauge is collected
+        """
+        self._function = function
+
+    def get(self) -> float:
+        if self._function is not None:
+            return self._function()
+
+        return self._value
+
+
+class HistogramValue:
+    """Observations of a histogram, for a set of label values"""
+
+    __slots__ = ("buckets", "_counts", "_sum", "_lock")
+
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        self.buckets: tuple[float, ...] = buckets
+        self._counts: list[int] = [0] * (len(buckets) + 1)
+        self._sum: float = 0.0
+        self._lock: Lock = Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def time(self) -> "_Timer":
+        """
+        Return a context manager observing the time spent in its block
+        """
+        return _Timer(self)
+
+    def get(self) -> tuple[list[int], float]:
+        """
+        Return the cumulative counts of the buckets (the last one being
+        `+Inf`) and the sum of the observations
+        """
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+
+        for index in range(1, len(counts)):
+            counts[index] += counts[index - 1]
+
+        return counts, total
+
+
+class _Timer:
+    __slots__ = ("_histogram", "_start")
+
+    def __init__(self, histogram: HistogramValue) -> None:
+        self._histogram: HistogramValue = histogram
+
+    def __enter__(self) -> "_Timer":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._histogram.observe(time.perf_counter() - self._start)
+
+
+class Metric:
+    """
+    A metric family: its values by label values. Metrics without labels
+    can be updated directly, e.g. `counter.inc()`, the others through the
+    value of their labels, e.g. `counter.labels(parser="AuthParser").inc()`.
+    The values should be looked up once and kept, on hot paths.
+    """
+
+    type: str = None
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> None:
+        self.name: str = name
+        self.documentation: str = documentation
+        self.labelnames: tuple[str, ...] = tuple(labelnames)
+
+        self._values: dict[tuple[str, ...], object] = {}
+        self._lock: Lock = Lock()
+
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def _new_value(self):
+        raise NotImplementedError("Implementation required for: _new_value")
+
+    def labels(self, **labels: str):
+        """
+        Return the value of the metric for the given label values
+        """
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        value = self._values.get(key)
+
+        if value is None:
+            with self._lock:
+                value = self._values.setdefault(key, self._new_value())
+
+        return value
+
+    def remove(self, **labels: str) -> None:
+        """
+        Forget the value of the metric for the given label values
+        """
+        with self._lock:
+            self._values.pop(tuple(str(labels[name]) for name in self.labelnames), None)
+
+    def values(self) -> list[tuple[tuple[tuple[str, str], ...], object]]:
+        """
+        Return the values of the metric along with their labels
+        """
+        with self._lock:
+            items = list(self._values.items())
+
+        return [(tuple(zip(self.labelnames, key)), value) for key, value in items]
+
+    def samples(self) -> Iterator[tuple[str, tuple[tuple[str, str], ...], float]]:
+        """
+        Yield the samples of the metric as `(name, labels, value)`
+        """
+        for labels, value in self.values():
+            yield self.name, labels, value.get()
+
+
+class Counter(Metric):
+    """Monotonically increasing count"""
+
+    type = "counter"
+
+    def _new_value(self) -> CounterValue:
+        return CounterValue()
+
+    def inc(self, amount: float = 1) -> None:
+        self._default.inc(amount)
+
+
+class Gauge(Metric):
+    """Value which can go up and down"""
+
+    type = "gauge"
+
+    def _new_value(self) -> GaugeValue:
+        return GaugeValue()
+
+    def set(self, value: float) -> None:
+        self._default.set(value)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self._default.set_function(function)
+
+
+class Histogram(Metric):
+    """Distribution of observations, e.g. latencies, in buckets"""
+
+    type = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> None:
+        self.buckets: tuple[float, ...] = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_value(self) -> HistogramValue:
+        return HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._default.observe(value)
+
+    def time(self) -> _Timer:
+        return self._default.time()
+
+    def samples(self) -> Iterator[tuple[str, tuple[tuple[str, str], ...], float]]:
+        for labels, value in self.values():
+            counts, total = value.get()
+
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                yield f"{self.name}_bucket", labels + (("le", _format_value(float(bound))),), count
+
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, counts[-1]
+
+
+class Registry:
+    """
+    Metrics of the agent, rendered in the Prometheus text exposition format
+    """
+
+    def __init__(self) -> None:
+        self.metrics: dict[str, Metric] = {}
+        self._lock: Lock = Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        """
+        Register the metric, or return the one already registered under its name
+        """
+        with self._lock:
+            return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """
+        Return the metrics in the Prometheus text exposition format
+        """
+        lines = []
+
+        for metric in list(self.metrics.values()):
+            lines.append(f"# HELP {metric.name} {_escape(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> list[str]:
+        """
+        Return one line per value of each metric, histograms being
+        summarized by their count and mean
+        """
+        lines = []
+
+        for metric in list(self.metrics.values()):
+            for labels, value in metric.values():
+                if isinstance(metric, Histogram):
+                    counts, total = value.get()
+                    mean = total / counts[-1] if counts[-1] else 0.0
+                    text = f"count={counts[-1]} mean={mean * 1000:.3f}ms"
+                else:
+                    text = _format_value(value.get())
+
+                lines.append(f"{metric.name}{_format_labels(labels)} {text}")
+
+        return lines
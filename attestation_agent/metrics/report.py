@@ -0,0 +1,48 @@
+import sys
+from threading import Event as ThreadEvent
+from threading import Thread
+
+from attestation_agent.config import METRICS_REPORT_INTERVAL
+
+from .agent import REGISTRY
+from .registry import Registry
+
+
+class SelfReporter:
+    """
+    Prints a summary of the metrics of a registry every `interval` seconds,
+    from a daemon thread
+    """
+
+    def __init__(
+        self, registry: Registry = REGISTRY, interval: float = METRICS_REPORT_INTERVAL, file=sys.stdout
+    ) -> None:
+        self.registry: Registry = registry
+        self.interval: float = interval
+        self.file = file
+
+        # Set to stop the reporter
+        self._stopping: ThreadEvent = ThreadEvent()
+
+    def start(self) -> None:
+        """
+        Start reporting the metrics
+        """
+        Thread(target=self.run, name="metrics-report", daemon=True).start()
+
+    def run(self) -> None:
+        while not self._stopping.wait(self.interval):
+            self.report()
+
+    def report(self) -> None:
+        """
+        Print the summary of the metrics
+        """
+        lines = ["Agent metrics:", *(f"  {line}" for line in self.registry.summary())]
+        print("\n".join(lines), file=self.file, flush=True)
+
+    def stop(self) -> None:
+        """
+        Stop reporting the metrics
+        """
+        self._stopping.set()
@@ -0,0 +1,65 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+from attestation_agent.config import METRICS_HOST, METRICS_PORT
+
+from .agent import REGISTRY
+from .registry import Registry
+
+
+class MetricsServer:
+    """
+    Serves the metrics of a registry at `/metrics`, in the Prometheus text
+    exposition format, from a daemon thread. Listens on localhost only by
+    default, the metrics are meant to be scraped by a local collector.
+    """
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self, registry: Registry = REGISTRY, host: str = METRICS_HOST, port: int = METRICS_PORT) -> None:
+        self.registry: Registry = registry
+        self.host: str = host
+        self.port: int = port
+
+        self._server: ThreadingHTTPServer = None
+
+    def start(self) -> None:
+        """
+        Start serving the metrics
+        """
+        registry = self.registry
+        content_type = self.CONTENT_TYPE
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # Scrapes are not worth a line on the console each
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+
+        # The actual port, when asked to bind any free one
+        self.port = self._server.server_address[1]
+
+        Thread(target=self._server.serve_forever, name="metrics-server", daemon=True).start()
+
+    def stop(self) -> None:
+        """
+        Stop serving the metrics
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
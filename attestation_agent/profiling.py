@@ -0,0 +1,167 @@
+"""
+Opt-in profiling of a live agent, selected with `PROFILE` or `--profile`.
+Profiles are written to `PROFILE_DIR` whenever the agent receives
+`PROFILE_SIGNAL` (`kill -USR2 <pid>`), and once more when it exits:
+
+- `cprofile`: deterministic profile of every thread, as a `pstats` file
+  (`python -m pstats <file>`, snakeviz, ...). Slows the agent down noticeably.
+- `sampling`: the stacks of all the threads are sampled `PROFILE_RATE` times
+  per second, and written as collapsed stacks (`flamegraph.pl`, speedscope).
+  Cheap enough to leave running for a while.
+"""
+
+import cProfile
+import os
+import pstats
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+
+from attestation_agent.config import (PROFILE_DIR, PROFILE_RATE,
+                                      PROFILE_SIGNAL)
+
+PROFILE_MODES = ("cprofile", "sampling")
+
+
+class _Snapshot:
+    """
+    Statistics of a running `cProfile.Profile`, taken without disabling it
+    (`pstats.Stats` would disable the profiler it is given)
+    """
+
+    def __init__(self, profile: cProfile.Profile) -> None:
+        profile.snapshot_stats()
+        self.stats = profile.stats
+
+    def create_stats(self) -> None:
+        pass
+
+
+class Profiler:
+    """
+    Profiles all the threads of the agent, see the module documentation
+    """
+
+    def __init__(
+        self, mode: str, directory: str = PROFILE_DIR,
+        rate: float = PROFILE_RATE, signum: int = PROFILE_SIGNAL
+    ) -> None:
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"unknown profiling mode '{mode}'")
+
+        self.mode: str = mode
+        self.directory: str = directory
+        self.rate: float = rate
+        self.signum: int = signum
+
+        # Profiles of the threads, in `cprofile` mode
+        self._profiles: list[cProfile.Profile] = []
+        self._lock: threading.Lock = threading.Lock()
+
+        # Number of times each collapsed stack was sampled, in `sampling` mode
+        self._stacks: Counter[str] = Counter()
+        self._samples: int = 0
+        self._stopping: threading.Event = threading.Event()
+
+        # Number of profiles written, to name them apart
+        self._dumps: int = 0
+
+    def start(self) -> None:
+        """
+        Start profiling, and dump the profiles on `signum`.
+        Must be called from the main thread, before the other threads are started.
+        """
+        if self.mode == "cprofile":
+            # Threads started from now on profile themselves
+            threading.setprofile(self._profile_thread)
+            self._profile_thread()
+        else:
+            threading.Thread(target=self._sample, name="profiler", daemon=True).start()
+
+        signal.signal(self.signum, lambda signum, frame: self.dump())
+
+    def stop(self) -> None:
+        """
+        Stop profiling new threads and sampling, the profiles collected so
+        far can still be dumped
+        """
+        self._stopping.set()
+        threading.setprofile(None)
+
+    def _profile_thread(self, *args) -> None:
+        profile = cProfile.Profile()
+
+        with self._lock:
+            self._profiles.append(profile)
+
+        # Replaces the `threading.setprofile` hook for this thread
+        profile.enable()
+
+    def _sample(self) -> None:
+        interval = 1.0 / self.rate
+        own = threading.get_ident()
+        names = {}
+
+        while not self._stopping.wait(interval):
+            frames = sys._current_frames()
+
+            if len(names) != threading.active_count():
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+
+            with self._lock:
+                self._samples += 1
+
+                for ident, frame in frames.items():
+                    if ident == own:
+                        continue
+
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        filename = os.path.basename(code.co_filename)
+                        stack.append(f"{code.co_name} ({filename}:{code.co_firstlineno})")
+                        frame = frame.f_back
+
+                    stack.append(names.get(ident, str(ident)))
+                    self._stacks[";".join(reversed(stack))] += 1
+
+    def dump(self) -> str:
+        """
+        Write the profiles collected so far and return the path of the file
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+
+        with self._lock:
+            self._dumps += 1
+            path = os.path.join(self.directory, f"profile-{os.getpid()}-{stamp}-{self._dumps}")
+
+            if self.mode == "cprofile":
+                path += ".pstats"
+                stats = None
+
+                for profile in self._profiles:
+                    snapshot = _Snapshot(profile)
+
+                    # Threads which haven't run any Python code yet
+                    if not snapshot.stats:
+                        continue
+
+                    if stats is None:
+                        stats = pstats.Stats(snapshot)
+                    else:
+                        stats.add(snapshot)
+
+                if stats is not None:
+                    stats.dump_stats(path)
+            else:
+                path += ".folded"
+
+                with open(path, "w") as fp:
+                    for stack, count in self._stacks.most_common():
+                        fp.write(f"{stack} {count}\n")
+
+        print(f"Profile written to: {path}", file=sys.stderr)
+        return path
@@ -0,0 +1,171 @@
+"""
+asyncio runtime of the agent, an alternative to running every logger and
+parser in a thread of its own. Selected with `--runtime asyncio`.
+"""
+
+import asyncio
+import time
+from concurrent.futures import Executor
+from typing import Iterable
+
+from attestation_agent.errors import LogError, report
+from attestation_agent.logs.loggers import Logger
+from attestation_agent.logs.parsers import Parser
+from attestation_agent.transport import Dispatcher
+
+
+class AsyncRuntime:
+    """
+    Runs the parsers and loggers as tasks of a single event loop.
+
+    The existing parsers and loggers are driven through adapters: a parser
+    task waits for its log file to change on the loop (inotify descriptors
+    are watched with `add_reader`) and parses each block in `executor`,
+    a logger task takes its samples in `executor` as they fall due
+    (see `Logger.step`).
+    The number of threads depends on `executor`, not on the number of
+    log sources. The dispatcher runs in `executor` as well, and the events
+    are sent by the shipper's sender threads.
+    """
+
+    def __init__(
+        self,
+        parsers: Iterable[Parser],
+        loggers: Iterable[Logger],
+        dispatcher: Dispatcher,
+        executor: Executor,
+        channel: "LogChannel" = None,
+        machine_id: str = None,
+        interval: float = 1.0,
+    ) -> None:
+        self.parsers: list[Parser] = list(parsers)
+        self.loggers: list[Logger] = list(loggers)
+        self.dispatcher: Dispatcher = dispatcher
+        self.executor: Executor = executor
+        self.channel = channel
+        self.machine_id: str = machine_id
+        self.interval: float = interval
+
+        self._loop: asyncio.AbstractEventLoop = None
+
+        # Set to interrupt the waiting tasks when stopping
+        self._stopping: asyncio.Event = None
+
+    async def run(self) -> None:
+        """
+        Run the runtime until it is stopped or cancelled
+        """
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+
+        dispatcher = self._loop.run_in_executor(self.executor, self.dispatcher.run)
+
+        tasks = [
+            asyncio.create_task(self._run_parser(parser), name=f"parser:{parser.filepath}")
+            for parser in self.parsers
+        ] + [
+            asyncio.create_task(self._run_logger(logger), name=f"logger:{logger.type}")
+            for logger in self.loggers
+        ]
+
+        try:
+            await self._stopping.wait()
+        finally:
+            # Let the tasks finish their current step, so that no parsed
+            # events are lost, even when the runtime is cancelled
+            self._stop_sources()
+            await asyncio.shield(asyncio.gather(*tasks, return_exceptions=True))
+
+            # Stop the dispatcher once the parsers have published their last events
+            self.dispatcher.stop()
+            await asyncio.shield(dispatcher)
+
+    def stop(self) -> None:
+        """
+        Stop the runtime, can be called from any thread
+        """
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stopping.set)
+
+    def _stop_sources(self) -> None:
+        self._stopping.set()
+
+        for parser in self.parsers:
+            parser.stop()
+
+        for logger in self.loggers:
+            logger.stop()
+
+    async def _run_parser(self, parser: Parser) -> None:
+        """
+        Adapter running `Parser.run` as a task
+        """
+        try:
+            # Work through a large backlog on all the cores first
+            await self._loop.run_in_executor(self.executor, parser.catch_up)
+
+            while parser._running:
+                # Wait for the events to be taken, like `Parser.run` does
+                if len(parser.events) >= parser.queue_high:
+                    await self._loop.run_in_executor(self.executor, parser._throttle)
+                    continue
+
+                more = await self._loop.run_in_executor(self.executor, parser.parse_lines)
+
+                if not more:
+                    await self._wait(parser)
+        finally:
+            parser.watcher.close()
+
+    async def _wait(self, parser: Parser) -> None:
+        """
+        Wait for the log file of the parser to change, for pending events
+        to complete or for the runtime to stop
+        """
+        watcher = parser.watcher
+        timeout = parser._drain_timeout()
+
+        if watcher.interval is not None:
+            timeout = watcher.interval if timeout is None else min(timeout, watcher.interval)
+
+        waiters = [asyncio.ensure_future(self._stopping.wait())]
+        fd = watcher.fileno()
+
+        if fd is not None:
+            changed = asyncio.Event()
+            # Woken up only by the changes of the log file itself
+            self._loop.add_reader(fd, lambda: watcher.clear() and changed.set())
+            waiters.append(asyncio.ensure_future(changed.wait()))
+
+        try:
+            await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+
+            if fd is not None:
+                self._loop.remove_reader(fd)
+                watcher.clear()
+
+    async def _run_logger(self, logger: Logger) -> None:
+        """
+        Adapter running `Logger.run` as a task, stepping it on its schedule
+        """
+        logger.machine_id = self.machine_id
+
+        while logger._running:
+            try:
+                wake = await self._loop.run_in_executor(self.executor, logger.step, self.channel)
+            except Exception as exc:
+                report(
+                    LogError(
+                        msg="error while collecting usage metrics",
+                        exc=exc
+                    )
+                )
+                wake = time.monotonic() + self.interval
+
+            try:
+                await asyncio.wait_for(self._stopping.wait(), max(0.0, wake - time.monotonic()))
+            except asyncio.TimeoutError:
+                pass
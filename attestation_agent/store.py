@@ -0,0 +1,438 @@
+"""
+Local store of the parsed events, see `EventStore`, queried from the
+command line even while the attestation server is unreachable:
+
+`python -m attestation_agent.store --since 6h --type AUTH --account root`
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+import urllib.parse
+from collections import deque
+from threading import Condition, Thread
+from typing import Iterable
+
+from attestation_agent.config import (STORE_BATCH_SIZE, STORE_FLUSH_INTERVAL,
+                                      STORE_MAX_AGE, STORE_MAX_BYTES,
+                                      STORE_MAX_PENDING, STORE_PATH,
+                                      STORE_RETENTION_INTERVAL)
+from attestation_agent.errors import StoreError, report
+from attestation_agent.logs.events import Event
+from attestation_agent.metrics.agent import STORE_BYTES, STORE_EVENTS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    timestamp INTEGER,
+    type TEXT,
+    log_file TEXT,
+    pid INTEGER,
+    account TEXT,
+    props TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_timestamp ON events (timestamp);
+CREATE INDEX IF NOT EXISTS events_type ON events (type, timestamp);
+CREATE INDEX IF NOT EXISTS events_pid ON events (pid, timestamp);
+CREATE INDEX IF NOT EXISTS events_account ON events (account, timestamp);
+"""
+
+# Account of the `auth.log` events, in their action
+_ACCOUNT = re.compile(
+    r"\b(?:for invalid user|for user|of user|[Ii]nvalid user|for)\s+([\w.@-]*[\w@-])"
+    r"|^\s*([\w.@-]+) : TTY="
+)
+
+# Units of the durations accepted by `--since` and `--until`
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+# Range of the integers SQLite stores
+_INT_MIN, _INT_MAX = -(1 << 63), (1 << 63) - 1
+
+
+def _integer(value) -> int | None:
+    """
+    Return the value if it can be stored as an integer column, `None` otherwise
+    """
+    return value if isinstance(value, int) and _INT_MIN <= value <= _INT_MAX else None
+
+
+def account_of(account: str | None, action: str | None) -> str | None:
+    """
+    Return the account an event is about: the given one (its `account` or
+    `user` property), or the user named in its action
+    """
+    if account is None and action:
+        match = _ACCOUNT.search(action)
+
+        if match is not None:
+            account = match.group(1) or match.group(2)
+
+    return account
+
+
+class EventStore:
+    """
+    SQLite database, in WAL mode, of the events parsed by the agent. Events
+    handed over with `add` are written from a background thread, at most
+    `batch_size` of them in a single transaction every `flush_interval`
+    seconds, so the dispatcher never waits for the disk. At most
+    `max_pending` events wait to be written, the oldest are dropped beyond
+    (e.g. while the disk is full), failed writes are retried.
+
+    Events are indexed by time, and by type, pid and account along with
+    time, so that `query` never scans the table. Every `retention_interval`
+    seconds, the events older than `max_age` seconds are deleted, and the
+    oldest ones while the database is larger than `max_bytes`.
+
+    Other processes (see `main`) query the database while the agent writes
+    to it, readers don't block the writer in WAL mode.
+    """
+
+    def __init__(
+        self,
+        path: str = STORE_PATH,
+        batch_size: int = STORE_BATCH_SIZE,
+        flush_interval: float = STORE_FLUSH_INTERVAL,
+        max_age: float | None = STORE_MAX_AGE,
+        max_bytes: int | None = STORE_MAX_BYTES,
+        retention_interval: float = STORE_RETENTION_INTERVAL,
+        max_pending: int = STORE_MAX_PENDING,
+    ) -> None:
+        # Store the state of the store
+        self._running: bool = True
+
+        self.path: str = path
+        self.batch_size: int = batch_size
+        self.flush_interval: float = flush_interval
+        self.max_age: float | None = max_age
+        self.max_bytes: int | None = max_bytes
+        self.retention_interval: float = retention_interval
+        self.max_pending: int = max_pending
+
+        # Events waiting to be written: timestamp, type, log file and properties
+        self._pending: deque[tuple] = deque()
+        self._cond: Condition = Condition()
+        self._thread: Thread = None
+
+        # Counters
+        self.written: int = 0
+        self.deleted: int = 0
+        self.dropped: int = 0
+
+        # Metrics of the store, looked up once for the hot paths
+        self._written_metric = STORE_EVENTS.labels(result="written")
+        self._deleted_metric = STORE_EVENTS.labels(result="deleted")
+        self._dropped_metric = STORE_EVENTS.labels(result="dropped")
+
+    def connect(self) -> sqlite3.Connection:
+        """
+        Return a new connection to the database, creating it if needed
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        db = sqlite3.connect(self.path, timeout=10.0)
+        db.row_factory = sqlite3.Row
+        db.execute("PRAGMA journal_mode=WAL")
+
+        # Commits only reach the WAL, which is synced at checkpoints
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.executescript(SCHEMA)
+        return db
+
+    def connect_readonly(self) -> sqlite3.Connection:
+        """
+        Return a new read-only connection to the database, which must exist
+        """
+        uri = f"file:{urllib.parse.quote(os.path.abspath(self.path))}?mode=ro"
+        db = sqlite3.connect(uri, uri=True, timeout=10.0)
+        db.row_factory = sqlite3.Row
+        return db
+
+    def start(self) -> None:
+        """
+        Start writing the events
+        """
+        self._thread = Thread(target=self.run, name="event-store", daemon=True)
+        self._thread.start()
+
+    def add(self, events: Iterable[Event]) -> None:
+        """
+        Queue the events to be written
+        """
+        rows = [(event.timestamp, event.type, event.log_file, event.props()) for event in events]
+
+        with self._cond:
+            self._pending.extend(rows)
+            self._trim()
+
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+
+    def _trim(self) -> None:
+        """
+        Drop the oldest events waiting beyond `max_pending`.
+        Must be called with `self._cond` held.
+        """
+        excess = len(self._pending) - self.max_pending
+
+        if excess > 0:
+            for _ in range(excess):
+                self._pending.popleft()
+
+            self.dropped += excess
+            self._dropped_metric.inc(excess)
+
+    def run(self) -> None:
+        """
+        Run the store until it is stopped, then write the events left
+        """
+        try:
+            db = self.connect()
+        except (sqlite3.Error, OSError) as exc:
+            report(StoreError(msg="error while opening the event store", path=self.path, exc=exc))
+            return
+
+        next_retention = time.monotonic()
+
+        try:
+            while True:
+                with self._cond:
+                    if self._running and len(self._pending) < self.batch_size:
+                        self._cond.wait(self.flush_interval)
+
+                    running = self._running
+
+                self._write(db)
+
+                if time.monotonic() >= next_retention:
+                    self._retain(db)
+                    next_retention = time.monotonic() + self.retention_interval
+
+                if not running:
+                    break
+        finally:
+            db.close()
+
+    def stop(self) -> None:
+        """
+        Stop the store, once the events left are written
+        """
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+
+        if self._thread is not None:
+            self._thread.join()
+
+    def _write(self, db: sqlite3.Connection) -> None:
+        while True:
+            with self._cond:
+                count = min(len(self._pending), self.batch_size)
+                rows = [self._pending.popleft() for _ in range(count)]
+
+            if not rows:
+                return
+
+            records = []
+            for timestamp, type, log_file, props in rows:
+                pid = props.get("pid")
+
+                records.append((
+                    _integer(timestamp), type, log_file, _integer(pid),
+                    account_of(props.get("account") or props.get("user"), props.get("action")),
+                    json.dumps(props, separators=(",", ":"), default=str),
+                ))
+
+            try:
+                with db:
+                    db.executemany(
+                        "INSERT INTO events (timestamp, type, log_file, pid, account, props)"
+                        " VALUES (?, ?, ?, ?, ?, ?)",
+                        records
+                    )
+            except sqlite3.Error as exc:
+                report(StoreError(msg="error while writing events", path=self.path, exc=exc))
+
+                # Put the events back in front of the newer ones, and try
+                # again on the next cycle, e.g. once the database is unlocked
+                with self._cond:
+                    self._pending.extendleft(reversed(rows))
+                    self._trim()
+                return
+
+            self.written += len(records)
+            self._written_metric.inc(len(records))
+
+    def _retain(self, db: sqlite3.Connection) -> None:
+        """
+        Delete the events past their retention
+        """
+        try:
+            with db:
+                deleted = 0
+
+                if self.max_age is not None:
+                    cursor = db.execute(
+                        "DELETE FROM events WHERE timestamp < ?", (time.time() - self.max_age,)
+                    )
+                    deleted += cursor.rowcount
+
+                # Free pages are reused by the next inserts, the file doesn't grow past the limit
+                while self.max_bytes is not None and self._size(db) > self.max_bytes:
+                    count = db.execute("SELECT count(*) FROM events").fetchone()[0]
+
+                    if count == 0:
+                        break
+
+                    cursor = db.execute(
+                        "DELETE FROM events WHERE id <= (SELECT id FROM events ORDER BY id LIMIT 1 OFFSET ?)",
+                        (max(1, count // 10) - 1,)
+                    )
+                    deleted += cursor.rowcount
+        except sqlite3.Error as exc:
+            report(StoreError(msg="error while deleting old events", path=self.path, exc=exc))
+            return
+
+        self.deleted += deleted
+        self._deleted_metric.inc(deleted)
+        STORE_BYTES.set(self._size(db))
+
+    @staticmethod
+    def _size(db: sqlite3.Connection) -> int:
+        """
+        Return the size of the pages in use in the database, in bytes
+        """
+        page_size = db.execute("PRAGMA page_size").fetchone()[0]
+        pages = db.execute("PRAGMA page_count").fetchone()[0]
+        free = db.execute("PRAGMA freelist_count").fetchone()[0]
+        return (pages - free) * page_size
+
+    def query(
+        self,
+        type: str = None,
+        since: float = None,
+        until: float = None,
+        pid: int = None,
+        account: str = None,
+        limit: int | None = 1000,
+        explain: bool = False,
+    ) -> list[dict]:
+        """
+        Return the events matching all the given filters, most recent
+        first: `since` and `until` are timestamps (inclusive). With
+        `explain`, return SQLite's query plan instead.
+        """
+        conditions, params = [], []
+
+        for column, value in (("type", type), ("pid", pid), ("account", account)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+
+        if since is not None:
+            conditions.append("timestamp >= ?")
+            params.append(int(since))
+
+        if until is not None:
+            conditions.append("timestamp <= ?")
+            params.append(int(until))
+
+        sql = "SELECT id, timestamp, type, log_file, pid, account, props FROM events"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY timestamp DESC, id DESC"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+
+        db = self.connect_readonly()
+
+        try:
+            if explain:
+                return [dict(row) for row in db.execute("EXPLAIN QUERY PLAN " + sql, params)]
+
+            return [
+                {**dict(row), "props": json.loads(row["props"])}
+                for row in db.execute(sql, params)
+            ]
+        finally:
+            db.close()
+
+    def as_dict(self) -> dict:
+        """
+        Return the counters of the store
+        """
+        with self._cond:
+            pending = len(self._pending)
+
+        return {
+            "pending": pending, "written": self.written, "deleted": self.deleted, "dropped": self.dropped,
+        }
+
+
+def _time(value: str) -> float:
+    """
+    Parse a time given as a duration before now (`90s`, `30m`, `6h`, `7d`),
+    a timestamp or an ISO 8601 date
+    """
+    if value[-1:] in _UNITS and value[:-1].replace(".", "", 1).isdigit():
+        return time.time() - float(value[:-1]) * _UNITS[value[-1]]
+
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    from datetime import datetime
+    return datetime.fromisoformat(value).timestamp()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Query the events stored by the agent")
+    arg_parser.add_argument("--db", default=STORE_PATH, help="path of the event store")
+    arg_parser.add_argument("--type", help="event type, e.g. AUTH or USER_LOGIN")
+    arg_parser.add_argument("--since", type=_time, help="e.g. 6h, 2d, 1697624101 or 2023-10-18T10:00")
+    arg_parser.add_argument("--until", type=_time, help="same formats as --since")
+    arg_parser.add_argument("--pid", type=int, help="process id")
+    arg_parser.add_argument("--account", help="account (user) the event is about")
+    arg_parser.add_argument("--limit", type=int, default=100, help="events returned at most")
+    arg_parser.add_argument("--json", action="store_true", help="print the events as JSON lines")
+    arg_parser.add_argument("--explain", action="store_true", help="print the query plan")
+    args = arg_parser.parse_args()
+
+    if args.db is None:
+        print("No event store configured, set STORE_PATH or pass --db", file=sys.stderr)
+        sys.exit(1)
+
+    if not os.path.isfile(args.db):
+        print(f"No event store at: {args.db}", file=sys.stderr)
+        sys.exit(1)
+
+    store = EventStore(args.db)
+    rows = store.query(
+        args.type, args.since, args.until, args.pid, args.account, args.limit, args.explain
+    )
+
+    for row in rows:
+        if args.explain:
+            print(row["detail"])
+        elif args.json:
+            print(json.dumps(row))
+        else:
+            props = row["props"]
+            stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(row["timestamp"]))
+            summary = props.get("action") or props.get("command_line") or props.get("raw_content", "")
+            print(
+                f"{stamp}  {row['type'] or '-':<14} {row['pid'] or '-':>7}  "
+                f"{row['account'] or '-':<12} {summary.splitlines()[0] if summary else ''}"
+            )
+
+
+if __name__ == "__main__":
+    main()
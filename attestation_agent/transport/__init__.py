@@ -0,0 +1,9 @@
+from .channel import LogChannel
+from .codec import WireFormat
+from .dispatcher import Dispatcher
+from .shipper import EventShipper, ShipperStats
+from .spool import SpillQueue
+
+__all__ = (
+    "Dispatcher", "EventShipper", "LogChannel", "ShipperStats", "SpillQueue", "WireFormat"
+)
@@ -0,0 +1,362 @@
+import random
+import time
+from collections import deque
+from threading import Condition, Thread
+from typing import Callable
+
+import socketio
+
+from attestation_agent.config import (BASE_URL, CHANNEL_ACK_TIMEOUT,
+                                      CHANNEL_BACKOFF_MAX, CHANNEL_BACKOFF_MIN,
+                                      CHANNEL_BUFFER_SIZE,
+                                      CHANNEL_CONNECT_TIMEOUT,
+                                      CHANNEL_REPLAY_MAX)
+from attestation_agent.errors import LogError, report
+from attestation_agent.metrics.agent import (CHANNEL_BUFFER, CHANNEL_CONNECTS,
+                                             CHANNEL_MESSAGES)
+
+
+class _Message:
+    """
+    Message emitted through a `LogChannel`, and the time (monotonic) it
+    was last sent at
+    """
+
+    __slots__ = ("event", "data", "sent")
+
+    def __init__(self, event: str, data) -> None:
+        self.event: str = event
+        self.data = data
+        self.sent: float = 0.0
+
+
+class LogChannel:
+    """
+    Socket.io connection to the attestation server, kept up from a
+    background thread, through which the loggers send their logs. It stands
+    in for `socketio.Client` in the loggers: `emit` never blocks nor fails.
+
+    Emitted messages are buffered in a ring of `buffer_size` messages (the
+    oldest are dropped when it is full) and sent in order while connected.
+    A sent message stays in the ring until the server acknowledges it. The
+    messages not acknowledged when the connection drops are sent again
+    after reconnecting, and are considered delivered after `ack_timeout`
+    seconds otherwise, for servers which don't acknowledge them.
+
+    A server which lost the session of the agent (e.g. restarted behind a
+    proxy keeping the connection up) rejects the messages, acknowledging
+    them with `False`. The channel then reconnects to register again, and
+    sends the messages not acknowledged again, backing off while the
+    server keeps rejecting them.
+
+    The connection is retried with exponential backoff, from `backoff_min`
+    up to `backoff_max` seconds, with jitter. After a reconnection, the
+    backlog is downsampled to `replay_max` messages evenly spread over the
+    outage, the newest one included.
+    """
+
+    def __init__(
+        self,
+        url: str = BASE_URL,
+        headers: dict = None,
+        buffer_size: int = CHANNEL_BUFFER_SIZE,
+        backoff_min: float = CHANNEL_BACKOFF_MIN,
+        backoff_max: float = CHANNEL_BACKOFF_MAX,
+        ack_timeout: float = CHANNEL_ACK_TIMEOUT,
+        replay_max: int | None = CHANNEL_REPLAY_MAX,
+        connect_timeout: float = CHANNEL_CONNECT_TIMEOUT,
+    ) -> None:
+        # Store the state of channel
+        self._running: bool = True
+
+        self.url: str = url
+        self.headers: dict = headers or {}
+        self.buffer_size: int = buffer_size
+        self.backoff_min: float = backoff_min
+        self.backoff_max: float = backoff_max
+        self.ack_timeout: float = ack_timeout
+        self.replay_max: int | None = replay_max
+        self.connect_timeout: float = connect_timeout
+
+        # Reconnections are handled by the channel, with its own backoff
+        self.sio: socketio.Client = socketio.Client(reconnection=False)
+        self.sio.on("disconnect", self._on_disconnect)
+
+        # Called after each connection, before any message is sent
+        self.on_connect: Callable[[], None] | None = None
+
+        # Messages waiting to be sent, and messages sent waiting to be
+        # acknowledged by their identifier, in the order they were sent
+        self._pending: deque[_Message] = deque()
+        self._in_flight: dict[int, _Message] = {}
+        self._next_id: int = 0
+
+        # Set when the server rejected a message, along with the number of
+        # reconnections since it last accepted one
+        self._rejoin: bool = False
+        self._rejoins: int = 0
+
+        # Condition used to wake up the channel thread
+        self._cond: Condition = Condition()
+        self._thread: Thread = None
+
+        # Counters
+        self.sent: int = 0
+        self.acked: int = 0
+        self.rejected: int = 0
+        self.expired: int = 0
+        self.dropped: int = 0
+        self.skipped: int = 0
+        self.connects: int = 0
+
+        # Metrics of the channel, looked up once for the hot paths
+        self._sent_metric = CHANNEL_MESSAGES.labels(result="sent")
+        self._acked_metric = CHANNEL_MESSAGES.labels(result="acked")
+        self._rejected_metric = CHANNEL_MESSAGES.labels(result="rejected")
+        self._expired_metric = CHANNEL_MESSAGES.labels(result="expired")
+        self._dropped_metric = CHANNEL_MESSAGES.labels(result="dropped")
+        self._skipped_metric = CHANNEL_MESSAGES.labels(result="skipped")
+        CHANNEL_BUFFER.set_function(lambda: len(self._pending) + len(self._in_flight))
+
+    @property
+    def connected(self) -> bool:
+        return self.sio.connected
+
+    @property
+    def sid(self) -> str | None:
+        return self.sio.sid
+
+    def connect(self) -> bool:
+        """
+        Try to connect to the attestation server once.
+        Returns whether the channel is connected.
+        """
+        if self.sio.connected:
+            return True
+
+        try:
+            self.sio.connect(self.url, headers=self.headers, wait_timeout=self.connect_timeout)
+        except (socketio.exceptions.ConnectionError, ValueError) as exc:
+            report(
+                LogError(
+                    msg="error while connecting to the attestation server",
+                    url=self.url,
+                    exc=exc
+                )
+            )
+            return False
+
+        self.connects += 1
+        CHANNEL_CONNECTS.inc()
+
+        if self.on_connect is not None:
+            self.on_connect()
+
+        return True
+
+    def start(self) -> None:
+        """
+        Start keeping the connection up and sending the messages
+        """
+        self._thread = Thread(target=self.run, name="log-channel", daemon=True)
+        self._thread.start()
+
+    def emit(self, event: str, data=None) -> None:
+        """
+        Buffer a message to be sent to the attestation server, like
+        `socketio.Client.emit`
+        """
+        with self._cond:
+            self._pending.append(_Message(event, data))
+
+            while len(self._pending) > self.buffer_size:
+                self._pending.popleft()
+                self.dropped += 1
+                self._dropped_metric.inc()
+
+            self._cond.notify()
+
+    def run(self) -> None:
+        """
+        Run the channel until it is stopped
+        """
+        backoff = self.backoff_min
+
+        while self._running:
+            if self._rejoin:
+                self._reconnect()
+                continue
+
+            if not self.sio.connected:
+                if not self.connect():
+                    # Full jitter, so that a fleet of agents doesn't reconnect at once
+                    with self._cond:
+                        self._cond.wait_for(lambda: not self._running, random.uniform(0, backoff))
+
+                    backoff = min(backoff * 2, self.backoff_max)
+                    continue
+
+                backoff = self.backoff_min
+                self._downsample()
+
+            self._send_next()
+
+    def stop(self) -> None:
+        """
+        Stop the channel and disconnect from the attestation server
+        """
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+
+        if self._thread is not None:
+            self._thread.join()
+
+        if self.sio.connected:
+            self.sio.disconnect()
+
+    def as_dict(self) -> dict:
+        """
+        Return the counters of the channel
+        """
+        with self._cond:
+            return {
+                "connected": self.sio.connected,
+                "pending": len(self._pending),
+                "in_flight": len(self._in_flight),
+                "sent": self.sent,
+                "acked": self.acked,
+                "rejected": self.rejected,
+                "expired": self.expired,
+                "dropped": self.dropped,
+                "skipped": self.skipped,
+                "connects": self.connects,
+            }
+
+    def _send_next(self) -> None:
+        """
+        Wait for a message while connected, and send it
+        """
+        with self._cond:
+            while True:
+                timeout = self._expire()
+
+                if not self._running or not self.sio.connected or self._rejoin or self._pending:
+                    break
+
+                self._cond.wait(timeout)
+
+            if not self._running or not self.sio.connected or self._rejoin:
+                return
+
+            message = self._pending.popleft()
+            ident = self._next_id
+            self._next_id += 1
+
+            message.sent = time.monotonic()
+            self._in_flight[ident] = message
+
+        try:
+            self.sio.emit(
+                message.event, message.data,
+                callback=lambda *args: self._on_ack(ident, args[0] if args else True)
+            )
+        except socketio.exceptions.SocketIOError:
+            # Disconnected meanwhile, sent again after reconnecting
+            with self._cond:
+                if self._in_flight.pop(ident, None) is not None:
+                    self._pending.appendleft(message)
+            return
+
+        self.sent += 1
+        self._sent_metric.inc()
+
+    def _expire(self) -> float | None:
+        """
+        Consider the messages sent more than `ack_timeout` seconds ago as
+        delivered, returns the time until the next one expires.
+        Must be called with `self._cond` held.
+        """
+        if not self._in_flight:
+            return None
+
+        now = time.monotonic()
+
+        for ident, message in list(self._in_flight.items()):
+            if now - message.sent < self.ack_timeout:
+                return message.sent + self.ack_timeout - now
+
+            del self._in_flight[ident]
+            self.expired += 1
+            self._expired_metric.inc()
+
+        return None
+
+    def _downsample(self) -> None:
+        """
+        Keep at most `replay_max` of the messages buffered while disconnected
+        """
+        with self._cond:
+            count = len(self._pending)
+
+            if self.replay_max is None or count <= self.replay_max:
+                return
+
+            # Evenly spaced, counting back from the newest message
+            step = (count - 1) / max(self.replay_max - 1, 1)
+            keep = {count - 1 - round(index * step) for index in range(self.replay_max)}
+
+            self._pending = deque(message for index, message in enumerate(self._pending) if index in keep)
+            self.skipped += count - len(self._pending)
+            self._skipped_metric.inc(count - len(self._pending))
+
+    def _reconnect(self) -> None:
+        """
+        Connect again, so that the server registers the session of the
+        agent, after waiting like after a failed connection
+        """
+        with self._cond:
+            self._rejoin = False
+            backoff = min(self.backoff_min * 2 ** self._rejoins, self.backoff_max)
+            self._rejoins += 1
+
+        if self.sio.connected:
+            self.sio.disconnect()
+
+        # The messages rejected are sent again, once connected
+        self._on_disconnect()
+
+        with self._cond:
+            self._cond.wait_for(lambda: not self._running, random.uniform(0, backoff))
+
+    def _on_ack(self, ident: int, accepted) -> None:
+        with self._cond:
+            if accepted is False:
+                self.rejected += 1
+                self._rejected_metric.inc()
+
+                # Kept in flight, sent again in order after reconnecting
+                if ident in self._in_flight:
+                    self._rejoin = True
+                    self._cond.notify_all()
+                return
+
+            if self._in_flight.pop(ident, None) is None:
+                return
+
+            self.acked += 1
+            self._acked_metric.inc()
+            self._rejoins = 0
+
+    def _on_disconnect(self) -> None:
+        # Send the messages not acknowledged again, in order, before the others
+        with self._cond:
+            self._pending.extendleft(reversed(self._in_flight.values()))
+            self._in_flight.clear()
+
+            while len(self._pending) > self.buffer_size:
+                self._pending.popleft()
+                self.dropped += 1
+                self._dropped_metric.inc()
+
+            self._cond.notify_all()
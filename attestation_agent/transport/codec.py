@@ -0,0 +1,195 @@
+import gzip
+import json
+import zlib
+from typing import Iterable
+
+from attestation_agent.config import (SHIP_COMPRESS_LEVEL, SHIP_COMPRESS_MIN,
+                                      SHIP_COMPRESSION, SHIP_ENCODING)
+
+# Encodings of the batches of events, in order of preference
+ENCODINGS = ("columnar", "json")
+
+# Compressions of the request bodies and of the logs, in order of preference
+COMPRESSIONS = ("gzip", "deflate")
+LOG_COMPRESSIONS = ("deflate",)
+
+
+def dumps(data) -> bytes:
+    """
+    Return the data as compact JSON
+    """
+    return json.dumps(data, separators=(",", ":")).encode("utf-8")
+
+
+def encode_columnar(events: Iterable[dict]) -> dict:
+    """
+    Return a batch of events as columns: events sharing their machine,
+    type, log file and property names are grouped, and their timestamps and
+    the values of each property are listed once per group. The names are
+    sent once per group instead of once per event.
+    """
+    groups = {}
+
+    for event in events:
+        props = event["props"]
+        key = (event["machine_id"], event["type"], event["log_filepath"], *props)
+        group = groups.get(key)
+
+        if group is None:
+            group = groups[key] = ([], [[] for _ in props])
+
+        group[0].append(event["timestamp"])
+
+        for column, value in zip(group[1], props.values()):
+            column.append(value)
+
+    return {
+        "version": 1,
+        "groups": [
+            {
+                "machine_id": key[0],
+                "type": key[1],
+                "log_filepath": key[2],
+                "keys": key[3:],
+                "timestamp": timestamps,
+                "columns": columns,
+            }
+            for key, (timestamps, columns) in groups.items()
+        ],
+    }
+
+
+def decode_columnar(batch: dict) -> list[dict]:
+    """
+    Return the events of a batch encoded by `encode_columnar`, grouped
+    """
+    events = []
+
+    for group in batch["groups"]:
+        keys = group["keys"]
+
+        for index, timestamp in enumerate(group["timestamp"]):
+            events.append({
+                "machine_id": group["machine_id"],
+                "timestamp": timestamp,
+                "type": group["type"],
+                "log_filepath": group["log_filepath"],
+                "props": {key: column[index] for key, column in zip(keys, group["columns"])},
+            })
+
+    return events
+
+
+def compress(data: bytes, compression: str | None, level: int = SHIP_COMPRESS_LEVEL) -> bytes:
+    """
+    Compress the data with "gzip", "deflate" (zlib format) or `None`
+    """
+    if compression == "gzip":
+        return gzip.compress(data, level, mtime=0)
+
+    if compression == "deflate":
+        return zlib.compress(data, level)
+
+    return data
+
+
+class WireFormat:
+    """
+    Encoding and compression of the data sent to the attestation server,
+    negotiated with it: `choose` picks the preferred ones among those the
+    server offers, plain JSON being understood by any server.
+
+    Attributes:
+    - `encoding`: `str`, "json" or "columnar" for the batches of events
+    - `compression`: `str | None`, "gzip" or "deflate" for the request bodies
+    - `log_compression`: `str | None`, "deflate" for the usage logs
+    """
+
+    def __init__(
+        self,
+        encoding: str = "json",
+        compression: str | None = None,
+        log_compression: str | None = None,
+        level: int = SHIP_COMPRESS_LEVEL,
+        min_size: int = SHIP_COMPRESS_MIN,
+    ) -> None:
+        self.encoding: str = encoding
+        self.compression: str | None = compression
+        self.log_compression: str | None = log_compression
+        self.level: int = level
+        self.min_size: int = min_size
+
+    @classmethod
+    def choose(
+        cls, offered: dict, encoding: str = SHIP_ENCODING, compression: str | None = SHIP_COMPRESSION
+    ) -> "WireFormat":
+        """
+        Return the format to use with a server offering the given formats,
+        as returned by its `formats` endpoint. "auto" picks the preferred
+        one offered, anything else is used only if it is offered.
+        """
+        def pick(wanted: str | None, preferred: tuple[str, ...], available) -> str | None:
+            available = available or ()
+            candidates = preferred if wanted == "auto" else (wanted,)
+            return next((choice for choice in candidates if choice in available), None)
+
+        return cls(
+            pick(encoding, ENCODINGS, offered.get("encodings")) or "json",
+            pick(compression, COMPRESSIONS, offered.get("compression")),
+            # Logs are compressed whenever the request bodies may be
+            pick("auto", LOG_COMPRESSIONS, offered.get("logs")) if compression else None,
+        )
+
+    def encode_batch(self, events: list[dict]) -> tuple[bytes, dict]:
+        """
+        Return the body of a request sending the events, and its headers
+        """
+        data = dumps(encode_columnar(events) if self.encoding == "columnar" else events)
+        return self._body(data)
+
+    def encode_batches(self, events: list[dict], max_bytes: int | None) -> list[tuple[int, bytes, dict]]:
+        """
+        Return the bodies of the requests sending the events, their headers
+        and the number of events in each: the events are split in halves
+        until each request holds at most `max_bytes` before compression, or
+        a single event
+        """
+        data = dumps(encode_columnar(events) if self.encoding == "columnar" else events)
+
+        if max_bytes is None or len(data) <= max_bytes or len(events) == 1:
+            return [(len(events), *self._body(data))]
+
+        half = len(events) // 2
+        return self.encode_batches(events[:half], max_bytes) + self.encode_batches(events[half:], max_bytes)
+
+    def encode_event(self, event: dict) -> tuple[bytes, dict]:
+        """
+        Return the body of a request sending a single event, and its headers
+        """
+        return self._body(dumps(event))
+
+    def encode_log(self, data: dict) -> dict | bytes:
+        """
+        Return a usage log as sent over socket.io: as is, or compressed
+        JSON sent as a binary attachment
+        """
+        if self.log_compression is None:
+            return data
+
+        return compress(dumps(data), self.log_compression, self.level)
+
+    def _body(self, data: bytes) -> tuple[bytes, dict]:
+        headers = {"Content-Type": "application/json"}
+
+        if self.compression is not None and len(data) >= self.min_size:
+            data = compress(data, self.compression, self.level)
+            headers["Content-Encoding"] = self.compression
+
+        return data, headers
+
+    def as_dict(self) -> dict:
+        return {
+            "encoding": self.encoding,
+            "compression": self.compression,
+            "log_compression": self.log_compression,
+        }
@@ -0,0 +1,239 @@
+from collections import deque
+from threading import Condition, Lock
+
+from attestation_agent.detection import DetectionEngine
+from attestation_agent.errors import (DetectionError, ShipError, StoreError,
+                                      report)
+from attestation_agent.logs.events import Event
+from attestation_agent.logs.parsers import EventCoalescer, Parser
+from attestation_agent.metrics.agent import DISPATCHED_EVENTS
+from attestation_agent.store import EventStore
+
+from .shipper import EventShipper
+
+
+class Dispatcher:
+    """
+    Hands the events generated by the parsers over to the shipper as soon
+    as they are published.
+
+    Registered parsers signal new events through `notify` (their `on_events`
+    callback), the dispatcher then swaps out their event queue, holding the
+    parser's lock only for the swap, and converts the events outside of it.
+    Sending happens in the shipper's own threads, so a parser never waits
+    for a request to the attestation server.
+
+    With `track_states`, the state of each parser is recorded along with
+    the events dispatched, and `checkpoint` returns the states of the
+    parsers as of the last events the shipper has delivered.
+
+    With a `coalescer`, the repeats of an event are held back and sent as a
+    single event once their window closes (see `EventCoalescer`). Their
+    parser's state may be checkpointed meanwhile: a crash loses the count
+    of the repeats held back, never a distinct event.
+
+    With a `store`, every event is written to the local store as well,
+    repeats included.
+
+    With a `detector`, the detections run on every event, repeats included,
+    and their alerts are sent right away (see `DetectionEngine`), never
+    coalesced.
+
+    A failure of the detector, the store or the coalescer is reported and
+    the events are shipped regardless, a dispatch never stops the agent.
+    """
+
+    def __init__(
+        self,
+        shipper: EventShipper,
+        machine_id: str = None,
+        track_states: bool = False,
+        coalescer: EventCoalescer = None,
+        store: EventStore = None,
+        detector: DetectionEngine = None,
+    ) -> None:
+        # Store the state of dispatcher
+        self._running: bool = True
+
+        self.shipper: EventShipper = shipper
+        self.machine_id: str = machine_id
+        self.coalescer: EventCoalescer | None = coalescer
+        self.store: EventStore | None = store
+        self.detector: DetectionEngine | None = detector
+
+        self.parsers: list[Parser] = []
+
+        # Parsers with events waiting to be dispatched, in order of notification
+        self._ready: deque[Parser] = deque()
+        self._cond: Condition = Condition()
+
+        # States of the parsers waiting for their events to be delivered,
+        # along with the sequence number following those events in the
+        # shipper, and the states of the parsers delivered so far
+        self.track_states: bool = track_states
+        self._states: dict[Parser, deque[tuple[int, dict]]] = {}
+        self._delivered: dict[Parser, dict] = {}
+
+        # Dispatches run one at a time, so that the states are recorded
+        # in the order the events are handed over
+        self._lock: Lock = Lock()
+
+    def register(self, parser: Parser) -> None:
+        """
+        Dispatch the events of the parser from now on
+        """
+        self.parsers.append(parser)
+        parser.on_events = self.notify
+
+    def notify(self, parser: Parser) -> None:
+        """
+        Signal that the parser has published new events
+        """
+        with self._cond:
+            if parser not in self._ready:
+                self._ready.append(parser)
+                self._cond.notify()
+
+    def run(self) -> None:
+        """
+        Run the dispatcher.
+        """
+        while True:
+            # Wake up when the next coalescing window closes as well
+            timeout = self.expire()
+
+            with self._cond:
+                if self._running and not self._ready:
+                    self._cond.wait(timeout)
+
+                if not self._running:
+                    break
+
+                if not self._ready:
+                    continue
+
+                parser = self._ready.popleft()
+
+            try:
+                self.dispatch(parser)
+            except Exception as exc:
+                report(ShipError(msg="error while dispatching events", path=parser.filepath, exc=exc))
+
+        # Hand over whatever the parsers published until they were stopped
+        self.drain()
+
+    def dispatch(self, parser: Parser) -> int:
+        """
+        Hand the events of the parser over to the shipper.
+        Returns the number of events dispatched.
+        """
+        with self._lock:
+            with parser.lock:
+                events = list(parser.flush())
+                state = parser.snapshot_state() if self.track_states else None
+
+            alerts = []
+
+            if self.detector is not None and events:
+                try:
+                    alerts = self.detector.process(events)
+                except Exception as exc:
+                    report(DetectionError(msg="error while running the detections", exc=exc))
+
+            if self.store is not None and events:
+                try:
+                    self.store.add(events + alerts)
+                except Exception as exc:
+                    report(StoreError(msg="error while storing events", exc=exc))
+
+            if self.coalescer is not None:
+                try:
+                    events = self.coalescer.add(events)
+                except Exception as exc:
+                    report(ShipError(msg="error while coalescing events", exc=exc))
+
+            sequence = self._ship(events + alerts, urgent=bool(alerts))
+
+            if state is not None:
+                states = self._states.setdefault(parser, deque())
+                last = states[-1][1] if states else self._delivered.get(parser)
+
+                if state != last:
+                    states.append((sequence, state))
+
+        return len(events)
+
+    def expire(self) -> float | None:
+        """
+        Hand the events summarizing the repeats of the coalescing windows
+        which closed over to the shipper.
+        Returns the time until the next window closes, `None` without any.
+        """
+        if self.coalescer is None:
+            return None
+
+        with self._lock:
+            try:
+                self._ship(self.coalescer.expire())
+            except Exception as exc:
+                report(ShipError(msg="error while coalescing events", exc=exc))
+
+            return self.coalescer.timeout()
+
+    def _ship(self, events: list[Event], urgent: bool = False) -> int:
+        """
+        Hand the events over to the shipper, returns the sequence number
+        following them. Must be called with `self._lock` held.
+        """
+        if not events:
+            return self.shipper.sequence
+
+        try:
+            dicts = [event.to_dict(self.machine_id) for event in events]
+        except Exception:
+            # Leave out the events which can't be converted, and only them
+            dicts = []
+            for event in events:
+                try:
+                    dicts.append(event.to_dict(self.machine_id))
+                except Exception as exc:
+                    report(ShipError(msg="error while converting event", type=event.type, exc=exc))
+
+        DISPATCHED_EVENTS.inc(len(dicts))
+        return self.shipper.add(dicts, urgent)
+
+    def checkpoint(self, acknowledged: int) -> dict[str, dict]:
+        """
+        Return the states of the parsers, by log file, as of the last events
+        delivered: the events below the `acknowledged` sequence number.
+        Parsers without any state delivered yet are left out.
+        """
+        with self._lock:
+            for parser, states in self._states.items():
+                while states and states[0][0] <= acknowledged:
+                    self._delivered[parser] = states.popleft()[1]
+
+            return {parser.filepath: state for parser, state in self._delivered.items()}
+
+    def drain(self) -> None:
+        """
+        Hand the events of all the parsers over to the shipper
+        """
+        with self._cond:
+            self._ready.clear()
+
+        for parser in self.parsers:
+            self.dispatch(parser)
+
+        # Send the repeats held back as well
+        if self.coalescer is not None:
+            with self._lock:
+                self._ship(self.coalescer.flush())
+
+    def stop(self) -> None:
+        """
+        Set the dispatcher state to stopped
+        """
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
@@ -0,0 +1,479 @@
+import time
+from threading import Condition, Thread
+from typing import Iterable
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from attestation_agent.config import (BASE_URL, SHIP_BATCH_BYTES,
+                                      SHIP_BATCH_SIZE, SHIP_FLUSH_INTERVAL,
+                                      SHIP_POOL_SIZE, SHIP_SENDERS,
+                                      SHIP_TIMEOUT, SPILL_DIR)
+from attestation_agent.errors import ShipError, report
+from attestation_agent.metrics.agent import (SHIPPER_BUFFER, SHIPPER_BYTES,
+                                             SHIPPER_EVENTS, SHIPPER_REQUESTS,
+                                             SHIPPER_SEND_SECONDS)
+
+from .codec import WireFormat, dumps
+from .spool import SpillQueue
+
+
+class ShipperStats:
+    """
+    Throughput and latency counters of an `EventShipper`.
+
+    Attributes:
+    - `events_sent`: `int`
+    - `requests_sent`: `int`
+    - `failures`: `int`
+    - `dropped`: `int`
+    - `bytes_sent`: `int`, size of the request bodies successfully sent
+    - `latency_total`: `float`, seconds spent in successful sends
+    - `latency_max`: `float`, slowest successful send in seconds
+    """
+
+    def __init__(self) -> None:
+        self.started: float = time.monotonic()
+        self.events_sent: int = 0
+        self.requests_sent: int = 0
+        self.batches_sent: int = 0
+        self.failures: int = 0
+        self.dropped: int = 0
+        self.bytes_sent: int = 0
+        self.latency_total: float = 0.0
+        self.latency_max: float = 0.0
+
+    def record(self, events: int, requests_sent: int, latency: float, size: int = 0) -> None:
+        """
+        Record a successfully sent batch
+        """
+        self.events_sent += events
+        self.requests_sent += requests_sent
+        self.bytes_sent += size
+        self.batches_sent += 1
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+
+    def as_dict(self) -> dict:
+        """
+        Return the counters along with the derived throughput and mean latency
+        """
+        elapsed = time.monotonic() - self.started
+
+        return {
+            "events_sent": self.events_sent,
+            "requests_sent": self.requests_sent,
+            "batches_sent": self.batches_sent,
+            "failures": self.failures,
+            "dropped": self.dropped,
+            "bytes_sent": self.bytes_sent,
+            "events_per_second": self.events_sent / elapsed if elapsed > 0 else 0.0,
+            "latency_mean": (
+                self.latency_total / self.batches_sent if self.batches_sent else 0.0
+            ),
+            "latency_max": self.latency_max,
+        }
+
+
+class EventShipper:
+    """
+    Sends events to the attestation server in batches, over a pool of
+    keep-alive connections.
+
+    Events are buffered by `add()` and sent by `run()` (in its own thread,
+    along with `senders - 1` helper threads, so that a slow request doesn't
+    hold up the next batches) as soon as `batch_size` events are waiting or
+    the oldest buffered event has waited for `flush_interval` seconds. If the attestation server does
+    not provide the batch endpoint, events are sent one request at a time
+    over the same pooled connections. Batches larger than `batch_bytes` are
+    split over several requests, and the limit is halved whenever the server
+    finds a request of several events too large.
+
+    The encoding and compression of the requests are negotiated with the
+    server before the first one, see `WireFormat`.
+
+    The buffer is bounded in memory, events beyond it are spilled to
+    `spill_dir` while the server is unreachable, see `SpillQueue`.
+
+    Events are numbered in the order they are added, `acknowledged` tells
+    up to which number all of them are safe: accepted (or rejected) by the
+    server, dropped, or synced to the spill directory. Events are only
+    dropped when the server rejects them with a 4xx status, other than
+    those of `RETRY_STATUSES`: they are sent again, like on a 5xx status
+    or a network error.
+    """
+
+    BATCH_ENDPOINT = "/api/event/add-batch"
+    EVENT_ENDPOINT = "/api/event/add"
+    FORMATS_ENDPOINT = "/api/event/formats"
+
+    # Client errors which don't depend on the events: missing endpoint,
+    # timeouts and rate limiting
+    RETRY_STATUSES = frozenset((404, 408, 429))
+
+    def __init__(
+        self,
+        base_url: str = BASE_URL,
+        batch_size: int = SHIP_BATCH_SIZE,
+        batch_bytes: int | None = SHIP_BATCH_BYTES,
+        flush_interval: float = SHIP_FLUSH_INTERVAL,
+        pool_size: int = SHIP_POOL_SIZE,
+        timeout: float = SHIP_TIMEOUT,
+        senders: int = SHIP_SENDERS,
+        spill_dir: str | None = SPILL_DIR,
+    ) -> None:
+        # Store the state of shipper
+        self._running: bool = True
+
+        self.base_url: str = base_url
+        self.batch_size: int = batch_size
+        self.batch_bytes: int | None = batch_bytes
+        self.flush_interval: float = flush_interval
+        self.timeout: float = timeout
+        self.senders: int = max(1, min(senders, pool_size))
+
+        # HTTP session reusing keep-alive connections for all the requests
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        # Whether the server accepts batches, unknown until the first request
+        self._batch_supported: bool | None = None
+
+        # Format of the requests, negotiated before the first one
+        self.format: WireFormat | None = None
+
+        # Buffered events waiting to be sent and the time (monotonic)
+        # at which the oldest of them was buffered
+        self.events: SpillQueue = SpillQueue(spill_dir)
+        self._oldest: float = 0.0
+
+        # Sequence number of the next event added, and sequence numbers
+        # of the events of the batches being sent, by batch
+        self.sequence: int = 0
+        self._in_flight: dict[int, list[int | None]] = {}
+
+        # Do not retry sending before this time (monotonic) after a failure
+        self._retry_at: float = 0.0
+
+        # Condition used to wake up a sender when a batch is ready
+        self._cond: Condition = Condition()
+
+        self.stats: ShipperStats = ShipperStats()
+
+        # Metrics of the shipper, looked up once for the hot paths
+        self._sent_metric = SHIPPER_EVENTS.labels(result="sent")
+        self._dropped_metric = SHIPPER_EVENTS.labels(result="dropped")
+        self._success_metric = SHIPPER_SEND_SECONDS.labels(result="success")
+        self._failure_metric = SHIPPER_SEND_SECONDS.labels(result="failure")
+        SHIPPER_BUFFER.set_function(lambda: len(self.events))
+
+    def add(self, events: Iterable[dict], urgent: bool = False) -> int:
+        """
+        Buffer the events to be sent to the attestation server, `urgent`
+        ones are sent without waiting for the flush interval.
+        Returns the sequence number following the events: they have all
+        been delivered once `acknowledged` reaches it.
+        """
+        events = list(events)
+
+        with self._cond:
+            # Wake up a sender to start the flush timer of the first events,
+            # or to send a full batch right away
+            wake = not self.events
+
+            if wake:
+                self._oldest = time.monotonic()
+
+            # The buffered events are due as of now
+            if urgent:
+                self._oldest = time.monotonic() - self.flush_interval
+
+            self.events.extend(events, self.sequence)
+            self.sequence += len(events)
+
+            if wake or urgent or len(self.events) >= self.batch_size:
+                self._cond.notify()
+
+            return self.sequence
+
+    def acknowledged(self) -> int:
+        """
+        Return the sequence number below which all the events added are
+        safe from a crash of the agent, syncing the spilled events first
+        """
+        with self._cond:
+            if self.events.unsynced:
+                self.events.sync()
+
+            pending = [
+                min((seq for seq in seqs if seq is not None), default=self.sequence)
+                for seqs in self._in_flight.values()
+            ]
+            pending.append(self.events.pending())
+
+            return min((seq for seq in pending if seq is not None), default=self.sequence)
+
+    def run(self) -> None:
+        """
+        Run the shipper.
+        """
+        helpers = [
+            Thread(target=self._send_batches, name=f"shipper-{index}", daemon=True)
+            for index in range(1, self.senders)
+        ]
+
+        for helper in helpers:
+            helper.start()
+
+        self._send_batches()
+
+        for helper in helpers:
+            helper.join()
+
+        # Make a last attempt to send whatever is left in the buffer,
+        # and keep the rest on disk for the next run
+        self.flush()
+
+        with self._cond:
+            self.events.close()
+
+    def flush(self) -> None:
+        """
+        Send all the buffered events right away, without waiting for a batch
+        to fill up. Events that fail to be sent are kept in the buffer.
+        """
+        while True:
+            with self._cond:
+                batch = self._take()
+
+            if not batch or not self._send(batch):
+                break
+
+    def stop(self) -> None:
+        """
+        Set the shipper state to stopped
+        """
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+
+    def _send_batches(self) -> None:
+        """
+        Send batches as they become ready until the shipper is stopped
+        """
+        while self._running:
+            batch = self._next_batch()
+
+            if batch:
+                self._send(batch)
+
+    def counters(self) -> dict:
+        """
+        Return the shipper statistics along with the counters of its buffer
+        """
+        with self._cond:
+            stats = self.stats.as_dict()
+            stats["queue"] = self.events.as_dict()
+
+        return stats
+
+    def _next_batch(self) -> list[dict]:
+        """
+        Wait until a batch is ready (full or timed out) and take it out
+        of the buffer. Returns an empty list when the shipper is stopped.
+        """
+        with self._cond:
+            while self._running:
+                now = time.monotonic()
+
+                if now < self._retry_at:
+                    self._cond.wait(self._retry_at - now)
+                elif not self.events:
+                    self._cond.wait()
+                elif (
+                    len(self.events) >= self.batch_size
+                    or now - self._oldest >= self.flush_interval
+                ):
+                    return self._take()
+                else:
+                    self._cond.wait(self.flush_interval - (now - self._oldest))
+
+        return []
+
+    def _take(self) -> list[dict]:
+        """
+        Remove at most `batch_size` events from the front of the buffer.
+        Must be called with `self._cond` held.
+        """
+        batch, seqs = self.events.take(self.batch_size)
+
+        if batch:
+            self._in_flight[id(batch)] = seqs
+
+        # Remaining events have waited at most as long as the batch
+        # so they are considered to be buffered now
+        self._oldest = time.monotonic()
+
+        # Let another sender take the next batch meanwhile
+        if len(self.events) >= self.batch_size:
+            self._cond.notify()
+
+        return batch
+
+    def negotiate(self) -> WireFormat:
+        """
+        Ask the attestation server which formats it accepts and choose the
+        format of the requests. Servers without the formats endpoint are
+        sent plain JSON. If the server can't be reached, plain JSON is used
+        and the negotiation is tried again before the next request.
+        """
+        try:
+            response = self.session.get(
+                url=f"{self.base_url}{self.FORMATS_ENDPOINT}", timeout=self.timeout
+            )
+
+            if 400 <= response.status_code < 500:
+                self.format = WireFormat()
+            else:
+                response.raise_for_status()
+                self.format = WireFormat.choose(response.json().get("data") or {})
+        except (requests.RequestException, ValueError):
+            return WireFormat()
+
+        return self.format
+
+    def _send(self, batch: list[dict]) -> bool:
+        """
+        Send a batch of events, falling back to one request per event when
+        the server has no batch endpoint. Returns whether the batch was sent.
+        Unsent events are put back in the buffer, in order.
+        """
+        start = time.monotonic()
+        # Events handled so far: sent, or dropped when rejected by the server
+        done = 0
+        dropped = 0
+        requests_sent = 0
+        size = 0
+
+        # Events to send again, `None` until the outcome of the batch is known
+        unsent: list[dict] | None = None
+        error: Exception | None = None
+        retry_after = self.flush_interval
+
+        try:
+            wire_format = self.format or self.negotiate()
+
+            if self._batch_supported is not False:
+                for count, body, headers in wire_format.encode_batches(batch, self.batch_bytes):
+                    response = self._post(self.BATCH_ENDPOINT, body, headers)
+                    requests_sent += 1
+
+                    if response.status_code == 404:
+                        self._batch_supported = False
+                        break
+
+                    # Split the next requests further, the events are sent again
+                    if response.status_code == 413 and count > 1:
+                        self.batch_bytes = max(1, len(dumps(batch[done:done + count])) // 2)
+                        response.raise_for_status()
+
+                    if self._rejected(response):
+                        done += count
+                        dropped += count
+                        continue
+
+                    response.raise_for_status()
+                    self._batch_supported = True
+                    done += count
+                    size += len(body)
+
+            if self._batch_supported is False:
+                for event in batch[done:]:
+                    body, headers = wire_format.encode_event(event)
+                    response = self._post(self.EVENT_ENDPOINT, body, headers)
+                    requests_sent += 1
+
+                    # Only the rejected event is dropped, the next ones are sent
+                    if self._rejected(response):
+                        done += 1
+                        dropped += 1
+                        continue
+
+                    response.raise_for_status()
+                    done += 1
+                    size += len(body)
+        except requests.RequestException as exc:
+            # Network errors, 5xx and `RETRY_STATUSES`, the events are sent again,
+            # not before the server asks to when it is throttling the agent
+            error = exc
+            response = getattr(exc, "response", None)
+            delay = response.headers.get("Retry-After", "") if response is not None else ""
+
+            if delay.isdigit():
+                retry_after = max(retry_after, float(delay))
+        except Exception as exc:
+            # Not a failure of the server (e.g. an event which can't be
+            # encoded), sending the same events again would fail the same way
+            error = exc
+            dropped += len(batch) - done
+            unsent = []
+        finally:
+            # Events not handled when the send was cut short are sent again
+            if unsent is None:
+                unsent = batch[done:]
+
+            with self._cond:
+                seqs = self._in_flight.pop(id(batch))
+
+                if unsent:
+                    self.events.requeue(unsent, seqs[len(batch) - len(unsent):])
+
+                self.stats.dropped += dropped
+
+                if error is not None:
+                    self.stats.failures += 1
+                    self._retry_at = time.monotonic() + retry_after
+
+        sent = len(batch) - len(unsent) - dropped
+        latency = time.monotonic() - start
+
+        if error is not None:
+            report(
+                ShipError(
+                    msg="error while sending events",
+                    events=len(batch),
+                    unsent=len(unsent),
+                    exc=error
+                )
+            )
+        else:
+            with self._cond:
+                self.stats.record(sent, requests_sent, latency, size)
+
+        self._sent_metric.inc(sent)
+        self._dropped_metric.inc(dropped)
+        SHIPPER_REQUESTS.inc(requests_sent)
+        SHIPPER_BYTES.inc(size)
+        (self._failure_metric if error is not None else self._success_metric).observe(latency)
+
+        return error is None
+
+    def _rejected(self, response: requests.Response) -> bool:
+        """
+        Return whether the server rejected the events of the request
+        themselves, sending them again won't help: they are dropped
+        """
+        status = response.status_code
+
+        if status < 400 or status >= 500 or status in self.RETRY_STATUSES:
+            return False
+
+        report(ShipError(msg="events rejected by the attestation server", url=response.url, status=status))
+        return True
+
+    def _post(self, endpoint: str, body: bytes, headers: dict) -> requests.Response:
+        return self.session.post(
+            url=f"{self.base_url}{endpoint}", data=body, headers=headers, timeout=self.timeout
+        )
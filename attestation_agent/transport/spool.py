@@ -0,0 +1,445 @@
+import json
+import os
+import re
+import time
+from collections import deque
+from typing import Iterable
+
+from attestation_agent.config import (SHIP_QUEUE_HIGH, SHIP_QUEUE_LOW,
+                                      SPILL_DIR, SPILL_FSYNC_INTERVAL,
+                                      SPILL_MAX_BYTES, SPILL_SEGMENT_SIZE)
+from attestation_agent.errors import ShipError, report
+
+# Names of the segment files, other files in the spill directory are left alone
+_segment_re = re.compile(r"(\d+)\.jsonl")
+
+
+class Segment:
+    """
+    Append-only file of spilled events, one JSON document per line.
+
+    Attributes:
+    - `seq`: `int`, segments are replayed in increasing order
+    - `path`: `str`
+    - `count`: `int`, events in the segment not read back yet
+    - `size`: `int`, size of the file in bytes
+    """
+
+    __slots__ = ("seq", "path", "count", "size")
+
+    def __init__(self, seq: int, path: str, count: int = 0, size: int = 0) -> None:
+        self.seq: int = seq
+        self.path: str = path
+        self.count: int = count
+        self.size: int = size
+
+
+class SpillQueue:
+    """
+    FIFO queue of events bounded in memory. Once `high` events are held in
+    memory, further events are appended to segment files in `directory`,
+    and read back in order when the queue drops to `low` events in memory.
+
+    The segments are kept across restarts. Their total size is capped at
+    `max_bytes` by dropping the oldest segment. If `directory` is `None` or
+    can't be written to, the oldest events in memory are dropped instead.
+
+    Events can be given sequence numbers, `pending` returns the smallest
+    one of the events which would be lost if the agent crashed: the events
+    in memory and the spilled events not synced to disk yet.
+
+    Not thread safe, the owner serializes access to the queue.
+    """
+
+    def __init__(
+        self,
+        directory: str | None = SPILL_DIR,
+        high: int = SHIP_QUEUE_HIGH,
+        low: int = SHIP_QUEUE_LOW,
+        segment_size: int = SPILL_SEGMENT_SIZE,
+        max_bytes: int = SPILL_MAX_BYTES,
+        fsync_interval: float = SPILL_FSYNC_INTERVAL,
+    ) -> None:
+        self.directory: str | None = directory
+        self.high: int = high
+        self.low: int = low
+        self.segment_size: int = segment_size
+        self.max_bytes: int = max_bytes
+        self.fsync_interval: float = fsync_interval
+
+        # Events held in memory, older than any event on disk, and their
+        # sequence numbers (`None` for the events read back from disk)
+        self.memory: deque[dict] = deque()
+        self.seqs: deque[int | None] = deque()
+
+        # The sequence numbers in `seqs` other than `None`, in the same
+        # order, which is increasing: the smallest one is the first
+        self._numbered: deque[int] = deque()
+
+        # Smallest sequence number of the events spilled since the last sync
+        self._unsynced: int | None = None
+
+        # Segments on disk, from the oldest to the newest
+        self.segments: deque[Segment] = deque()
+
+        # Newest segment open for appending and oldest segment being read back
+        self._writer = None
+        self._reader = None
+
+        # Events and bytes on disk not read back yet
+        self._on_disk: int = 0
+        self._disk_bytes: int = 0
+
+        # Time (monotonic) of the last sync of the newest segment
+        self._synced: float = time.monotonic()
+
+        # Counters
+        self.spilled: int = 0
+        self.replayed: int = 0
+        self.dropped: int = 0
+
+        if self.directory is not None:
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self.memory) + self._on_disk
+
+    def __bool__(self) -> bool:
+        return bool(self.memory) or self._on_disk > 0
+
+    def extend(self, events: Iterable[dict], seq: int | None = None) -> None:
+        """
+        Append the events at the end of the queue, numbered from `seq` on
+        """
+        events = list(events)
+        seqs = list(range(seq, seq + len(events))) if seq is not None else [None] * len(events)
+
+        # Events can only go to memory while nothing is waiting on disk,
+        # otherwise they would overtake the spilled events
+        if not self._on_disk:
+            room = max(0, self.high - len(self.memory))
+            self._append(events[:room], seqs[:room])
+            events, seqs = events[room:], seqs[room:]
+
+        if events:
+            self._spill(events, seqs)
+
+    def extendleft(self, events: Iterable[dict], seqs: Iterable[int | None] = None) -> None:
+        """
+        Put the events back at the front of the queue, for instance events
+        taken out but not sent. Like `deque.extendleft`, pass them (and
+        their sequence numbers) reversed.
+        """
+        events = list(events)
+        seqs = list(seqs) if seqs is not None else [None] * len(events)
+        self.memory.extendleft(events)
+        self.seqs.extendleft(seqs)
+        self._numbered.extendleft(seq for seq in seqs if seq is not None)
+
+    def requeue(self, events: list[dict], seqs: list[int | None]) -> None:
+        """
+        Put events taken out but not sent back in the queue, in order of
+        their sequence numbers: behind the events numbered before them put
+        back already (by another sender), in front of the others.
+        """
+        first = next((seq for seq in seqs if seq is not None), None)
+        ahead, ahead_seqs = [], []
+
+        while first is not None and self.seqs and self.seqs[0] is not None and self.seqs[0] < first:
+            event, seq = self._popleft()
+            ahead.append(event)
+            ahead_seqs.append(seq)
+
+        self.extendleft(reversed(events), reversed(seqs))
+        self.extendleft(reversed(ahead), reversed(ahead_seqs))
+
+    def popleft(self) -> dict:
+        """
+        Remove and return the oldest event
+        """
+        return self.take(1)[0][0]
+
+    def take(self, count: int) -> tuple[list[dict], list[int | None]]:
+        """
+        Remove and return at most `count` of the oldest events, along with
+        their sequence numbers
+        """
+        events, seqs = [], []
+
+        for _ in range(count):
+            if len(self.memory) <= self.low and self._on_disk:
+                self._replay()
+
+            if not self.memory:
+                break
+
+            event, seq = self._popleft()
+            events.append(event)
+            seqs.append(seq)
+
+        return events, seqs
+
+    def pending(self) -> int | None:
+        """
+        Return the smallest sequence number of the events which are neither
+        synced to disk nor taken out of the queue, `None` if there are none
+        """
+        lowest = self._numbered[0] if self._numbered else None
+
+        if self._unsynced is not None and (lowest is None or self._unsynced < lowest):
+            return self._unsynced
+
+        return lowest
+
+    @property
+    def unsynced(self) -> bool:
+        """
+        Whether some spilled events are not synced to disk yet
+        """
+        return self._unsynced is not None
+
+    def sync(self) -> None:
+        """
+        Write the spilled events through to the disk
+        """
+        if self._writer is not None:
+            try:
+                self._writer.flush()
+                os.fsync(self._writer.fileno())
+            except OSError as exc:
+                self._error("error while syncing spilled events", exc)
+            else:
+                self._unsynced = None
+
+        self._synced = time.monotonic()
+
+    def close(self) -> None:
+        """
+        Write the events left in memory to disk, in front of the segments
+        already there, so that they are sent after a restart
+        """
+        self.sync()
+
+        if self.directory is not None and (self.memory or self._reader is not None):
+            try:
+                data = self._encode(self.memory)
+
+                # Keep only the unread part of the segment being read back,
+                # the events read from it are in memory or sent already
+                if self._reader is not None:
+                    data += self._reader.read()
+                    path = self.segments[0].path
+                else:
+                    path = self._path(self.segments[0].seq - 1 if self.segments else 0)
+
+                with open(f"{path}.tmp", "wb") as fp:
+                    fp.write(data)
+                    fp.flush()
+                    os.fsync(fp.fileno())
+
+                os.replace(f"{path}.tmp", path)
+                self.memory.clear()
+                self.seqs.clear()
+                self._numbered.clear()
+            except OSError as exc:
+                self._error("error while saving events", exc)
+
+        for file in (self._writer, self._reader):
+            if file is not None:
+                file.close()
+
+        self._writer = self._reader = None
+
+    def as_dict(self) -> dict:
+        """
+        Return the counters of the queue
+        """
+        return {
+            "in_memory": len(self.memory),
+            "on_disk": self._on_disk,
+            "disk_bytes": self._disk_bytes,
+            "spilled": self.spilled,
+            "replayed": self.replayed,
+            "dropped": self.dropped,
+        }
+
+    def _path(self, seq: int) -> str:
+        return os.path.join(self.directory, f"{seq}.jsonl")
+
+    def _load(self) -> None:
+        """
+        Pick up the segments left by a previous run
+        """
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            matches = [_segment_re.fullmatch(name) for name in os.listdir(self.directory)]
+        except OSError as exc:
+            self._error("spill directory unavailable, events will be kept in memory", exc)
+            self.directory = None
+            return
+
+        for seq in sorted(int(match.group(1)) for match in matches if match is not None):
+            path = self._path(seq)
+
+            try:
+                with open(path, "rb") as fp:
+                    count = sum(1 for _ in fp)
+
+                segment = Segment(seq, path, count, os.path.getsize(path))
+            except OSError as exc:
+                self._error("error while reading spilled events", exc)
+                continue
+
+            self.segments.append(segment)
+            self._on_disk += segment.count
+            self._disk_bytes += segment.size
+
+        # The limit may have been lowered since, keep the newest events
+        while self._disk_bytes > self.max_bytes and len(self.segments) > 1:
+            self._remove_head()
+
+    @staticmethod
+    def _encode(events: Iterable[dict]) -> bytes:
+        return "".join(
+            json.dumps(event, separators=(",", ":")) + "\n" for event in events
+        ).encode("utf-8")
+
+    def _spill(self, events: list[dict], seqs: list[int | None]) -> None:
+        """
+        Append the events to the newest segment
+        """
+        if self.directory is None:
+            self._drop_memory(events, seqs)
+            return
+
+        if seqs[0] is not None and self._unsynced is None:
+            self._unsynced = seqs[0]
+
+        index = 0
+
+        try:
+            for index, event in enumerate(events):
+                data = (json.dumps(event, separators=(",", ":")) + "\n").encode("utf-8")
+                segment = self.segments[-1] if self._writer is not None else None
+
+                # Start a new segment when the newest one is full or is being read
+                if segment is None or segment.size >= self.segment_size:
+                    if self._writer is not None:
+                        self._writer.close()
+
+                    seq = self.segments[-1].seq + 1 if self.segments else 0
+                    segment = Segment(seq, self._path(seq))
+                    self._writer = open(segment.path, "ab")
+                    self.segments.append(segment)
+
+                    # Make room by dropping the oldest segments
+                    while self._disk_bytes > self.max_bytes and len(self.segments) > 1:
+                        self._remove_head()
+
+                self._writer.write(data)
+                segment.count += 1
+                segment.size += len(data)
+                self._on_disk += 1
+                self._disk_bytes += len(data)
+                self.spilled += 1
+        except OSError as exc:
+            self._error("error while spilling events", exc)
+            self.dropped += len(events) - index
+            return
+
+        # Batch the syncs, losing the last interval on power loss is acceptable
+        if time.monotonic() - self._synced >= self.fsync_interval:
+            self.sync()
+
+    def _replay(self) -> None:
+        """
+        Read spilled events back into memory, up to the high watermark
+        """
+        want = self.high - len(self.memory)
+
+        while want > 0 and self._on_disk:
+            head = self.segments[0]
+
+            try:
+                if self._reader is None:
+                    # Don't read the segment being written, start a new one instead
+                    if self._writer is not None and head is self.segments[-1]:
+                        self._writer.close()
+                        self._writer = None
+
+                    self._reader = open(head.path, "rb")
+
+                line = self._reader.readline()
+            except OSError as exc:
+                self._error("error while reading spilled events", exc)
+                self._remove_head()
+                continue
+
+            if not line:
+                self._remove_head()
+                continue
+
+            head.count -= 1
+            self._on_disk -= 1
+
+            try:
+                self.memory.append(json.loads(line))
+                self.seqs.append(None)
+                self.replayed += 1
+                want -= 1
+            except ValueError:
+                # Partial line written before a crash
+                self.dropped += 1
+
+            # Delete the segment as soon as it has been read back
+            if head.count <= 0:
+                self._remove_head()
+
+    def _remove_head(self) -> None:
+        """
+        Delete the oldest segment, counting its unread events as dropped
+        """
+        head = self.segments.popleft()
+
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+        if self._writer is not None and not self.segments:
+            self._writer.close()
+            self._writer = None
+
+        self.dropped += head.count
+        self._on_disk -= head.count
+        self._disk_bytes -= head.size
+
+        try:
+            os.remove(head.path)
+        except OSError as exc:
+            self._error("error while removing spill segment", exc)
+
+    def _append(self, events: list[dict], seqs: list[int | None]) -> None:
+        self.memory.extend(events)
+        self.seqs.extend(seqs)
+        self._numbered.extend(seq for seq in seqs if seq is not None)
+
+    def _popleft(self) -> tuple[dict, int | None]:
+        seq = self.seqs.popleft()
+
+        if seq is not None:
+            self._numbered.popleft()
+
+        return self.memory.popleft(), seq
+
+    def _drop_memory(self, events: list[dict], seqs: list[int | None]) -> None:
+        """
+        Keep the events in memory, dropping the oldest past the high watermark
+        """
+        self._append(events, seqs)
+
+        while len(self.memory) > self.high:
+            self._popleft()
+            self.dropped += 1
+
+    def _error(self, msg: str, exc: Exception) -> None:
+        report(ShipError(msg=msg, directory=self.directory, exc=exc))
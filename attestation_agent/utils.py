@@ -2,12 +2,19 @@ import json
 import os
 import sys
 
-from rich.console import Console
-
 from attestation_agent.config import SESSION_FILEPATH
 
-# Rich console for prettier output
-console = Console()
+
+def __getattr__(name: str):
+    # Rich console for prettier output, created on first use since rich
+    # takes a while to import and only the interactive agent needs it
+    if name == "console":
+        from rich.console import Console
+
+        globals()["console"] = Console()
+        return globals()["console"]
+
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
 
 
 def load_session() -> dict:
@@ -47,6 +54,26 @@ def load_session() -> dict:
     return data
 
 
+def write_session(data: dict, filepath: str = SESSION_FILEPATH):
+    """
+    Write agent state to a session file atomically: the file holds either
+    the previous state or the new one, even if the agent crashes meanwhile
+    """
+    with open(f"{filepath}.tmp", "w") as fp:
+        json.dump(data, fp)
+        fp.flush()
+        os.fsync(fp.fileno())
+
+    os.replace(f"{filepath}.tmp", filepath)
+
+    # Make the rename itself durable
+    fd = os.open(os.path.dirname(filepath) or ".", os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
 def save_session(data: dict):
     """
     Save agent state to a session file
@@ -54,14 +81,12 @@ def save_session(data: dict):
     print("Saving current session ... ", end="", flush=True)
 
     try:
-        with open(SESSION_FILEPATH, "w") as fp:
-            json.dump(data, fp)
-
+        write_session(data)
         print("done!")
     except (
-        FileNotFoundError,
-        PermissionError,
-        json.JSONDecodeError
+        OSError,
+        TypeError,
+        ValueError
     ) as exc:
         print(
             f"save_session: error while writing to session file, {exc = }",
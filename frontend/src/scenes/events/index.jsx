@@ -48,6 +48,9 @@ const Events = () => {
       field: "props",
       headerName: "Properties",
       flex: 1,
+      // Properties are stored as a JSON object, and as a string by older agents
+      valueGetter: ({ value }) =>
+        value == null || typeof value === "string" ? value : JSON.stringify(value),
     },
   ];
 
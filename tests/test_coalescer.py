@@ -0,0 +1,44 @@
+import unittest
+
+from attestation_agent.logs.parsers import EventCoalescer
+from attestation_agent.logs.parsers.audit import AuditEvent
+
+
+def _audit(type: str, serial: int, timestamp: int = 1000, pid: int = 100, **props) -> AuditEvent:
+    return AuditEvent(type=type, serial=serial, timestamp=timestamp, pid=pid, **props)
+
+
+class EventCoalescerTest(unittest.TestCase):
+    def test_distinct_identities_never_merge(self):
+        coalescer = EventCoalescer(window=60)
+        events = [
+            _audit("USER_LOGIN", 1, user_id=0, operation="login", terminal="ssh"),
+            _audit("USER_LOGIN", 2, user_id=1000, operation="login", terminal="ssh"),
+            *(
+                _audit("EXECVE", 3 + index, auid=auid, uid=auid, session=index, exec_path="/usr/bin/id")
+                for index, auid in enumerate((1000, 1001, 1002))
+            ),
+        ]
+
+        passed = coalescer.add(events) + coalescer.flush()
+
+        self.assertEqual([event.serial for event in passed], [1, 2, 3, 4, 5])
+        self.assertTrue(all(event.extras.get("count") is None for event in passed))
+
+    def test_repeats_merge_whatever_their_pid_and_serial(self):
+        coalescer = EventCoalescer(window=60)
+        events = [
+            _audit("EXECVE", serial, timestamp=1000 + serial, pid=100 + serial, auid=1000, uid=1000,
+                   exec_path="/usr/bin/id")
+            for serial in range(3)
+        ]
+
+        passed = coalescer.add(events)
+        summaries = coalescer.flush()
+
+        self.assertEqual([event.serial for event in passed], [0])
+        self.assertEqual([(event.serial, event.count) for event in summaries], [(2, 2)])
+
+
+if __name__ == "__main__":
+    unittest.main()